@@ -0,0 +1,312 @@
+"""
+Prueba de carga HTTP de extremo a extremo
+
+Arranca `main:app` con uvicorn en un puerto libre, siembra un catálogo por
+los endpoints bulk y lanza usuarios virtuales con un cliente httpx
+asíncrono. Cada usuario elige en bucle uno de los escenarios según su peso:
+
+- catalogo: recorre /libros/ por cursor y consulta libro, copias y
+  disponibilidad
+- busqueda: búsqueda parcial por autor
+- prestamos: ráfagas de préstamo y devolución inmediata de varias copias
+- suscripciones: tormentas de suscripciones BioAlert a un mismo libro
+
+Imprime en JSON el throughput y la latencia p50/p95/p99 de cada ruta. Los
+4xx esperados (copia ya prestada, tope de préstamos) se cuentan por estado
+pero no como errores; sí los 5xx y los fallos de conexión. Uso:
+
+    python -m benchmarks.carga [--duracion 20] [--usuarios 32]
+        [--db sqlite:///tmp/carga.db] [--workers 1]
+        [--guardar-linea-base benchmarks/linea_base_carga.json]
+        [--linea-base benchmarks/linea_base_carga.json] [--tolerancia 0.25]
+
+Con `--linea-base` se añade la comparación por ruta y el proceso termina
+con código 1 si alguna ruta empeora más que la tolerancia.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+import httpx
+from src.repositorio import url_para_workers
+
+APELLIDOS = ("Somerville", "Pressman", "Sommerfeld", "Fowler", "Beck", "Martin",
+             "Gamma", "Knuth", "Tanenbaum", "Liskov", "Hopper", "Dijkstra")
+LIBROS = 2000
+COPIAS_POR_LIBRO = 3
+LECTORES = 500
+TAMANIO_LOTE = 500
+COPIAS_POR_RAFAGA = 3
+SUSCRIPCIONES_POR_TORMENTA = 20
+
+
+class Registro:
+    """Latencias y estados por plantilla de ruta"""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.estados: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.activo = False
+
+    async def pedir(self, cliente: httpx.AsyncClient, metodo: str, plantilla: str,
+                    url: str, **opciones) -> Optional[httpx.Response]:
+        ruta = f"{metodo} {plantilla}"
+        inicio = time.perf_counter()
+        try:
+            respuesta = await cliente.request(metodo, url, **opciones)
+            estado = str(respuesta.status_code)
+        except httpx.HTTPError:
+            respuesta, estado = None, "error"
+        if self.activo:
+            self.latencias[ruta].append(time.perf_counter() - inicio)
+            self.estados[ruta][estado] += 1
+        return respuesta
+
+
+def percentil(ordenadas: List[float], fraccion: float) -> float:
+    """Método del rango más cercano sobre una lista ordenada"""
+    return ordenadas[max(0, math.ceil(len(ordenadas) * fraccion) - 1)]
+
+
+def puerto_libre() -> int:
+    with socket.socket() as conexion:
+        conexion.bind(("127.0.0.1", 0))
+        return conexion.getsockname()[1]
+
+
+def arrancar_servidor(puerto: int, db: Optional[str], workers: int) -> subprocess.Popen:
+    entorno = dict(os.environ)
+    entorno.pop("BIBLIOTECA_DB", None)
+    url = url_para_workers(db, workers) if workers > 1 else db
+    if url:
+        entorno["BIBLIOTECA_DB"] = url
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(puerto), "--workers", str(workers), "--log-level", "warning"],
+        env=entorno)
+
+
+async def esperar_servidor(cliente: httpx.AsyncClient, servidor: subprocess.Popen,
+                           limite: float = 30.0):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if servidor.poll() is not None:
+            raise RuntimeError("uvicorn terminó antes de aceptar conexiones")
+        try:
+            if (await cliente.get("/")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("uvicorn no respondió a tiempo")
+
+
+async def sembrar(cliente: httpx.AsyncClient) -> dict:
+    libros = [{
+        "id": f"carga_libro{i}",
+        "nombre": f"Libro de carga {i}",
+        "anio": 1990 + i % 35,
+        "autor": {"nombre": f"Autor {APELLIDOS[i % len(APELLIDOS)]}",
+                  "fecha_nacimiento": "1950-01-01T00:00:00"},
+    } for i in range(LIBROS)]
+    copias = [{
+        "id": f"{libro['id']}_copia{j}", "libro_id": libro["id"], "estado": "disponible",
+    } for libro in libros for j in range(COPIAS_POR_LIBRO)]
+    lectores = [{"email": f"carga{i}@universidad.edu", "nombre": f"Lector {i}"}
+                for i in range(LECTORES)]
+    for ruta, registros in (("/libros/bulk", libros), ("/copias/bulk", copias),
+                            ("/lectores/bulk", lectores)):
+        for inicio in range(0, len(registros), TAMANIO_LOTE):
+            respuesta = await cliente.post(
+                f"{ruta}?modo=mejor_esfuerzo", json=registros[inicio:inicio + TAMANIO_LOTE])
+            respuesta.raise_for_status()
+    return {
+        "libros": [libro["id"] for libro in libros],
+        "copias": [copia["id"] for copia in copias],
+        "lectores": [lector["email"] for lector in lectores],
+    }
+
+
+async def catalogo(cliente, registro: Registro, datos: dict, azar: random.Random):
+    respuesta = await registro.pedir(cliente, "GET", "/libros/", "/libros/",
+                                     params={"limit": 50})
+    for _ in range(azar.randint(0, 3)):
+        if respuesta is None or respuesta.status_code != 200:
+            break
+        cursor = respuesta.json()["next_cursor"]
+        if not cursor:
+            break
+        respuesta = await registro.pedir(cliente, "GET", "/libros/", "/libros/",
+                                         params={"limit": 50, "cursor": cursor})
+    libro_id = azar.choice(datos["libros"])
+    await registro.pedir(cliente, "GET", "/libros/{libro_id}", f"/libros/{libro_id}")
+    await registro.pedir(cliente, "GET", "/copias/libro/{libro_id}",
+                         f"/copias/libro/{libro_id}")
+    await registro.pedir(cliente, "GET", "/libros/{libro_id}/disponibilidad",
+                         f"/libros/{libro_id}/disponibilidad")
+
+
+async def busqueda(cliente, registro: Registro, datos: dict, azar: random.Random):
+    apellido = azar.choice(APELLIDOS)
+    inicio = azar.randint(0, len(apellido) - 4)
+    fragmento = apellido[inicio:inicio + 4]
+    await registro.pedir(cliente, "GET", "/libros/autor/{nombre_autor}",
+                         f"/libros/autor/{fragmento}")
+
+
+async def prestamos(cliente, registro: Registro, datos: dict, azar: random.Random):
+    lector = azar.choice(datos["lectores"])
+
+    async def prestar(copia_id):
+        return await registro.pedir(cliente, "POST", "/prestamos/", "/prestamos/",
+                                    params={"copia_id": copia_id, "lector_email": lector})
+
+    respuestas = await asyncio.gather(*(
+        prestar(copia_id) for copia_id in azar.sample(datos["copias"], COPIAS_POR_RAFAGA)))
+    await asyncio.gather(*(
+        registro.pedir(cliente, "PUT", "/prestamos/{prestamo_id}/devolver",
+                       f"/prestamos/{respuesta.json()['id']}/devolver")
+        for respuesta in respuestas
+        if respuesta is not None and respuesta.status_code == 201))
+
+
+async def suscripciones(cliente, registro: Registro, datos: dict, azar: random.Random):
+    libro_id = azar.choice(datos["libros"][:10])
+    await asyncio.gather(*(
+        registro.pedir(cliente, "POST", "/bioalert/suscribir", "/bioalert/suscribir",
+                       params={"lector_email": lector, "libro_id": libro_id})
+        for lector in azar.sample(datos["lectores"], SUSCRIPCIONES_POR_TORMENTA)))
+
+
+# nombre -> (escenario, peso en la mezcla)
+ESCENARIOS = {
+    "catalogo": (catalogo, 5),
+    "busqueda": (busqueda, 3),
+    "prestamos": (prestamos, 2),
+    "suscripciones": (suscripciones, 1),
+}
+
+
+async def usuario(cliente, registro: Registro, datos: dict, azar: random.Random, fin: float):
+    escenarios = [escenario for escenario, _ in ESCENARIOS.values()]
+    pesos = [peso for _, peso in ESCENARIOS.values()]
+    while time.monotonic() < fin:
+        await azar.choices(escenarios, pesos)[0](cliente, registro, datos, azar)
+
+
+def resumir(registro: Registro, duracion: float) -> dict:
+    rutas = {}
+    for ruta in sorted(registro.latencias):
+        ordenadas = sorted(registro.latencias[ruta])
+        estados = registro.estados[ruta]
+        rutas[ruta] = {
+            "peticiones": len(ordenadas),
+            "errores": sum(cantidad for estado, cantidad in estados.items()
+                           if estado == "error" or int(estado) >= 500),
+            "rps": round(len(ordenadas) / duracion, 1),
+            "p50_ms": round(percentil(ordenadas, 0.50) * 1000, 2),
+            "p95_ms": round(percentil(ordenadas, 0.95) * 1000, 2),
+            "p99_ms": round(percentil(ordenadas, 0.99) * 1000, 2),
+            "estados": dict(sorted(estados.items())),
+        }
+    total = sum(ruta["peticiones"] for ruta in rutas.values())
+    return {
+        "duracion_s": round(duracion, 2),
+        "peticiones": total,
+        "rps": round(total / duracion, 1),
+        "errores": sum(ruta["errores"] for ruta in rutas.values()),
+        "rutas": rutas,
+    }
+
+
+def comparar(actual: dict, base: dict, tolerancia: float) -> dict:
+    """Regresión: p95 más lento o throughput más bajo que la tolerancia"""
+    rutas, regresiones = {}, []
+    for ruta, medida in actual["rutas"].items():
+        anterior = base["rutas"].get(ruta)
+        if anterior is None:
+            continue
+        rutas[ruta] = {
+            "p95_relativo": round(medida["p95_ms"] / anterior["p95_ms"], 2)
+            if anterior["p95_ms"] else None,
+            "rps_relativo": round(medida["rps"] / anterior["rps"], 2)
+            if anterior["rps"] else None,
+        }
+        if anterior["p95_ms"] and medida["p95_ms"] > anterior["p95_ms"] * (1 + tolerancia):
+            regresiones.append({"ruta": ruta, "metrica": "p95_ms",
+                                "base": anterior["p95_ms"], "actual": medida["p95_ms"]})
+        if anterior["rps"] and medida["rps"] < anterior["rps"] * (1 - tolerancia):
+            regresiones.append({"ruta": ruta, "metrica": "rps",
+                                "base": anterior["rps"], "actual": medida["rps"]})
+    return {"tolerancia": tolerancia, "rutas": rutas, "regresiones": regresiones}
+
+
+async def ejecutar(opciones) -> dict:
+    puerto = puerto_libre()
+    servidor = arrancar_servidor(puerto, opciones.db, opciones.workers)
+    limites = httpx.Limits(max_connections=opciones.usuarios * COPIAS_POR_RAFAGA)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{puerto}",
+                                     limits=limites, timeout=30.0) as cliente:
+            await esperar_servidor(cliente, servidor)
+            datos = await sembrar(cliente)
+            registro = Registro()
+            azar = random.Random(opciones.semilla)
+
+            async def fase(segundos):
+                fin = time.monotonic() + segundos
+                await asyncio.gather(*(
+                    usuario(cliente, registro, datos, random.Random(azar.random()), fin)
+                    for _ in range(opciones.usuarios)))
+
+            await fase(opciones.calentamiento)
+            registro.activo = True
+            inicio = time.perf_counter()
+            await fase(opciones.duracion)
+            duracion = time.perf_counter() - inicio
+    finally:
+        servidor.terminate()
+        servidor.wait()
+    return resumir(registro, duracion)
+
+
+def main(argumentos=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duracion", type=float, default=20.0)
+    parser.add_argument("--calentamiento", type=float, default=2.0)
+    parser.add_argument("--usuarios", type=int, default=32)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--db", default=None, help="Valor de BIBLIOTECA_DB para el servidor")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--linea-base", default=None)
+    parser.add_argument("--guardar-linea-base", default=None)
+    parser.add_argument("--tolerancia", type=float, default=0.25)
+    opciones = parser.parse_args(argumentos)
+
+    informe = asyncio.run(ejecutar(opciones))
+    informe["configuracion"] = {
+        "usuarios": opciones.usuarios, "duracion_s": opciones.duracion,
+        "db": opciones.db or "memoria", "workers": opciones.workers,
+        "escenarios": {nombre: peso for nombre, (_, peso) in ESCENARIOS.items()},
+    }
+    if opciones.guardar_linea_base:
+        with open(opciones.guardar_linea_base, "w", encoding="utf-8") as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False)
+            archivo.write("\n")
+    if opciones.linea_base:
+        with open(opciones.linea_base, encoding="utf-8") as archivo:
+            informe["comparacion"] = comparar(informe, json.load(archivo), opciones.tolerancia)
+    print(json.dumps(informe, indent=2, ensure_ascii=False))
+    return 1 if informe.get("comparacion", {}).get("regresiones") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Bytes por préstamo guardado: modelo pydantic completo, `PrestamoCompacto`
+y fila del archivo columnar de préstamos devueltos
+
+Se miden con tracemalloc los bytes retenidos por un diccionario id ->
+préstamo (o por el archivo), incluidas las cadenas y fechas de cada
+registro. Uso:
+
+    python -m benchmarks.memoria_prestamos [cantidad]
+"""
+import gc
+import json
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from src.archivo import ArchivoPrestamos
+from src.compacto import PrestamoCompacto
+from src.models import Prestamo
+
+CANTIDAD = 100000
+LECTORES = 5000
+COPIAS = 20000
+
+
+def generar(n: int):
+    inicio = datetime(2025, 1, 1)
+    for i in range(n):
+        # Las cadenas se construyen en cada iteración, como al leerlas de JSON
+        yield Prestamo(
+            id=f"prestamo_{i:012x}",
+            copia_id=f"copia{i % COPIAS}",
+            lector_email=f"lector{i % LECTORES}@universidad.edu",
+            fecha_prestamo=inicio + timedelta(minutes=i),
+            fecha_devolucion_esperada=inicio + timedelta(days=30, minutes=i),
+            fecha_devolucion_real=inicio + timedelta(days=20, minutes=i),
+            dias_retraso=i % 3)
+
+
+def bytes_retenidos(n: int, crear_almacen, guardar) -> int:
+    gc.collect()
+    tracemalloc.start()
+    almacen = crear_almacen()
+    for prestamo in generar(n):
+        guardar(almacen, prestamo)
+    gc.collect()
+    retenidos, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del almacen
+    return retenidos
+
+
+def guardar_modelo(tabla, prestamo):
+    tabla[prestamo.id] = prestamo
+
+
+def guardar_compacto(tabla, prestamo):
+    tabla[prestamo.id] = PrestamoCompacto.desde_modelo(prestamo)
+
+
+def main(n: int):
+    modelo = bytes_retenidos(n, dict, guardar_modelo)
+    compacto = bytes_retenidos(n, dict, guardar_compacto)
+    archivado = bytes_retenidos(n, ArchivoPrestamos, ArchivoPrestamos.agregar)
+    print(json.dumps({
+        "prestamos": n,
+        "bytes_por_prestamo_modelo": round(modelo / n),
+        "bytes_por_prestamo_compacto": round(compacto / n),
+        "bytes_por_prestamo_archivado": round(archivado / n),
+        "reduccion_compacto": round(modelo / compacto, 2),
+        "reduccion_archivado": round(modelo / archivado, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else CANTIDAD)
@@ -0,0 +1,200 @@
+"""
+Micro-benchmarks en proceso de las rutas de datos más usadas, a varias
+escalas
+
+Para cada tamaño n se llena un almacén con n filas y se mide:
+
+- BioAlert: `suscribir`, `notificar_disponibilidad` y
+  `obtener_suscripciones` (de un lector y de todos)
+- pydantic: validación y serialización JSON de Libro, Copia, Lector y
+  Prestamo, por fila
+- RepositorioMemoria: `buscar_libros_por_autor`, `copias_de_libro` y
+  `prestamos_de_lector`, que sirven /libros/autor, /copias/libro y
+  /prestamos/lector
+
+Cada libro tiene 10 suscriptores, cada lector 10 suscripciones y 10
+préstamos, y cada autor 10 libros, así que el tamaño de cada resultado no
+depende de n. El `exponente` es la pendiente log-log del tiempo por unidad
+frente a n: cerca de 0 es constante y cerca de 1 delata un recorrido O(n).
+Uso:
+
+    python -m benchmarks.micro [tamaño ...]
+"""
+import gc
+import json
+import math
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Sequence
+from pydantic import TypeAdapter
+from src.models import Autor, BioAlert, Copia, EstadoCopia, Lector, Libro, Prestamo, Suscripcion
+from src.repositorio import RepositorioMemoria
+
+TAMANIOS = (10000, 100000, 1000000)
+LLAMADAS = 2000
+LLAMADAS_RECORRIDO = 3
+LOTE = 50000
+REPETICIONES = 3
+POR_GRUPO = 10
+INICIO = datetime(2025, 1, 1)
+
+
+def medir(funcion: Callable, argumentos: Sequence, repeticiones: int = REPETICIONES) -> float:
+    """
+    Mejor media en microsegundos por llamada sobre los argumentos dados.
+    Como en timeit, el recolector de ciclos no corre mientras se mide.
+    """
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        gc.disable()
+        inicio = time.perf_counter()
+        for argumento in argumentos:
+            funcion(argumento)
+        mejor = min(mejor, (time.perf_counter() - inicio) / len(argumentos))
+        gc.enable()
+    return mejor * 1e6
+
+
+def apellido(i: int) -> str:
+    """Cadena de 5 letras distinta para cada i < 26**5"""
+    letras = []
+    for _ in range(5):
+        i, resto = divmod(i, 26)
+        letras.append(string.ascii_lowercase[resto])
+    return "".join(letras).capitalize()
+
+
+def bioalert(n: int, azar: random.Random) -> Dict[str, float]:
+    grupos = max(POR_GRUPO, n // POR_GRUPO)
+    bio = BioAlert()
+    bio.limpiar()
+    for i in range(n):
+        # (i % grupos, i // 10) no se repite: cada libro tiene 10 lectores distintos
+        bio.agregar(Suscripcion.model_construct(
+            lector_email=f"lector{i % grupos}@universidad.edu",
+            libro_id=f"libro{i // POR_GRUPO}", fecha_suscripcion=INICIO))
+    libros = n // POR_GRUPO
+    lectores = [f"lector{azar.randrange(grupos)}@universidad.edu" for _ in range(LLAMADAS)]
+    nuevas = [(f"nuevo{k}@universidad.edu", f"libro{azar.randrange(libros)}")
+              for k in range(LLAMADAS)]
+    resultados = {
+        "bioalert.obtener_suscripciones(lector)": medir(bio.obtener_suscripciones, lectores),
+        "bioalert.obtener_suscripciones()": medir(
+            lambda _: bio.obtener_suscripciones(), range(LLAMADAS_RECORRIDO), 1),
+        "bioalert.suscribir": medir(lambda par: bio.suscribir(*par), nuevas, 1),
+        "bioalert.notificar_disponibilidad": medir(
+            bio.notificar_disponibilidad,
+            [f"libro{i}" for i in azar.sample(range(libros), min(LLAMADAS, libros))], 1),
+    }
+    bio.limpiar()
+    return resultados
+
+
+def generar_filas(modelo, desde: int, hasta: int) -> List[dict]:
+    if modelo is Libro:
+        return [{"id": f"libro{i}", "nombre": f"Libro {i}", "anio": 2000 + i % 25,
+                 "autor": {"nombre": f"{apellido(i // POR_GRUPO)} Autor",
+                           "fecha_nacimiento": "1950-01-01T00:00:00"}}
+                for i in range(desde, hasta)]
+    if modelo is Copia:
+        return [{"id": f"copia{i}", "libro_id": f"libro{i // 3}", "estado": "disponible",
+                 "edicion": "9th", "idioma": "ingles"} for i in range(desde, hasta)]
+    if modelo is Lector:
+        return [{"email": f"lector{i}@universidad.edu", "nombre": f"Lector {i}",
+                 "prestamos_activos": [f"prestamo{i}"]} for i in range(desde, hasta)]
+    return [{"id": f"prestamo{i}", "copia_id": f"copia{i}",
+             "lector_email": f"lector{i // POR_GRUPO}@universidad.edu",
+             "fecha_prestamo": "2025-01-01T00:00:00",
+             "fecha_devolucion_esperada": "2025-01-31T00:00:00"}
+            for i in range(desde, hasta)]
+
+
+def modelos(n: int, azar: random.Random) -> Dict[str, float]:
+    """Validación y serialización por lotes; tiempo por fila"""
+    resultados = {}
+    for modelo in (Libro, Copia, Lector, Prestamo):
+        adaptador = TypeAdapter(List[modelo])
+        validar = serializar = 0.0
+        for desde in range(0, n, LOTE):
+            filas = generar_filas(modelo, desde, min(n, desde + LOTE))
+            gc.disable()
+            inicio = time.perf_counter()
+            validados = adaptador.validate_python(filas)
+            validar += time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            adaptador.dump_json(validados)
+            serializar += time.perf_counter() - inicio
+            gc.enable()
+        resultados[f"pydantic.validar.{modelo.__name__}"] = validar / n * 1e6
+        resultados[f"pydantic.serializar.{modelo.__name__}"] = serializar / n * 1e6
+    return resultados
+
+
+def repositorio(n: int, azar: random.Random) -> Dict[str, float]:
+    repo = RepositorioMemoria()
+    fecha_nacimiento = datetime(1950, 1, 1)
+    for i in range(n):
+        repo.agregar_libro(Libro.model_construct(
+            id=f"libro{i}", nombre=f"Libro {i}", anio=2000 + i % 25,
+            autor=Autor.model_construct(
+                nombre=f"{apellido(i // POR_GRUPO)} Autor",
+                fecha_nacimiento=fecha_nacimiento)))
+    libros_con_copias = max(1, n // 3)
+    for i in range(n):
+        repo.agregar_copia(Copia.model_construct(
+            id=f"copia{i}", libro_id=f"libro{i % libros_con_copias}",
+            estado=EstadoCopia.DISPONIBLE, edicion="9th", idioma="ingles"))
+    grupos = max(1, n // POR_GRUPO)
+    for i in range(n):
+        # La mitad de los préstamos está devuelta y pasa al archivo
+        repo.agregar_prestamo(Prestamo.model_construct(
+            id=f"prestamo{i}", copia_id=f"copia{i}",
+            lector_email=f"lector{i % grupos}@universidad.edu",
+            fecha_prestamo=INICIO, fecha_devolucion_esperada=INICIO + timedelta(days=30),
+            fecha_devolucion_real=INICIO + timedelta(days=20) if i % 2 else None,
+            dias_retraso=0))
+
+    autores = [apellido(azar.randrange(grupos)) for _ in range(LLAMADAS)]
+    libros = [f"libro{azar.randrange(libros_con_copias)}" for _ in range(LLAMADAS)]
+    lectores = [f"lector{azar.randrange(grupos)}@universidad.edu" for _ in range(LLAMADAS)]
+    resultados = {
+        "repositorio.buscar_libros_por_autor": medir(repo.buscar_libros_por_autor, autores),
+        "repositorio.copias_de_libro": medir(repo.copias_de_libro, libros),
+        "repositorio.prestamos_de_lector": medir(repo.prestamos_de_lector, lectores),
+    }
+    repo.limpiar()
+    return resultados
+
+
+def exponente(tamanios: List[int], tiempos: List[float]) -> float:
+    if len(tamanios) < 2 or tiempos[0] <= 0:
+        return 0.0
+    return math.log(tiempos[-1] / tiempos[0]) / math.log(tamanios[-1] / tamanios[0])
+
+
+def main(tamanios: List[int]):
+    medidas: Dict[str, Dict[int, float]] = {}
+    for n in tamanios:
+        azar = random.Random(n)
+        for seccion in (bioalert, modelos, repositorio):
+            for operacion, us in seccion(n, azar).items():
+                medidas.setdefault(operacion, {})[n] = us
+            gc.collect()
+
+    resultados = []
+    for operacion, por_tamanio in medidas.items():
+        tiempos = [por_tamanio[n] for n in tamanios]
+        resultados.append({
+            "operacion": operacion,
+            "unidad": "fila" if operacion.startswith("pydantic.") else "llamada",
+            "us_por_unidad": {str(n): round(us, 3) for n, us in zip(tamanios, tiempos)},
+            "exponente": round(exponente(tamanios, tiempos), 2),
+        })
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main(sorted(int(valor) for valor in sys.argv[1:]) or list(TAMANIOS))
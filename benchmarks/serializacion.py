@@ -0,0 +1,89 @@
+"""
+CPU por petición al devolver listas grandes de Copia y Prestamo, con y sin
+`response_model`
+
+Sin modelo declarado FastAPI recorre la respuesta con `jsonable_encoder`;
+con modelo la valida y serializa pydantic-core. Uso:
+
+    python -m benchmarks.serializacion [tamaño ...]
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.models import Copia, EstadoCopia, Prestamo
+
+TAMANIOS = (1000, 10000, 50000)
+REPETICIONES = 5
+
+
+def generar_copias(n: int) -> List[Copia]:
+    return [Copia(id=f"copia{i}", libro_id=f"libro{i % 100}",
+                  estado=EstadoCopia.DISPONIBLE, edicion="9th", idioma="ingles")
+            for i in range(n)]
+
+
+def generar_prestamos(n: int) -> List[Prestamo]:
+    inicio = datetime(2025, 1, 1)
+    return [Prestamo(id=f"prestamo{i}", copia_id=f"copia{i}",
+                     lector_email=f"lector{i % 500}@universidad.edu",
+                     fecha_prestamo=inicio,
+                     fecha_devolucion_esperada=inicio + timedelta(days=30))
+            for i in range(n)]
+
+
+def crear_aplicacion(copias: List[Copia], prestamos: List[Prestamo]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/sin_modelo/copias")
+    def copias_sin_modelo():
+        return copias
+
+    @app.get("/con_modelo/copias", response_model=List[Copia])
+    def copias_con_modelo():
+        return copias
+
+    @app.get("/sin_modelo/prestamos")
+    def prestamos_sin_modelo():
+        return prestamos
+
+    @app.get("/con_modelo/prestamos", response_model=List[Prestamo])
+    def prestamos_con_modelo():
+        return prestamos
+
+    return app
+
+
+def medir(client: TestClient, ruta: str) -> float:
+    """Mejor tiempo de CPU del proceso por petición, en milisegundos"""
+    client.get(ruta)
+    mejor = float("inf")
+    for _ in range(REPETICIONES):
+        inicio = time.process_time()
+        client.get(ruta)
+        mejor = min(mejor, time.process_time() - inicio)
+    return mejor * 1000
+
+
+def main(tamanios):
+    resultados = []
+    for n in tamanios:
+        client = TestClient(crear_aplicacion(generar_copias(n), generar_prestamos(n)))
+        for entidad in ("copias", "prestamos"):
+            sin_modelo = medir(client, f"/sin_modelo/{entidad}")
+            con_modelo = medir(client, f"/con_modelo/{entidad}")
+            resultados.append({
+                "entidad": entidad,
+                "n": n,
+                "cpu_ms_sin_modelo": round(sin_modelo, 2),
+                "cpu_ms_con_modelo": round(con_modelo, 2),
+                "aceleracion": round(sin_modelo / con_modelo, 2),
+            })
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main([int(valor) for valor in sys.argv[1:]] or TAMANIOS)
@@ -1,7 +1,33 @@
-from fastapi import FastAPI, HTTPException, status
-from typing import Optional, Dict
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import os
+from typing import List, Optional, Union
 from datetime import datetime, timedelta
-from src.models import EstadoCopia, Autor, Libro, Copia, Lector, Prestamo, BioAlert
+from src.models import EstadoCopia, Autor, Libro, Copia, Lector, Prestamo, Suscripcion
+from src.repositorio import crear_repositorio, url_para_workers
+from src.paginacion import (
+    LIMITE_MAXIMO, LIMITE_POR_DEFECTO, codificar_cursor, decodificar_cursor)
+from src.exportacion import MEDIA_TYPE_NDJSON, lineas_ndjson, quiere_ndjson
+from src.ingesta import TAMANIO_LOTE, CuerpoInvalido, Ingesta, LectorRegistros, ModoIngesta
+from src.identificadores import GeneradorIds
+from src.notificaciones import DespachadorNotificaciones, crear_sumidero
+from src.vencimientos import AgendaCompartida, AgendaVencimientos, BarredorVencimientos
+from src.cache import CAPACIDAD_POR_DEFECTO, CacheRespuestas
+from src.perfiles import (
+    FormatoPerfil, MiddlewarePerfiles, OrdenPerfil, RutaPerfilable, crear_perfilador,
+    informe_pstats, pilas_colapsadas)
+from src.metricas import (
+    MEDIA_TYPE_PROMETHEUS, Contador, MetricasHttp, MiddlewareMetricas, RegistroMetricas)
+from src.memoria import DIFERENCIAS_POR_DEFECTO, ComparadorTracemalloc
+from src.estadisticas import (
+    TablaIncremental, distribucion_retrasos, lectores_por_suspension, prestamos_por_mes,
+    retrasos_por_libro)
+from src.respuestas import (
+    ConfiguracionPerfiles, DevolucionPrestamo, DisponibilidadLibro, DisponibilidadLibros,
+    DistribucionRetrasos, EstadisticasCache, InfoApi, LectorSuspendido, PaginaCursor,
+    EstadoTracemalloc, InformeMemoria, PerfilResumen, PrestamosMes, ResultadoIngesta,
+    RetrasoLibro, SuscripcionCreada)
 
 
 app = FastAPI(
@@ -9,15 +35,57 @@ app = FastAPI(
     version="1.0.0",
     description="API REST para gestión de biblioteca con préstamos, copias y sistema de alertas BioAlert"
 )
-
-libros_db: Dict[str, Libro] = {}
-copias_db: Dict[str, Copia] = {}
-lectores_db: Dict[str, Lector] = {}
-prestamos_db: Dict[str, Prestamo] = {}
-bio_alert = BioAlert()
+# Los endpoints se declaran después: todos quedan envueltos por el perfilador
+app.router.route_class = RutaPerfilable
+
+repositorio = crear_repositorio(os.environ.get("BIBLIOTECA_DB"))
+ids_prestamos = GeneradorIds("prestamo_")
+despachador = DespachadorNotificaciones(
+    repositorio.notificar_disponibilidad,
+    crear_sumidero(os.environ.get("BIBLIOTECA_NOTIFICACIONES")))
+if repositorio.compartido:
+    # Otros workers crean y devuelven préstamos: se consulta el almacén
+    agenda_vencimientos = AgendaCompartida(lambda desde, hasta: [
+        prestamo.id for prestamo in repositorio.prestamos_vencidos(desde, hasta)])
+else:
+    agenda_vencimientos = AgendaVencimientos()
+cache_respuestas = CacheRespuestas(int(os.environ.get(
+    "BIBLIOTECA_CACHE_RESPUESTAS", CAPACIDAD_POR_DEFECTO)))
+tabla_prestamos = TablaIncremental(repositorio.ampliar_historial, repositorio.agregar_activos)
+DIAS_SUSPENSION_POR_DIA_RETRASO = 2
+
+registro_metricas = RegistroMetricas()
+app.add_middleware(MiddlewareMetricas, metricas=MetricasHttp(registro_metricas, "biblioteca"))
+perfilador = crear_perfilador()
+comparador_memoria = ComparadorTracemalloc()
+app.add_middleware(MiddlewarePerfiles, perfilador=perfilador)
+prestamos_creados = registro_metricas.registrar(Contador(
+    "biblioteca_prestamos_creados_total", "Préstamos creados"))
+devoluciones = registro_metricas.registrar(Contador(
+    "biblioteca_devoluciones_total", "Préstamos devueltos"))
+devoluciones_con_retraso = registro_metricas.registrar(Contador(
+    "biblioteca_devoluciones_con_retraso_total", "Préstamos devueltos con retraso"))
+dias_suspension = registro_metricas.registrar(Contador(
+    "biblioteca_dias_suspension_total", "Días de suspensión impuestos por retrasos"))
+registro_metricas.registrar(Contador(
+    "biblioteca_notificaciones_enviadas_total", "Notificaciones BioAlert entregadas",
+    funcion=lambda: {(): despachador.enviadas}))
+registro_metricas.registrar(Contador(
+    "biblioteca_notificaciones_fallidas_total",
+    "Notificaciones BioAlert descartadas tras agotar los reintentos",
+    funcion=lambda: {(): despachador.total_fallidas}))
 notFoundBook = "Libro no encontrado"
 notFoundCopy = "Copia no encontrada"
 notFoundReader = "Lector no encontrado"
+notFoundProfile = "Perfil no encontrado"
+invalidCursor = "Cursor inválido"
+limitDescription = "Tamaño de página; activa la paginación por cursor"
+cursorDescription = "Cursor opaco devuelto como next_cursor en la página anterior"
+formatDescription = "json (por defecto) o ndjson para exportar en streaming"
+modeDescription = "todo_o_nada (por defecto) o mejor_esfuerzo"
+idsDescription = "ID de un libro; repetir el parámetro para consultar varios"
+sinceDescription = "Solo préstamos realizados desde esta fecha (incluida)"
+untilDescription = "Solo préstamos realizados antes de esta fecha"
 
 
 def inicializar_datos():
@@ -32,7 +100,6 @@ def inicializar_datos():
         anio=2015,
         autor=autor_somerville
     )
-    libros_db[libro1.id] = libro1
 
     copias = [
         Copia(id="copia1", libro_id=libro1.id,
@@ -43,22 +110,130 @@ def inicializar_datos():
               estado=EstadoCopia.DISPONIBLE, edicion="9th", idioma="espanol"),
     ]
 
-    for copia in copias:
-        copias_db[copia.id] = copia
+    with repositorio.bloquear():
+        if repositorio.obtener_libro(libro1.id) is not None:
+            return
+        repositorio.agregar_libro(libro1)
+        for copia in copias:
+            repositorio.agregar_copia(copia)
 
 
 inicializar_datos()
 
 
-@app.get("/", tags=["General"])
+def cargar_agenda_vencimientos():
+    agenda_vencimientos.limpiar()
+    if repositorio.compartido:
+        return
+    for prestamo in repositorio.iterar_prestamos_activos():
+        agenda_vencimientos.programar(prestamo.id, prestamo.fecha_devolucion_esperada)
+
+
+def marcar_vencido(prestamo_id: str):
+    prestamo = repositorio.obtener_prestamo(prestamo_id)
+    if prestamo is None or prestamo.fecha_devolucion_real is not None:
+        # Devuelto en otro worker, cuya agenda es la que se canceló
+        agenda_vencimientos.cancelar(prestamo_id)
+        return
+    with repositorio.bloquear(copias=[prestamo.copia_id]):
+        prestamo = repositorio.obtener_prestamo(prestamo_id)
+        if prestamo.fecha_devolucion_real is not None:
+            agenda_vencimientos.cancelar(prestamo_id)
+            return
+        copia = repositorio.obtener_copia(prestamo.copia_id)
+        if copia.estado == EstadoCopia.PRESTADA:
+            copia.estado = EstadoCopia.CON_RETRASO
+            repositorio.actualizar_copia(copia)
+
+
+cargar_agenda_vencimientos()
+barredor = BarredorVencimientos(
+    agenda_vencimientos, marcar_vencido,
+    float(os.environ.get("BIBLIOTECA_INTERVALO_VENCIMIENTOS", "60")))
+barredor.iniciar()
+
+
+def paginar_respuesta(obtener_pagina, limit: Optional[int], cursor: Optional[str]):
+    try:
+        desde = decodificar_cursor(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail=invalidCursor)
+    items, siguiente = obtener_pagina(desde, limit or LIMITE_POR_DEFECTO)
+    return PaginaCursor(
+        items=items,
+        next_cursor=codificar_cursor(siguiente) if siguiente is not None else None
+    )
+
+
+def no_modificado(etag: str, if_none_match: Optional[str]) -> bool:
+    """
+    Comparación débil de If-None-Match: una etiqueta W/ coincide con la
+    fuerte del mismo valor
+    """
+    if if_none_match is None:
+        return False
+    etiquetas = {valor.strip().removeprefix("W/") for valor in if_none_match.split(",")}
+    return "*" in etiquetas or etag in etiquetas
+
+
+def respuesta_cacheada(clave: str, version: str, generar, etag: Optional[str] = None):
+    """
+    Sirve el JSON ya codificado de la caché de respuestas; `generar` solo se
+    llama si la versión guardada no coincide
+    """
+    cuerpo = cache_respuestas.cuerpo(clave, version, generar)
+    return Response(cuerpo, media_type="application/json",
+                    headers={"ETag": etag} if etag else None)
+
+
+def exportar_ndjson(modelos):
+    return StreamingResponse(lineas_ndjson(modelos), media_type=MEDIA_TYPE_NDJSON)
+
+
+async def ingerir_cuerpo(request: Request, modo: ModoIngesta, **opciones):
+    """
+    Decodifica el cuerpo a medida que llega y procesa cada `TAMANIO_LOTE`
+    registros en el threadpool. En modo mejor_esfuerzo, un error de sintaxis
+    a mitad de un arreglo JSON conserva los elementos leídos hasta entonces y
+    se reporta en el índice donde se detuvo la lectura.
+    """
+    lector = LectorRegistros(MEDIA_TYPE_NDJSON in request.headers.get("content-type", ""))
+    ingesta = Ingesta(modo=modo, lote=repositorio.lote, **opciones)
+    registros = []
+    try:
+        async for fragmento in request.stream():
+            registros.extend(lector.alimentar(fragmento))
+            if len(registros) >= TAMANIO_LOTE:
+                await run_in_threadpool(ingesta.procesar, registros)
+                registros = []
+        registros.extend(lector.terminar())
+    except CuerpoInvalido as error:
+        if modo == ModoIngesta.TODO_O_NADA or lector.indice == 0:
+            raise HTTPException(status_code=400, detail=str(error))
+        registros.extend(lector.pendientes())
+        lector.errores.append({"indice": lector.indice, "detalle": str(error)})
+    await run_in_threadpool(ingesta.procesar, registros)
+    reporte = await run_in_threadpool(ingesta.terminar, lector.errores)
+    if reporte["errores"] and modo == ModoIngesta.TODO_O_NADA:
+        raise HTTPException(status_code=400, detail=reporte)
+    return reporte
+
+
+def verificar_libro_de_copia(copia: Copia):
+    if repositorio.obtener_libro(copia.libro_id) is None:
+        return notFoundBook
+    return None
+
+
+@app.get("/", response_model=InfoApi, tags=["General"])
 def root():
     """
     Endpoint raíz que retorna información básica de la API
     """
-    return {"mensaje": "API Sistema de Biblioteca", "version": "1.0.0"}
+    return InfoApi(mensaje="API Sistema de Biblioteca", version="1.0.0")
 
 
-@app.post("/libros/", status_code=status.HTTP_201_CREATED, tags=["Libros"])
+@app.post("/libros/", response_model=Libro, status_code=status.HTTP_201_CREATED, tags=["Libros"])
 def crear_libro(libro: Libro):
     """
     Crea un nuevo libro en el sistema
@@ -68,45 +243,143 @@ def crear_libro(libro: Libro):
     - **anio**: Año de publicación
     - **autor**: Información del autor (nombre y fecha de nacimiento)
     """
-    if libro.id in libros_db:
+    if repositorio.obtener_libro(libro.id) is not None:
         raise HTTPException(status_code=400, detail="El libro ya existe")
-    libros_db[libro.id] = libro
-    return libro
+    return repositorio.agregar_libro(libro)
+
+
+@app.post("/libros/bulk",
+          response_model=ResultadoIngesta, status_code=status.HTTP_201_CREATED, tags=["Libros"])
+async def crear_libros_bulk(
+        request: Request,
+        modo: ModoIngesta = Query(ModoIngesta.TODO_O_NADA, description=modeDescription)):
+    """
+    Crea libros en bloque con las mismas validaciones que el alta individual
+
+    El cuerpo puede ser un arreglo JSON o un flujo NDJSON
+    (`Content-Type: application/x-ndjson`). La respuesta indica cuántos
+    registros se insertaron y los errores de cada elemento por su índice.
+
+    - **modo**: `todo_o_nada` rechaza el lote completo (400) si algún elemento
+      falla; `mejor_esfuerzo` inserta los válidos y reporta el resto
+    """
+    return await ingerir_cuerpo(
+        request, modo, modelo=Libro, clave=lambda libro: libro.id,
+        existe=lambda libro_id: repositorio.obtener_libro(libro_id) is not None,
+        mensaje_duplicado="El libro ya existe",
+        guardar=repositorio.agregar_libro)
 
 
-@app.get("/libros/", tags=["Libros"])
-def listar_libros():
+@app.get("/libros/", response_model=Union[List[Libro], PaginaCursor[Libro]], tags=["Libros"])
+def listar_libros(
+        limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description=limitDescription),
+        cursor: Optional[str] = Query(None, description=cursorDescription),
+        formato: Optional[str] = Query(
+            None, alias="format", pattern="^(json|ndjson)$", description=formatDescription),
+        accept: Optional[str] = Header(None),
+        if_none_match: Optional[str] = Header(None)):
     """
     Obtiene la lista de todos los libros registrados en el sistema
+
+    Si se indica `limit` o `cursor` la respuesta es una página
+    `{"items": [...], "next_cursor": ...}`; sin ellos se devuelve la lista completa
+
+    - **limit**: (Opcional) Tamaño de página
+    - **cursor**: (Opcional) Valor de `next_cursor` de la página anterior
+    - **format**: (Opcional) `ndjson` exporta un registro por línea en streaming;
+      también se activa con `Accept: application/x-ndjson`
+
+    Las respuestas JSON llevan ETag; con `If-None-Match` se responde 304
+    mientras no cambie ningún libro
+    """
+    if quiere_ndjson(formato, accept):
+        return exportar_ndjson(repositorio.iterar_libros())
+    version = repositorio.version("libros")
+    etag = f'"{version}"'
+    if no_modificado(etag, if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    if limit is None and cursor is None:
+        return respuesta_cacheada(
+            "libros", version, lambda: list(repositorio.iterar_libros()), etag)
+    return respuesta_cacheada(
+        f"libros?limit={limit}&cursor={cursor}", version,
+        lambda: paginar_respuesta(repositorio.pagina_libros, limit, cursor), etag)
+
+
+def resumen_disponibilidad(libro_id: str, contadores) -> DisponibilidadLibro:
+    copias = {estado.value: contadores.get(estado, 0) for estado in EstadoCopia}
+    return DisponibilidadLibro(
+        libro_id=libro_id,
+        disponible=copias[EstadoCopia.DISPONIBLE.value] > 0,
+        total_copias=sum(copias.values()),
+        copias=copias,
+    )
+
+
+@app.get("/libros/disponibilidad", response_model=DisponibilidadLibros, tags=["Libros"])
+def disponibilidad_libros(ids: List[str] = Query(..., description=idsDescription)):
+    """
+    Consulta la disponibilidad de varios libros en una sola petición. Los IDs
+    que no corresponden a ningún libro se devuelven en `no_encontrados`
+
+    - **ids**: IDs de los libros (repetir el parámetro para cada uno)
+    """
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > LIMITE_MAXIMO:
+        raise HTTPException(status_code=400,
+                            detail=f"Se admiten como máximo {LIMITE_MAXIMO} libros")
+    encontrados = [libro_id for libro_id in ids
+                   if repositorio.obtener_libro(libro_id) is not None]
+    contadores = repositorio.disponibilidad(encontrados)
+    return DisponibilidadLibros(
+        libros=[resumen_disponibilidad(libro_id, contadores[libro_id])
+                for libro_id in encontrados],
+        no_encontrados=[libro_id for libro_id in ids if libro_id not in contadores],
+    )
+
+
+@app.get("/libros/{libro_id}/disponibilidad", response_model=DisponibilidadLibro, tags=["Libros"])
+def disponibilidad_libro(libro_id: str):
     """
-    return list(libros_db.values())
+    Número de copias de un libro en cada estado, sin recorrer sus copias
+
+    - **libro_id**: Identificador único del libro
+    """
+    if repositorio.obtener_libro(libro_id) is None:
+        raise HTTPException(status_code=404, detail=notFoundBook)
+    contadores = repositorio.disponibilidad([libro_id])[libro_id]
+    return resumen_disponibilidad(libro_id, contadores)
 
 
-@app.get("/libros/{libro_id}", tags=["Libros"])
+@app.get("/libros/{libro_id}", response_model=Libro, tags=["Libros"])
 def obtener_libro(libro_id: str):
     """
     Obtiene la información de un libro específico por su ID
 
     - **libro_id**: Identificador único del libro
     """
-    if libro_id not in libros_db:
-        raise HTTPException(status_code=404, detail=notFoundBook)
-    return libros_db[libro_id]
+    def generar():
+        libro = repositorio.obtener_libro(libro_id)
+        if libro is None:
+            raise HTTPException(status_code=404, detail=notFoundBook)
+        return libro
+
+    clave = f"libro:{libro_id}"
+    return respuesta_cacheada(clave, repositorio.version(clave), generar)
 
 
-@app.get("/libros/autor/{nombre_autor}", tags=["Libros"])
+@app.get("/libros/autor/{nombre_autor}", response_model=List[Libro], tags=["Libros"])
 def buscar_libros_por_autor(nombre_autor: str):
     """
-    Busca libros por nombre del autor (búsqueda parcial case-insensitive)
+    Busca libros por nombre del autor (búsqueda parcial que ignora
+    mayúsculas y acentos)
 
     - **nombre_autor**: Nombre o parte del nombre del autor a buscar
     """
-    libros = [libro for libro in libros_db.values()
-              if nombre_autor.lower() in libro.autor.nombre.lower()]
-    return libros
+    return repositorio.buscar_libros_por_autor(nombre_autor)
 
 
-@app.post("/copias/", status_code=status.HTTP_201_CREATED, tags=["Copias"])
+@app.post("/copias/", response_model=Copia, status_code=status.HTTP_201_CREATED, tags=["Copias"])
 def crear_copia(copia: Copia):
     """
     Crea una nueva copia de un libro existente
@@ -117,49 +390,97 @@ def crear_copia(copia: Copia):
     - **edicion**: Edición del libro (ej: "8th", "9th")
     - **idioma**: Idioma de la copia
     """
-    if copia.id in copias_db:
+    if repositorio.obtener_copia(copia.id) is not None:
         raise HTTPException(status_code=400, detail="La copia ya existe")
-    if copia.libro_id not in libros_db:
+    if repositorio.obtener_libro(copia.libro_id) is None:
         raise HTTPException(status_code=404, detail=notFoundBook)
-    copias_db[copia.id] = copia
-    return copia
+    return repositorio.agregar_copia(copia)
 
 
-@app.get("/copias/", tags=["Copias"])
-def listar_copias():
+@app.post("/copias/bulk",
+          response_model=ResultadoIngesta, status_code=status.HTTP_201_CREATED, tags=["Copias"])
+async def crear_copias_bulk(
+        request: Request,
+        modo: ModoIngesta = Query(ModoIngesta.TODO_O_NADA, description=modeDescription)):
+    """
+    Crea copias en bloque; cada copia debe referirse a un libro existente
+
+    El cuerpo puede ser un arreglo JSON o un flujo NDJSON
+    (`Content-Type: application/x-ndjson`). La respuesta indica cuántos
+    registros se insertaron y los errores de cada elemento por su índice.
+
+    - **modo**: `todo_o_nada` rechaza el lote completo (400) si algún elemento
+      falla; `mejor_esfuerzo` inserta los válidos y reporta el resto
+    """
+    return await ingerir_cuerpo(
+        request, modo, modelo=Copia, clave=lambda copia: copia.id,
+        existe=lambda copia_id: repositorio.obtener_copia(copia_id) is not None,
+        mensaje_duplicado="La copia ya existe",
+        guardar=repositorio.agregar_copia, verificar=verificar_libro_de_copia)
+
+
+@app.get("/copias/", response_model=Union[List[Copia], PaginaCursor[Copia]], tags=["Copias"])
+def listar_copias(
+        limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description=limitDescription),
+        cursor: Optional[str] = Query(None, description=cursorDescription),
+        formato: Optional[str] = Query(
+            None, alias="format", pattern="^(json|ndjson)$", description=formatDescription),
+        accept: Optional[str] = Header(None)):
     """
     Obtiene la lista de todas las copias registradas
+
+    Si se indica `limit` o `cursor` la respuesta es una página
+    `{"items": [...], "next_cursor": ...}`; sin ellos se devuelve la lista completa
+
+    - **limit**: (Opcional) Tamaño de página
+    - **cursor**: (Opcional) Valor de `next_cursor` de la página anterior
+    - **format**: (Opcional) `ndjson` exporta un registro por línea en streaming;
+      también se activa con `Accept: application/x-ndjson`
     """
-    return list(copias_db.values())
+    if quiere_ndjson(formato, accept):
+        return exportar_ndjson(repositorio.iterar_copias())
+    if limit is None and cursor is None:
+        return list(repositorio.iterar_copias())
+    return paginar_respuesta(repositorio.pagina_copias, limit, cursor)
 
 
-@app.get("/copias/libro/{libro_id}", tags=["Copias"])
-def obtener_copias_libro(libro_id: str):
+@app.get("/copias/libro/{libro_id}", response_model=List[Copia], tags=["Copias"])
+def obtener_copias_libro(libro_id: str, if_none_match: Optional[str] = Header(None)):
     """
-    Obtiene todas las copias de un libro específico
+    Obtiene todas las copias de un libro específico. Admite `If-None-Match`
+    con el ETag de una respuesta anterior
 
     - **libro_id**: Identificador del libro
     """
-    if libro_id not in libros_db:
+    clave = f"copias_libro:{libro_id}"
+    version = repositorio.version(clave)
+    etag = f'"{version}"'
+    if repositorio.obtener_libro(libro_id) is None:
         raise HTTPException(status_code=404, detail=notFoundBook)
-    copias = [copia for copia in copias_db.values() if copia.libro_id ==
-              libro_id]
-    return copias
+    if no_modificado(etag, if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return respuesta_cacheada(
+        clave, version, lambda: repositorio.copias_de_libro(libro_id), etag)
 
 
-@app.get("/copias/{copia_id}", tags=["Copias"])
+@app.get("/copias/{copia_id}", response_model=Copia, tags=["Copias"])
 def obtener_copia(copia_id: str):
     """
     Obtiene la información de una copia específica
 
     - **copia_id**: Identificador de la copia
     """
-    if copia_id not in copias_db:
-        raise HTTPException(status_code=404, detail=notFoundCopy)
-    return copias_db[copia_id]
+    def generar():
+        copia = repositorio.obtener_copia(copia_id)
+        if copia is None:
+            raise HTTPException(status_code=404, detail=notFoundCopy)
+        return copia
 
+    clave = f"copia:{copia_id}"
+    return respuesta_cacheada(clave, repositorio.version(clave), generar)
 
-@app.put("/copias/{copia_id}/estado", tags=["Copias"])
+
+@app.put("/copias/{copia_id}/estado", response_model=Copia, tags=["Copias"])
 def actualizar_estado_copia(copia_id: str, estado: EstadoCopia):
     """
     Actualiza el estado de una copia
@@ -167,13 +488,16 @@ def actualizar_estado_copia(copia_id: str, estado: EstadoCopia):
     - **copia_id**: Identificador de la copia
     - **estado**: Nuevo estado (disponible, prestada, reservada, con_retraso, en_reparacion)
     """
-    if copia_id not in copias_db:
-        raise HTTPException(status_code=404, detail=notFoundCopy)
-    copias_db[copia_id].estado = estado
-    return copias_db[copia_id]
+    with repositorio.bloquear(copias=[copia_id]):
+        copia = repositorio.obtener_copia(copia_id)
+        if copia is None:
+            raise HTTPException(status_code=404, detail=notFoundCopy)
+        copia.estado = estado
+        return repositorio.actualizar_copia(copia)
 
 
-@app.post("/lectores/", status_code=status.HTTP_201_CREATED, tags=["Lectores"])
+@app.post("/lectores/",
+          response_model=Lector, status_code=status.HTTP_201_CREATED, tags=["Lectores"])
 def crear_lector(lector: Lector):
     """
     Registra un nuevo lector en el sistema
@@ -181,33 +505,73 @@ def crear_lector(lector: Lector):
     - **email**: Correo electrónico del lector (usado como identificador)
     - **nombre**: Nombre completo del lector
     """
-    if lector.email in lectores_db:
+    if repositorio.obtener_lector(lector.email) is not None:
         raise HTTPException(status_code=400, detail="El lector ya existe")
-    lectores_db[lector.email] = lector
-    return lector
+    return repositorio.agregar_lector(lector)
+
+
+@app.post("/lectores/bulk",
+          response_model=ResultadoIngesta, status_code=status.HTTP_201_CREATED, tags=["Lectores"])
+async def crear_lectores_bulk(
+        request: Request,
+        modo: ModoIngesta = Query(ModoIngesta.TODO_O_NADA, description=modeDescription)):
+    """
+    Registra lectores en bloque con las mismas validaciones que el alta individual
+
+    El cuerpo puede ser un arreglo JSON o un flujo NDJSON
+    (`Content-Type: application/x-ndjson`). La respuesta indica cuántos
+    registros se insertaron y los errores de cada elemento por su índice.
+
+    - **modo**: `todo_o_nada` rechaza el lote completo (400) si algún elemento
+      falla; `mejor_esfuerzo` inserta los válidos y reporta el resto
+    """
+    return await ingerir_cuerpo(
+        request, modo, modelo=Lector, clave=lambda lector: lector.email,
+        existe=lambda email: repositorio.obtener_lector(email) is not None,
+        mensaje_duplicado="El lector ya existe",
+        guardar=repositorio.agregar_lector)
 
 
-@app.get("/lectores/", tags=["Lectores"])
-def listar_lectores():
+@app.get("/lectores/", response_model=Union[List[Lector], PaginaCursor[Lector]], tags=["Lectores"])
+def listar_lectores(
+        limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description=limitDescription),
+        cursor: Optional[str] = Query(None, description=cursorDescription)):
     """
     Obtiene la lista de todos los lectores registrados
+
+    Si se indica `limit` o `cursor` la respuesta es una página
+    `{"items": [...], "next_cursor": ...}`; sin ellos se devuelve la lista completa
+
+    - **limit**: (Opcional) Tamaño de página
+    - **cursor**: (Opcional) Valor de `next_cursor` de la página anterior
     """
-    return list(lectores_db.values())
+    if limit is None and cursor is None:
+        return list(repositorio.iterar_lectores())
+    return paginar_respuesta(repositorio.pagina_lectores, limit, cursor)
 
 
-@app.get("/lectores/{email}", tags=["Lectores"])
-def obtener_lector(email: str):
+@app.get("/lectores/{email}", response_model=Lector, tags=["Lectores"])
+def obtener_lector(email: str, response: Response,
+                   if_none_match: Optional[str] = Header(None)):
     """
-    Obtiene la información de un lector específico
+    Obtiene la información de un lector específico. Admite `If-None-Match`
+    con el ETag de una respuesta anterior
 
     - **email**: Correo electrónico del lector
     """
-    if email not in lectores_db:
+    version = repositorio.version(f"lector:{email}")
+    etag = f'"{version}"'
+    lector = repositorio.obtener_lector(email)
+    if lector is None:
         raise HTTPException(status_code=404, detail=notFoundReader)
-    return lectores_db[email]
+    if no_modificado(etag, if_none_match):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return lector
 
 
-@app.post("/prestamos/", status_code=status.HTTP_201_CREATED, tags=["Préstamos"])
+@app.post("/prestamos/",
+          response_model=Prestamo, status_code=status.HTTP_201_CREATED, tags=["Préstamos"])
 def crear_prestamo(copia_id: str, lector_email: str):
     """
     Crea un nuevo préstamo de una copia a un lector
@@ -221,52 +585,56 @@ def crear_prestamo(copia_id: str, lector_email: str):
     - **copia_id**: Identificador de la copia a prestar
     - **lector_email**: Email del lector que solicita el préstamo
     """
-    if copia_id not in copias_db:
-        raise HTTPException(status_code=404, detail=notFoundCopy)
-    if lector_email not in lectores_db:
-        raise HTTPException(status_code=404, detail=notFoundReader)
+    with repositorio.bloquear(copias=[copia_id], lectores=[lector_email]):
+        copia = repositorio.obtener_copia(copia_id)
+        if copia is None:
+            raise HTTPException(status_code=404, detail=notFoundCopy)
+        lector = repositorio.obtener_lector(lector_email)
+        if lector is None:
+            raise HTTPException(status_code=404, detail=notFoundReader)
 
-    copia = copias_db[copia_id]
-    lector = lectores_db[lector_email]
-
-    if copia.estado != EstadoCopia.DISPONIBLE:
-        raise HTTPException(
-            status_code=400, detail=f"La copia no está disponible. Estado: {copia.estado}")
-
-    if len(lector.prestamos_activos) >= 3:
-        raise HTTPException(
-            status_code=400, detail="El lector ya tiene 3 préstamos activos")
-
-    if lector.dias_suspension > 0:
-        if lector.fecha_fin_suspension and datetime.now() < lector.fecha_fin_suspension:
+        if copia.estado != EstadoCopia.DISPONIBLE:
             raise HTTPException(
-                status_code=400,
-                detail=f"Lector suspendido hasta {lector.fecha_fin_suspension}"
-            )
-        else:
-            lector.dias_suspension = 0
-            lector.fecha_fin_suspension = None
-
-    prestamo_id = f"prestamo_{copia_id}_{int(datetime.now().timestamp())}"
-    fecha_prestamo = datetime.now()
-    fecha_devolucion = fecha_prestamo + timedelta(days=30)
-
-    prestamo = Prestamo(
-        id=prestamo_id,
-        copia_id=copia_id,
-        lector_email=lector_email,
-        fecha_prestamo=fecha_prestamo,
-        fecha_devolucion_esperada=fecha_devolucion
-    )
-
-    prestamos_db[prestamo_id] = prestamo
-    copia.estado = EstadoCopia.PRESTADA
-    lector.prestamos_activos.append(prestamo_id)
+                status_code=400, detail=f"La copia no está disponible. Estado: {copia.estado}")
 
+        if len(lector.prestamos_activos) >= 3:
+            raise HTTPException(
+                status_code=400, detail="El lector ya tiene 3 préstamos activos")
+
+        if lector.dias_suspension > 0:
+            if lector.fecha_fin_suspension and datetime.now() < lector.fecha_fin_suspension:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Lector suspendido hasta {lector.fecha_fin_suspension}"
+                )
+            else:
+                lector.dias_suspension = 0
+                lector.fecha_fin_suspension = None
+
+        prestamo_id = ids_prestamos.nuevo()
+        fecha_prestamo = datetime.now()
+        fecha_devolucion = fecha_prestamo + timedelta(days=30)
+
+        prestamo = Prestamo(
+            id=prestamo_id,
+            copia_id=copia_id,
+            lector_email=lector_email,
+            fecha_prestamo=fecha_prestamo,
+            fecha_devolucion_esperada=fecha_devolucion
+        )
+
+        repositorio.agregar_prestamo(prestamo)
+        copia.estado = EstadoCopia.PRESTADA
+        repositorio.actualizar_copia(copia)
+        lector.prestamos_activos.append(prestamo_id)
+        repositorio.actualizar_lector(lector)
+        agenda_vencimientos.programar(prestamo_id, fecha_devolucion)
+
+    prestamos_creados.incrementar()
     return prestamo
 
 
-@app.put("/prestamos/{prestamo_id}/devolver", tags=["Préstamos"])
+@app.put("/prestamos/{prestamo_id}/devolver", response_model=DevolucionPrestamo, tags=["Préstamos"])
 def devolver_prestamo(prestamo_id: str):
     """
     Registra la devolución de un libro prestado
@@ -274,64 +642,129 @@ def devolver_prestamo(prestamo_id: str):
     Si hay retraso:
     - Se calculan los días de retraso
     - Se aplica una multa de 2 días de suspensión por cada día de retraso
-    - Se notifica a los usuarios suscritos via BioAlert
+
+    En todos los casos se encola la notificación BioAlert a los usuarios
+    suscritos; la entrega ocurre en segundo plano
 
     - **prestamo_id**: Identificador del préstamo a devolver
     """
-    if prestamo_id not in prestamos_db:
+    prestamo = repositorio.obtener_prestamo(prestamo_id)
+    if prestamo is None:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
 
-    prestamo = prestamos_db[prestamo_id]
-    copia = copias_db[prestamo.copia_id]
-    lector = lectores_db[prestamo.lector_email]
-
-    fecha_devolucion = datetime.now()
-    prestamo.fecha_devolucion_real = fecha_devolucion
-
-    if fecha_devolucion > prestamo.fecha_devolucion_esperada:
-        dias_retraso = (fecha_devolucion -
-                        prestamo.fecha_devolucion_esperada).days
-        prestamo.dias_retraso = dias_retraso
-        multa_dias = dias_retraso * 2
-        lector.dias_suspension += multa_dias
-        lector.fecha_fin_suspension = datetime.now() + timedelta(days=multa_dias)
-        copia.estado = EstadoCopia.DISPONIBLE
-    else:
-        copia.estado = EstadoCopia.DISPONIBLE
+    with repositorio.bloquear(copias=[prestamo.copia_id], lectores=[prestamo.lector_email]):
+        prestamo = repositorio.obtener_prestamo(prestamo_id)
+        if prestamo.fecha_devolucion_real is not None:
+            raise HTTPException(status_code=400, detail="El préstamo ya fue devuelto")
+
+        copia = repositorio.obtener_copia(prestamo.copia_id)
+        lector = repositorio.obtener_lector(prestamo.lector_email)
+
+        fecha_devolucion = datetime.now()
+        prestamo.fecha_devolucion_real = fecha_devolucion
+
+        if fecha_devolucion > prestamo.fecha_devolucion_esperada:
+            dias_retraso = (fecha_devolucion -
+                            prestamo.fecha_devolucion_esperada).days
+            prestamo.dias_retraso = dias_retraso
+            multa_dias = dias_retraso * DIAS_SUSPENSION_POR_DIA_RETRASO
+            lector.dias_suspension += multa_dias
+            devoluciones_con_retraso.incrementar()
+            dias_suspension.incrementar(valor=multa_dias)
+            lector.fecha_fin_suspension = datetime.now() + timedelta(days=multa_dias)
+            copia.estado = EstadoCopia.DISPONIBLE
+        else:
+            copia.estado = EstadoCopia.DISPONIBLE
+
+        lector.prestamos_activos.remove(prestamo_id)
+        repositorio.actualizar_prestamo(prestamo)
+        repositorio.actualizar_copia(copia)
+        repositorio.actualizar_lector(lector)
+        agenda_vencimientos.cancelar(prestamo_id)
 
-    lector.prestamos_activos.remove(prestamo_id)
+    devoluciones.incrementar()
+    despachador.encolar(copia.libro_id)
 
-    notificaciones = bio_alert.notificar_disponibilidad(copia.libro_id)
+    return DevolucionPrestamo(
+        prestamo=prestamo,
+        multa_dias=(prestamo.dias_retraso * DIAS_SUSPENSION_POR_DIA_RETRASO
+                    if prestamo.dias_retraso > 0 else 0)
+    )
 
-    return {
-        "prestamo": prestamo,
-        "multa_dias": prestamo.dias_retraso * 2 if prestamo.dias_retraso > 0 else 0,
-        "notificaciones_enviadas": notificaciones
-    }
 
+@app.get("/prestamos/vencidos", response_model=List[Prestamo], tags=["Préstamos"])
+def listar_prestamos_vencidos():
+    """
+    Obtiene los préstamos activos cuya fecha de devolución esperada ya pasó
 
-@app.get("/prestamos/", tags=["Préstamos"])
-def listar_prestamos():
+    Un barredor en segundo plano marca periódicamente las copias de estos
+    préstamos como `con_retraso`; la consulta ejecuta además un barrido
+    inmediato para que el resultado esté al día
+    """
+    barredor.barrer()
+    vencidos = []
+    for prestamo_id in agenda_vencimientos.vencidos():
+        prestamo = repositorio.obtener_prestamo(prestamo_id)
+        if prestamo is None or prestamo.fecha_devolucion_real is not None:
+            agenda_vencimientos.cancelar(prestamo_id)
+        else:
+            vencidos.append(prestamo)
+    return vencidos
+
+
+@app.get("/prestamos/",
+         response_model=Union[List[Prestamo], PaginaCursor[Prestamo]], tags=["Préstamos"])
+def listar_prestamos(
+        limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description=limitDescription),
+        cursor: Optional[str] = Query(None, description=cursorDescription),
+        formato: Optional[str] = Query(
+            None, alias="format", pattern="^(json|ndjson)$", description=formatDescription),
+        accept: Optional[str] = Header(None)):
     """
     Obtiene la lista de todos los préstamos registrados
+
+    Si se indica `limit` o `cursor` la respuesta es una página
+    `{"items": [...], "next_cursor": ...}`; sin ellos se devuelve la lista completa
+
+    - **limit**: (Opcional) Tamaño de página
+    - **cursor**: (Opcional) Valor de `next_cursor` de la página anterior
+    - **format**: (Opcional) `ndjson` exporta un registro por línea en streaming;
+      también se activa con `Accept: application/x-ndjson`
     """
-    return list(prestamos_db.values())
+    if quiere_ndjson(formato, accept):
+        return exportar_ndjson(repositorio.iterar_prestamos())
+    if limit is None and cursor is None:
+        return list(repositorio.iterar_prestamos())
+    return paginar_respuesta(repositorio.pagina_prestamos, limit, cursor)
 
 
-@app.get("/prestamos/lector/{email}", tags=["Préstamos"])
-def obtener_prestamos_lector(email: str):
+@app.get("/prestamos/lector/{email}",
+         response_model=Union[List[Prestamo], PaginaCursor[Prestamo]], tags=["Préstamos"])
+def obtener_prestamos_lector(
+        email: str,
+        limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description=limitDescription),
+        cursor: Optional[str] = Query(None, description=cursorDescription)):
     """
     Obtiene todos los préstamos de un lector específico
 
+    Si se indica `limit` o `cursor` la respuesta es una página
+    `{"items": [...], "next_cursor": ...}`; sin ellos se devuelve la lista completa
+
     - **email**: Correo electrónico del lector
+    - **limit**: (Opcional) Tamaño de página
+    - **cursor**: (Opcional) Valor de `next_cursor` de la página anterior
     """
-    if email not in lectores_db:
+    if repositorio.obtener_lector(email) is None:
         raise HTTPException(status_code=404, detail=notFoundReader)
-    prestamos = [p for p in prestamos_db.values() if p.lector_email == email]
-    return prestamos
+    if limit is None and cursor is None:
+        return repositorio.prestamos_de_lector(email)
+    return paginar_respuesta(
+        lambda desde, limite: repositorio.pagina_prestamos_lector(
+            email, desde, limite),
+        limit, cursor)
 
 
-@app.post("/bioalert/suscribir", tags=["BioAlert"])
+@app.post("/bioalert/suscribir", response_model=SuscripcionCreada, tags=["BioAlert"])
 def suscribir_bioalert(lector_email: str, libro_id: str):
     """
     Suscribe a un lector para recibir notificaciones cuando un libro esté disponible
@@ -342,28 +775,196 @@ def suscribir_bioalert(lector_email: str, libro_id: str):
     - **lector_email**: Email del lector que se suscribe
     - **libro_id**: ID del libro al que desea suscribirse
     """
-    if lector_email not in lectores_db:
+    if repositorio.obtener_lector(lector_email) is None:
         raise HTTPException(status_code=404, detail=notFoundReader)
-    if libro_id not in libros_db:
+    if repositorio.obtener_libro(libro_id) is None:
         raise HTTPException(status_code=404, detail=notFoundBook)
 
-    suscripcion = bio_alert.suscribir(lector_email, libro_id)
-    return {
-        "mensaje": "Suscripción exitosa",
-        "suscripcion": suscripcion
-    }
+    suscripcion = repositorio.suscribir(lector_email, libro_id)
+    return SuscripcionCreada(mensaje="Suscripción exitosa", suscripcion=suscripcion)
 
 
-@app.get("/bioalert/suscripciones", tags=["BioAlert"])
+@app.get("/bioalert/suscripciones", response_model=List[Suscripcion], tags=["BioAlert"])
 def listar_suscripciones(lector_email: Optional[str] = None):
     """
     Obtiene las suscripciones activas del sistema BioAlert
 
     - **lector_email**: (Opcional) Si se proporciona, filtra por suscripciones de ese lector
     """
-    return bio_alert.obtener_suscripciones(lector_email)
+    return repositorio.obtener_suscripciones(lector_email)
+
+
+def tabla_estadisticas(desde: Optional[datetime], hasta: Optional[datetime]):
+    """Tabla columnar de préstamos, reconstruida solo cuando cambian"""
+    if desde is not None and hasta is not None and desde >= hasta:
+        raise HTTPException(status_code=400, detail="'desde' debe ser anterior a 'hasta'")
+    return tabla_prestamos.obtener(repositorio.version("prestamos")).filtrar(desde, hasta)
+
+
+@app.get("/estadisticas/retrasos-por-libro", response_model=List[RetrasoLibro],
+         tags=["Estadísticas"])
+def estadisticas_retrasos_por_libro(
+        desde: Optional[datetime] = Query(None, description=sinceDescription),
+        hasta: Optional[datetime] = Query(None, description=untilDescription)):
+    """
+    Tasa de retraso de cada libro: préstamos devueltos tarde o activos con
+    la fecha de devolución vencida, sobre el total de préstamos del libro.
+    Ordenado de mayor a menor tasa
+    """
+    return retrasos_por_libro(tabla_estadisticas(desde, hasta), datetime.now())
+
+
+@app.get("/estadisticas/distribucion-retrasos", response_model=DistribucionRetrasos,
+         tags=["Estadísticas"])
+def estadisticas_distribucion_retrasos(
+        desde: Optional[datetime] = Query(None, description=sinceDescription),
+        hasta: Optional[datetime] = Query(None, description=untilDescription)):
+    """
+    Media, mediana, percentil 90, máximo e histograma de los días de retraso
+    de los préstamos devueltos tarde
+    """
+    return distribucion_retrasos(tabla_estadisticas(desde, hasta))
+
+
+@app.get("/estadisticas/prestamos-por-mes", response_model=List[PrestamosMes],
+         tags=["Estadísticas"])
+def estadisticas_prestamos_por_mes(
+        desde: Optional[datetime] = Query(None, description=sinceDescription),
+        hasta: Optional[datetime] = Query(None, description=untilDescription)):
+    """Número de préstamos realizados en cada mes (AAAA-MM)"""
+    return prestamos_por_mes(tabla_estadisticas(desde, hasta))
+
+
+@app.get("/estadisticas/lectores-suspendidos", response_model=List[LectorSuspendido],
+         tags=["Estadísticas"])
+def estadisticas_lectores_suspendidos(
+        limite: int = Query(10, ge=1, le=LIMITE_MAXIMO),
+        desde: Optional[datetime] = Query(None, description=sinceDescription),
+        hasta: Optional[datetime] = Query(None, description=untilDescription)):
+    """
+    Lectores con más días de suspensión acumulados por devoluciones tardías
+
+    - **limite**: Número máximo de lectores a devolver
+    """
+    return lectores_por_suspension(tabla_estadisticas(desde, hasta), limite,
+                                   DIAS_SUSPENSION_POR_DIA_RETRASO)
+
+
+@app.get("/admin/cache", response_model=EstadisticasCache, tags=["Administración"])
+def estadisticas_cache():
+    """
+    Aciertos, fallos y expulsiones de la caché de respuestas JSON, junto con
+    su ocupación actual, para dimensionar `BIBLIOTECA_CACHE_RESPUESTAS`
+    """
+    return cache_respuestas.estadisticas()
+
+
+@app.get("/metrics", response_model=str, response_class=PlainTextResponse,
+         tags=["Administración"])
+def metricas():
+    """
+    Métricas en formato de texto de Prometheus: peticiones, peticiones en
+    curso y latencia por ruta, y contadores de préstamos, devoluciones,
+    suspensiones y notificaciones. Con varios workers cada proceso expone
+    las suyas
+    """
+    return PlainTextResponse(registro_metricas.exponer(), media_type=MEDIA_TYPE_PROMETHEUS)
+
+
+@app.get("/admin/perfiles", response_model=List[PerfilResumen], tags=["Administración"])
+def listar_perfiles():
+    """
+    Perfiles guardados, del más reciente al más antiguo
+
+    Se perfila la fracción de peticiones fijada en `/admin/perfiles/muestreo`
+    (o en `BIBLIOTECA_PERFIL_FRACCION`) y, si se configura una en
+    `BIBLIOTECA_PERFIL_CABECERA` o en el mismo endpoint, toda petición que
+    traiga esa cabecera. Solo se conservan los últimos `BIBLIOTECA_PERFILES`
+    """
+    return perfilador.listar()
+
+
+@app.put("/admin/perfiles/muestreo", response_model=ConfiguracionPerfiles,
+         tags=["Administración"])
+def configurar_muestreo(fraccion: float = Query(..., ge=0, le=1),
+                        cabecera: Optional[str] = None):
+    """
+    Cambia en caliente la fracción de peticiones perfiladas y, si se indica,
+    la cabecera que fuerza el perfilado (vacía para desactivarla)
+    """
+    perfilador.fraccion = fraccion
+    if cabecera is not None:
+        perfilador.cabecera = cabecera
+    return ConfiguracionPerfiles(capacidad=perfilador.capacidad,
+                                 fraccion=perfilador.fraccion,
+                                 cabecera=perfilador.cabecera)
+
+
+@app.get("/admin/perfiles/{perfil_id}", response_model=str,
+         response_class=PlainTextResponse, tags=["Administración"])
+def obtener_perfil(perfil_id: int, formato: FormatoPerfil = FormatoPerfil.PSTATS,
+                   orden: OrdenPerfil = OrdenPerfil.ACUMULADO,
+                   limite: int = Query(30, ge=1, le=LIMITE_MAXIMO)):
+    """
+    Un perfil como informe de pstats o como pilas colapsadas para generar
+    un flamegraph (`flamegraph.pl`, speedscope)
+
+    - **orden**, **limite**: ordenación y número de funciones del informe pstats
+    """
+    estadisticas = perfilador.obtener(perfil_id)
+    if estadisticas is None:
+        raise HTTPException(status_code=404, detail=notFoundProfile)
+    if formato == FormatoPerfil.COLAPSADO:
+        return PlainTextResponse(pilas_colapsadas(estadisticas))
+    return PlainTextResponse(informe_pstats(estadisticas, orden.value, limite))
+
+
+@app.get("/admin/memoria", response_model=InformeMemoria, tags=["Administración"])
+def uso_memoria(tracemalloc: bool = False,
+                diferencias: int = Query(DIFERENCIAS_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO)):
+    """
+    Objetos y bytes aproximados de cada almacén del proceso (libros, copias,
+    lectores, préstamos, suscripciones BioAlert, índices y caché de
+    respuestas). Los bytes se estiman midiendo una muestra de cada
+    colección; con SQLite solo se cuentan las filas de cada tabla.
+
+    - **tracemalloc**: La primera llamada activa tracemalloc y guarda una
+      instantánea; cada llamada siguiente devuelve las `diferencias` líneas
+      de código que más memoria ganaron o perdieron desde la anterior.
+      tracemalloc ralentiza el proceso: se desactiva con
+      `PUT /admin/memoria/tracemalloc?activo=false`
+    """
+    almacenes = repositorio.uso_memoria()
+    cache = cache_respuestas.estadisticas()
+    almacenes.append({"nombre": "cache_respuestas", "objetos": cache["entradas"],
+                      "bytes_aproximados": cache["bytes"]})
+    return InformeMemoria(
+        almacen=type(repositorio).__name__,
+        almacenes=almacenes,
+        total_bytes_aproximados=sum(almacen["bytes_aproximados"] or 0
+                                    for almacen in almacenes),
+        tracemalloc=comparador_memoria.comparar(diferencias) if tracemalloc else None)
+
+
+@app.put("/admin/memoria/tracemalloc", response_model=EstadoTracemalloc,
+         tags=["Administración"])
+def configurar_tracemalloc(activo: bool):
+    """
+    Activa tracemalloc fijando la instantánea con la que comparará la
+    siguiente llamada a `/admin/memoria?tracemalloc=true`, o lo desactiva
+    """
+    return comparador_memoria.iniciar() if activo else comparador_memoria.detener()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = int(os.environ.get("BIBLIOTECA_WORKERS", "1"))
+    if workers > 1:
+        # Cada worker importa este módulo y abre su propia conexión al mismo
+        # almacén SQLite; los préstamos se serializan entre procesos con
+        # transacciones BEGIN IMMEDIATE dentro de repositorio.bloquear.
+        os.environ["BIBLIOTECA_DB"] = url_para_workers(
+            os.environ.get("BIBLIOTECA_DB"), workers)
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,301 @@
+import json
+import mmap
+import os
+import sys
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from src.compacto import EPOCA, MICROSEGUNDO
+from src.memoria import estimar_bytes
+from src.models import Prestamo
+
+NULO = -2 ** 63
+NOMBRE_INDICE = "indice.json"
+
+# nombre de columna -> código de tipo de array
+COLUMNAS = {
+    "fecha_prestamo": "q",
+    "fecha_devolucion_esperada": "q",
+    "fecha_devolucion_real": "q",
+    "dias_retraso": "q",
+    "copia": "I",
+    "lector": "I",
+}
+
+
+def a_microsegundos(fecha: Optional[datetime]) -> int:
+    """Las fechas con zona horaria se guardan convertidas a UTC sin zona"""
+    if fecha is None:
+        return NULO
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return (fecha - EPOCA) // MICROSEGUNDO
+
+
+def desde_microsegundos(valor: int) -> Optional[datetime]:
+    return None if valor == NULO else EPOCA + valor * MICROSEGUNDO
+
+
+class Diccionario:
+    """Codifica cadenas repetidas como enteros consecutivos"""
+
+    def __init__(self, valores: Optional[List[str]] = None):
+        self.valores: List[str] = []
+        self.codigos: Dict[str, int] = {}
+        for valor in valores or ():
+            self.codificar(valor)
+
+    def codificar(self, valor: str) -> int:
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def __getitem__(self, codigo: int) -> str:
+        return self.valores[codigo]
+
+    def __len__(self) -> int:
+        return len(self.valores)
+
+
+class Columna:
+    """
+    Columna tipada formada por una base, que puede estar mapeada desde
+    disco, y una cola en memoria que recibe las filas nuevas
+    """
+
+    __slots__ = ("tipo", "base", "cola")
+
+    def __init__(self, tipo: str, base=None):
+        self.tipo = tipo
+        self.base = base if base is not None else array(tipo)
+        self.cola = array(tipo)
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.cola)
+
+    def __getitem__(self, fila: int) -> int:
+        corte = len(self.base)
+        return self.base[fila] if fila < corte else self.cola[fila - corte]
+
+    def __setitem__(self, fila: int, valor: int):
+        corte = len(self.base)
+        if fila < corte:
+            self.base[fila] = valor
+        else:
+            self.cola[fila - corte] = valor
+
+    def __iter__(self) -> Iterator[int]:
+        yield from self.base
+        yield from self.cola
+
+    def append(self, valor: int):
+        self.cola.append(valor)
+
+    def truncar(self, filas: int):
+        del self.cola[max(filas - len(self.base), 0):]
+
+    def a_array(self, desde: int, hasta: int) -> array:
+        """
+        Copia de las filas [desde, hasta). Mientras copia exporta el búfer de
+        la cola, que no puede crecer a la vez: se llama con el candado del
+        archivo.
+        """
+        resultado = array(self.tipo)
+        corte = len(self.base)
+        if desde < corte:
+            resultado.frombytes(memoryview(self.base)[desde:min(hasta, corte)].cast("B"))
+        if hasta > corte:
+            resultado.frombytes(
+                memoryview(self.cola)[max(desde - corte, 0):hasta - corte].cast("B"))
+        return resultado
+
+
+class ArchivoPrestamos:
+    """
+    Archivo columnar de préstamos devueltos, solo de añadido
+
+    Fechas y días de retraso se guardan en arrays de enteros de 64 bits
+    (microsegundos desde 1970) y copia y lector como códigos de un
+    diccionario de cadenas. Solo los ids de préstamo se guardan como
+    cadenas, con un índice id -> fila. Las consultas por lector o por copia
+    usan los índices del repositorio, que guardan los ids de préstamo.
+
+    `guardar` vuelca las columnas a ficheros binarios y `abrir` puede
+    mapearlos en memoria (copia en escritura), de modo que el historial no
+    ocupa memoria del proceso hasta que se lee.
+    """
+
+    def __init__(self):
+        self.columnas: Dict[str, Columna] = {
+            nombre: Columna(tipo) for nombre, tipo in COLUMNAS.items()}
+        self.ids: List[str] = []
+        self.filas: Dict[str, int] = {}
+        self.copias = Diccionario()
+        self.lectores = Diccionario()
+        self._mapas: List[mmap.mmap] = []
+        self._candado = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, prestamo_id: str) -> bool:
+        return prestamo_id in self.filas
+
+    def agregar(self, prestamo: Prestamo) -> int:
+        """
+        Archiva un préstamo devuelto. Si ya estaba archivado se sobrescriben
+        sus fechas y días de retraso; copia y lector no cambian.
+        """
+        valores = {
+            "fecha_prestamo": a_microsegundos(prestamo.fecha_prestamo),
+            "fecha_devolucion_esperada": a_microsegundos(prestamo.fecha_devolucion_esperada),
+            "fecha_devolucion_real": a_microsegundos(prestamo.fecha_devolucion_real),
+            "dias_retraso": prestamo.dias_retraso,
+        }
+        with self._candado:
+            fila = self.filas.get(prestamo.id)
+            if fila is not None:
+                for nombre, valor in valores.items():
+                    self.columnas[nombre][fila] = valor
+                return fila
+
+            fila = len(self.ids)
+            copia = self.copias.codificar(prestamo.copia_id)
+            lector = self.lectores.codificar(prestamo.lector_email)
+            valores["copia"] = copia
+            valores["lector"] = lector
+            try:
+                for nombre, valor in valores.items():
+                    self.columnas[nombre].append(valor)
+            except BaseException:
+                # Una fila a medias dejaría las columnas con longitudes distintas
+                for columna in self.columnas.values():
+                    columna.truncar(fila)
+                raise
+            # La fila solo se publica cuando todas sus columnas existen
+            self.ids.append(prestamo.id)
+            self.filas[prestamo.id] = fila
+            return fila
+
+    def fila(self, fila: int) -> Prestamo:
+        columnas = self.columnas
+        return Prestamo.model_construct(
+            id=self.ids[fila],
+            copia_id=self.copias[columnas["copia"][fila]],
+            lector_email=self.lectores[columnas["lector"][fila]],
+            fecha_prestamo=desde_microsegundos(columnas["fecha_prestamo"][fila]),
+            fecha_devolucion_esperada=desde_microsegundos(
+                columnas["fecha_devolucion_esperada"][fila]),
+            fecha_devolucion_real=desde_microsegundos(
+                columnas["fecha_devolucion_real"][fila]),
+            dias_retraso=columnas["dias_retraso"][fila])
+
+    def claves(self, fila: int) -> Tuple[str, str]:
+        """Copia y lector de una fila, sin construir el préstamo"""
+        return (self.copias[self.columnas["copia"][fila]],
+                self.lectores[self.columnas["lector"][fila]])
+
+    def obtener(self, prestamo_id: str) -> Optional[Prestamo]:
+        fila = self.filas.get(prestamo_id)
+        return self.fila(fila) if fila is not None else None
+
+    def limpiar(self):
+        self.cerrar()
+        self.__init__()
+
+    def uso_memoria(self) -> Tuple[int, int]:
+        """
+        Bytes aproximados (en el monticulo, mapeados desde disco). Las páginas
+        mapeadas solo ocupan memoria del proceso una vez leídas.
+        """
+        monticulo = mapeados = 0
+        for columna in self.columnas.values():
+            monticulo += sys.getsizeof(columna.cola)
+            if isinstance(columna.base, memoryview):
+                mapeados += columna.base.nbytes
+            else:
+                monticulo += sys.getsizeof(columna.base)
+        # Las claves de `filas` son las mismas cadenas que `ids`
+        monticulo += estimar_bytes(self.ids) + sys.getsizeof(self.filas)
+        monticulo += estimar_bytes(self.copias.valores) + sys.getsizeof(self.copias.codigos)
+        monticulo += estimar_bytes(self.lectores.valores) + sys.getsizeof(self.lectores.codigos)
+        return monticulo, mapeados
+
+    def copiar_columnas(self, nombres: Iterable[str], desde: int = 0,
+                        hasta: Optional[int] = None) -> Tuple[int, Dict[str, array]]:
+        """
+        Copia las filas [desde, hasta) (hasta el final por defecto) de las
+        columnas indicadas con el candado tomado, así que `agregar` puede
+        seguir añadiendo filas mientras se usa la copia. Devuelve también
+        `hasta`.
+        """
+        with self._candado:
+            hasta = len(self) if hasta is None else hasta
+            return hasta, {nombre: self.columnas[nombre].a_array(desde, hasta)
+                           for nombre in nombres}
+
+    def guardar(self, directorio: str, filas: Optional[int] = None):
+        """
+        Escribe las primeras `filas` filas (todas por defecto) en
+        `directorio`, que no debe existir. Se escribe una copia de las
+        columnas, así que las devoluciones no esperan al disco. Los ficheros
+        se sincronizan con disco antes de volver.
+        """
+        filas, columnas = self.copiar_columnas(COLUMNAS, hasta=filas)
+        temporal = directorio + ".tmp"
+        os.makedirs(temporal)
+        for nombre, columna in columnas.items():
+            with open(os.path.join(temporal, f"{nombre}.col"), "wb") as archivo:
+                archivo.write(columna)
+                archivo.flush()
+                os.fsync(archivo.fileno())
+        with open(os.path.join(temporal, NOMBRE_INDICE), "w", encoding="utf-8") as archivo:
+            json.dump({
+                "filas": filas,
+                "ids": self.ids[:filas],
+                # Los diccionarios solo crecen: el prefijo de cada uno basta
+                "copias": self.copias.valores[:len(self.copias)],
+                "lectores": self.lectores.valores[:len(self.lectores)],
+            }, archivo)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, directorio)
+
+    @classmethod
+    def abrir(cls, directorio: str, mapear: bool = True) -> "ArchivoPrestamos":
+        with open(os.path.join(directorio, NOMBRE_INDICE), encoding="utf-8") as archivo:
+            indice = json.load(archivo)
+        archivo_prestamos = cls()
+        archivo_prestamos.copias = Diccionario(indice["copias"])
+        archivo_prestamos.lectores = Diccionario(indice["lectores"])
+        archivo_prestamos.ids = indice["ids"]
+        archivo_prestamos.filas = {
+            prestamo_id: fila for fila, prestamo_id in enumerate(archivo_prestamos.ids)}
+        for nombre, tipo in COLUMNAS.items():
+            ruta = os.path.join(directorio, f"{nombre}.col")
+            archivo_prestamos.columnas[nombre] = Columna(
+                tipo, archivo_prestamos._leer_columna(ruta, tipo, mapear))
+        return archivo_prestamos
+
+    def _leer_columna(self, ruta: str, tipo: str, mapear: bool):
+        if mapear and os.path.getsize(ruta) > 0:
+            with open(ruta, "rb") as archivo:
+                mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_COPY)
+            self._mapas.append(mapa)
+            return memoryview(mapa).cast(tipo)
+        columna = array(tipo)
+        with open(ruta, "rb") as archivo:
+            columna.frombytes(archivo.read())
+        return columna
+
+    def cerrar(self):
+        """Libera los mapas de memoria; el archivo no se puede usar después"""
+        for columna in self.columnas.values():
+            if isinstance(columna.base, memoryview):
+                columna.base.release()
+        for mapa in self._mapas:
+            mapa.close()
+        self._mapas.clear()
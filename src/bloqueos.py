@@ -0,0 +1,31 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List
+
+
+class CandadosSegmentados:
+    """
+    Conjunto fijo de candados repartidos por hash de la clave
+
+    Dos operaciones solo se excluyen si alguna de sus claves cae en el mismo
+    segmento. `bloquear` toma los segmentos en orden creciente de índice, de
+    modo que dos llamadas con claves solapadas nunca se bloquean mutuamente.
+    """
+
+    def __init__(self, segmentos: int = 256):
+        self._candados = [threading.Lock() for _ in range(segmentos)]
+
+    def indices(self, claves: Iterable[str]) -> List[int]:
+        return sorted({hash(clave) % len(self._candados) for clave in claves})
+
+    @contextmanager
+    def bloquear(self, claves: Iterable[str]):
+        adquiridos = []
+        try:
+            for indice in self.indices(claves):
+                self._candados[indice].acquire()
+                adquiridos.append(self._candados[indice])
+            yield
+        finally:
+            for candado in reversed(adquiridos):
+                candado.release()
@@ -0,0 +1,79 @@
+import unicodedata
+from typing import Dict, List, Set
+from src.memoria import estimar_bytes
+
+
+def normalizar(texto: str) -> str:
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_acentos = "".join(
+        c for c in descompuesto if not unicodedata.combining(c))
+    return sin_acentos.casefold()
+
+
+def trigramas(texto: str) -> Set[str]:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceTrigramas:
+    """
+    Índice invertido de trigramas para búsqueda parcial de texto
+
+    Las búsquedas ignoran mayúsculas y acentos. Las consultas de menos de
+    tres caracteres no tienen trigramas y se resuelven recorriendo los
+    textos indexados.
+    """
+
+    def __init__(self):
+        self._textos: Dict[str, str] = {}
+        self._por_trigrama: Dict[str, Dict[str, None]] = {}
+
+    def __len__(self):
+        return len(self._textos)
+
+    def limpiar(self):
+        self._textos.clear()
+        self._por_trigrama.clear()
+
+    def uso_memoria(self) -> int:
+        """Bytes aproximados; las claves indexadas las cuenta quien las guarda"""
+        return (estimar_bytes(self._textos)
+                + estimar_bytes(self._por_trigrama, profundo=False))
+
+    def agregar(self, clave: str, texto: str):
+        if clave in self._textos:
+            self.eliminar(clave)
+        normalizado = normalizar(texto)
+        self._textos[clave] = normalizado
+        for trigrama in trigramas(normalizado):
+            self._por_trigrama.setdefault(trigrama, {})[clave] = None
+
+    def eliminar(self, clave: str):
+        normalizado = self._textos.pop(clave, None)
+        if normalizado is None:
+            return
+        for trigrama in trigramas(normalizado):
+            claves = self._por_trigrama.get(trigrama)
+            if claves is None:
+                continue
+            claves.pop(clave, None)
+            if not claves:
+                del self._por_trigrama[trigrama]
+
+    def buscar(self, consulta: str) -> List[str]:
+        normalizada = normalizar(consulta)
+        consulta_trigramas = trigramas(normalizada)
+        if not consulta_trigramas:
+            return [clave for clave, texto in self._textos.items()
+                    if normalizada in texto]
+
+        listas = []
+        for trigrama in consulta_trigramas:
+            claves = self._por_trigrama.get(trigrama)
+            if not claves:
+                return []
+            listas.append(claves)
+        listas.sort(key=len)
+        candidatas, restantes = listas[0], listas[1:]
+        return [clave for clave in candidatas
+                if all(clave in otras for otras in restantes)
+                and normalizada in self._textos[clave]]
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+from pydantic_core import to_json
+
+CAPACIDAD_POR_DEFECTO = 1024
+
+
+class CacheRespuestas:
+    """
+    Caché LRU acotada de respuestas JSON ya codificadas
+
+    Cada entrada guarda la versión del repositorio con la que se generó. Una
+    consulta con otra versión cuenta como fallo y la entrada se regenera, de
+    modo que cualquier escritura que cambie la versión de una clave invalida
+    exactamente las respuestas que dependen de ella. `capacidad` 0 la
+    desactiva.
+    """
+
+    def __init__(self, capacidad: int = CAPACIDAD_POR_DEFECTO):
+        self.capacidad = capacidad
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._candado = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener(self, clave: str, version: str) -> Optional[bytes]:
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] != version:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave: str, version: str, cuerpo: bytes):
+        if self.capacidad <= 0:
+            return
+        with self._candado:
+            self._entradas[clave] = (version, cuerpo)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def cuerpo(self, clave: str, version: str, generar: Callable[[], object]) -> bytes:
+        """
+        Devuelve la respuesta codificada, generándola y guardándola si no
+        está en caché. Las excepciones de `generar` no se guardan.
+        """
+        cuerpo = self.obtener(clave, version)
+        if cuerpo is None:
+            cuerpo = to_json(generar())
+            self.guardar(clave, version, cuerpo)
+        return cuerpo
+
+    def limpiar(self):
+        with self._candado:
+            self._entradas.clear()
+            self.aciertos = self.fallos = self.expulsiones = 0
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._candado:
+            return {
+                "capacidad": self.capacidad,
+                "entradas": len(self._entradas),
+                "bytes": sum(len(cuerpo) for _, cuerpo in self._entradas.values()),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+            }
@@ -0,0 +1,93 @@
+import sys
+from datetime import datetime, timedelta
+from typing import Optional, Union
+from src.models import Copia, EstadoCopia, Prestamo
+
+EPOCA = datetime(1970, 1, 1)
+MICROSEGUNDO = timedelta(microseconds=1)
+
+Instante = Union[int, datetime, None]
+
+
+def _internar(texto: Optional[str]) -> Optional[str]:
+    return sys.intern(texto) if texto is not None else None
+
+
+def a_instante(fecha: Optional[datetime]) -> Instante:
+    """
+    Microsegundos desde 1970 para fechas sin zona horaria. Las fechas con
+    zona se guardan tal cual para no perder el desfase.
+    """
+    if fecha is None or fecha.tzinfo is not None:
+        return fecha
+    return (fecha - EPOCA) // MICROSEGUNDO
+
+
+def a_fecha(instante: Instante) -> Optional[datetime]:
+    if instante is None or isinstance(instante, datetime):
+        return instante
+    return EPOCA + instante * MICROSEGUNDO
+
+
+class CopiaCompacta:
+    """
+    Forma de almacenamiento de una copia: atributos en `__slots__` y
+    cadenas repetidas internadas. `a_modelo` construye el modelo pydantic
+    sin volver a validarlo.
+    """
+
+    __slots__ = ("id", "libro_id", "estado", "edicion", "idioma")
+
+    def __init__(self, id: str, libro_id: str, estado: EstadoCopia,
+                 edicion: Optional[str], idioma: str):
+        self.id = id
+        self.libro_id = sys.intern(libro_id)
+        self.estado = estado
+        self.edicion = _internar(edicion)
+        self.idioma = sys.intern(idioma)
+
+    @classmethod
+    def desde_modelo(cls, copia: Copia) -> "CopiaCompacta":
+        return cls(copia.id, copia.libro_id, copia.estado, copia.edicion, copia.idioma)
+
+    def a_modelo(self) -> Copia:
+        return Copia.model_construct(
+            id=self.id, libro_id=self.libro_id, estado=self.estado,
+            edicion=self.edicion, idioma=self.idioma)
+
+
+class PrestamoCompacto:
+    """
+    Forma de almacenamiento de un préstamo: fechas como enteros de
+    microsegundos y libro, copia y lector como cadenas internadas.
+    """
+
+    __slots__ = ("id", "copia_id", "lector_email", "fecha_prestamo",
+                 "fecha_devolucion_esperada", "fecha_devolucion_real", "dias_retraso")
+
+    def __init__(self, id: str, copia_id: str, lector_email: str,
+                 fecha_prestamo: Instante, fecha_devolucion_esperada: Instante,
+                 fecha_devolucion_real: Instante, dias_retraso: int):
+        self.id = id
+        self.copia_id = sys.intern(copia_id)
+        self.lector_email = sys.intern(lector_email)
+        self.fecha_prestamo = fecha_prestamo
+        self.fecha_devolucion_esperada = fecha_devolucion_esperada
+        self.fecha_devolucion_real = fecha_devolucion_real
+        self.dias_retraso = dias_retraso
+
+    @classmethod
+    def desde_modelo(cls, prestamo: Prestamo) -> "PrestamoCompacto":
+        return cls(prestamo.id, prestamo.copia_id, prestamo.lector_email,
+                   a_instante(prestamo.fecha_prestamo),
+                   a_instante(prestamo.fecha_devolucion_esperada),
+                   a_instante(prestamo.fecha_devolucion_real),
+                   prestamo.dias_retraso)
+
+    def a_modelo(self) -> Prestamo:
+        return Prestamo.model_construct(
+            id=self.id, copia_id=self.copia_id, lector_email=self.lector_email,
+            fecha_prestamo=a_fecha(self.fecha_prestamo),
+            fecha_devolucion_esperada=a_fecha(self.fecha_devolucion_esperada),
+            fecha_devolucion_real=a_fecha(self.fecha_devolucion_real),
+            dias_retraso=self.dias_retraso)
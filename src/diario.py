@@ -0,0 +1,156 @@
+import json
+import os
+import pickle
+import re
+import threading
+from typing import Any, Iterator, List, Optional, Tuple
+
+PATRON_SEGMENTO = re.compile(r"^diario-(\d{8})\.log$")
+NOMBRE_INSTANTANEA = "instantanea.bin"
+
+
+def _nombre_segmento(numero: int) -> str:
+    return f"diario-{numero:08d}.log"
+
+
+def listar_segmentos(directorio: str) -> List[Tuple[int, str]]:
+    segmentos = []
+    for nombre in os.listdir(directorio):
+        coincidencia = PATRON_SEGMENTO.match(nombre)
+        if coincidencia:
+            segmentos.append((int(coincidencia.group(1)), os.path.join(directorio, nombre)))
+    return sorted(segmentos)
+
+
+def leer_segmento(ruta: str) -> Iterator[Tuple[int, str, Any]]:
+    """
+    Lee los registros de un segmento. Una última línea incompleta (escritura
+    interrumpida por una caída) se descarta.
+    """
+    with open(ruta, "rb") as archivo:
+        for linea in archivo:
+            if not linea.endswith(b"\n"):
+                return
+            registro = json.loads(linea)
+            yield registro["seq"], registro["op"], registro["datos"]
+
+
+def guardar_instantanea(directorio: str, estado: dict):
+    ruta = os.path.join(directorio, NOMBRE_INSTANTANEA)
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as archivo:
+        pickle.dump(estado, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+def cargar_instantanea(directorio: str) -> Optional[dict]:
+    ruta = os.path.join(directorio, NOMBRE_INSTANTANEA)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, "rb") as archivo:
+        return pickle.load(archivo)
+
+
+class DiarioEscritura:
+    """
+    Registro de escritura anticipada con commit en grupo
+
+    `registrar` encola el registro y devuelve su número de secuencia; un
+    hilo escritor vuelca los registros pendientes en bloque y hace un único
+    fsync por bloque. El bloque se cierra al reunir `lote_maximo` registros
+    o tras `intervalo_fsync` segundos. `esperar` bloquea hasta que una
+    secuencia es durable.
+    """
+
+    def __init__(self, directorio: str, seq_inicial: int = 0,
+                 intervalo_fsync: float = 0.005, lote_maximo: int = 512,
+                 fsync: bool = True):
+        self.directorio = directorio
+        self.intervalo_fsync = intervalo_fsync
+        self.lote_maximo = lote_maximo
+        self.fsync = fsync
+        self._condicion = threading.Condition()
+        self._pendientes: List[bytes] = []
+        self._seq = seq_inicial
+        self._seq_durable = seq_inicial
+        self._escribiendo = False
+        self._cerrado = False
+        segmentos = listar_segmentos(directorio)
+        self._numero_segmento = segmentos[-1][0] + 1 if segmentos else 1
+        self._archivo = open(os.path.join(
+            directorio, _nombre_segmento(self._numero_segmento)), "ab")
+        self._hilo = threading.Thread(
+            target=self._escribir, name="diario-escritor", daemon=True)
+        self._hilo.start()
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def numero_segmento(self) -> int:
+        return self._numero_segmento
+
+    def registrar(self, operacion: str, datos: Any) -> int:
+        with self._condicion:
+            if self._cerrado:
+                raise RuntimeError("El diario está cerrado")
+            self._seq += 1
+            linea = json.dumps(
+                {"seq": self._seq, "op": operacion, "datos": datos},
+                ensure_ascii=False, separators=(",", ":"))
+            self._pendientes.append(linea.encode() + b"\n")
+            if len(self._pendientes) in (1, self.lote_maximo):
+                self._condicion.notify_all()
+            return self._seq
+
+    def esperar(self, seq: int):
+        with self._condicion:
+            self._condicion.wait_for(lambda: self._seq_durable >= seq)
+
+    def rotar(self) -> Tuple[int, int]:
+        """
+        Vuelca lo pendiente y abre un segmento nuevo. Devuelve la última
+        secuencia escrita en los segmentos anteriores y el número del nuevo.
+        """
+        with self._condicion:
+            self._condicion.wait_for(
+                lambda: not self._pendientes and not self._escribiendo)
+            anterior = self._archivo
+            self._numero_segmento += 1
+            self._archivo = open(os.path.join(
+                self.directorio, _nombre_segmento(self._numero_segmento)), "ab")
+            seq = self._seq
+        anterior.close()
+        return seq, self._numero_segmento
+
+    def cerrar(self):
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify_all()
+        self._hilo.join()
+        self._archivo.close()
+
+    def _escribir(self):
+        while True:
+            with self._condicion:
+                self._condicion.wait_for(lambda: self._pendientes or self._cerrado)
+                if not self._pendientes:
+                    return
+                self._condicion.wait_for(
+                    lambda: len(self._pendientes) >= self.lote_maximo or self._cerrado,
+                    timeout=self.intervalo_fsync)
+                lote, self._pendientes = self._pendientes, []
+                ultimo = self._seq
+                archivo = self._archivo
+                self._escribiendo = True
+            archivo.write(b"".join(lote))
+            archivo.flush()
+            if self.fsync:
+                os.fsync(archivo.fileno())
+            with self._condicion:
+                self._escribiendo = False
+                self._seq_durable = ultimo
+                self._condicion.notify_all()
@@ -0,0 +1,223 @@
+import math
+import threading
+from array import array
+from datetime import datetime
+from typing import Callable, List, Optional
+import numpy as np
+from src.archivo import NULO, ArchivoPrestamos, Diccionario, a_microsegundos
+from src.models import Prestamo
+
+# (etiqueta, mínimo, máximo) en días de retraso, ambos incluidos
+TRAMOS_RETRASO = (("1", 1, 1), ("2-3", 2, 3), ("4-7", 4, 7), ("8-14", 8, 14),
+                  ("15-30", 15, 30), ("31+", 31, None))
+
+COLUMNAS_FECHA = ("fecha_prestamo", "fecha_devolucion_esperada", "fecha_devolucion_real")
+
+
+class TablaPrestamos:
+    """
+    Vista columnar del historial de préstamos
+
+    Cada préstamo es una fila: fechas en microsegundos desde 1970 (NULO si
+    no hay fecha), días de retraso, y libro y lector como códigos de
+    diccionario. Las columnas crecen como `array` mientras se construye la
+    tabla; las agregaciones las leen como arrays de NumPy sin copiarlas y
+    operan vectorizadas, sin crear un objeto por préstamo.
+    """
+
+    def __init__(self):
+        self.fecha_prestamo = array("q")
+        self.fecha_devolucion_esperada = array("q")
+        self.fecha_devolucion_real = array("q")
+        self.dias_retraso = array("q")
+        self.libro = array("I")
+        self.lector = array("I")
+        self.libros = Diccionario()
+        self.lectores = Diccionario()
+
+    def __len__(self) -> int:
+        return len(self.fecha_prestamo)
+
+    def agregar(self, prestamo: Prestamo, libro_id: str):
+        self.agregar_fila(
+            a_microsegundos(prestamo.fecha_prestamo),
+            a_microsegundos(prestamo.fecha_devolucion_esperada),
+            a_microsegundos(prestamo.fecha_devolucion_real),
+            prestamo.dias_retraso, libro_id, prestamo.lector_email)
+
+    def agregar_fila(self, fecha_prestamo: int, fecha_devolucion_esperada: int,
+                     fecha_devolucion_real: int, dias_retraso: int,
+                     libro_id: str, lector_email: str):
+        self.fecha_prestamo.append(fecha_prestamo)
+        self.fecha_devolucion_esperada.append(fecha_devolucion_esperada)
+        self.fecha_devolucion_real.append(fecha_devolucion_real)
+        self.dias_retraso.append(dias_retraso)
+        self.libro.append(self.libros.codificar(libro_id))
+        self.lector.append(self.lectores.codificar(lector_email))
+
+    def agregar_archivo(self, archivo: ArchivoPrestamos, desde: int,
+                        libro_de_copia: Callable[[str], str]) -> int:
+        """
+        Añade las filas del archivo de préstamos a partir de `desde` copiando
+        sus columnas tal cual; copias y lectores se traducen a los códigos de
+        la tabla una vez por código distinto. Devuelve hasta qué fila leyó.
+        """
+        hasta, columnas = archivo.copiar_columnas(
+            COLUMNAS_FECHA + ("dias_retraso", "lector", "copia"), desde)
+        for nombre in COLUMNAS_FECHA + ("dias_retraso",):
+            getattr(self, nombre).extend(columnas[nombre])
+        libros = {codigo: self.libros.codificar(libro_de_copia(archivo.copias[codigo]))
+                  for codigo in set(columnas["copia"])}
+        lectores = {codigo: self.lectores.codificar(archivo.lectores[codigo])
+                    for codigo in set(columnas["lector"])}
+        self.libro.extend(map(libros.__getitem__, columnas["copia"]))
+        self.lector.extend(map(lectores.__getitem__, columnas["lector"]))
+        return hasta
+
+    def congelar(self) -> "TablaPrestamos":
+        """
+        Sustituye cada columna por un array de NumPy sobre el mismo búfer.
+        La tabla ya no puede crecer.
+        """
+        for nombre in COLUMNAS_FECHA + ("dias_retraso", "libro", "lector"):
+            setattr(self, nombre, np.asarray(getattr(self, nombre)))
+        return self
+
+    def copiar(self) -> "TablaPrestamos":
+        """Copia de las columnas que comparte los diccionarios, que solo crecen"""
+        copia = TablaPrestamos()
+        copia.libros, copia.lectores = self.libros, self.lectores
+        for nombre in COLUMNAS_FECHA + ("dias_retraso", "libro", "lector"):
+            setattr(copia, nombre, getattr(self, nombre)[:])
+        return copia
+
+    def filtrar(self, desde: Optional[datetime] = None,
+                hasta: Optional[datetime] = None) -> "TablaPrestamos":
+        """Filas con fecha de préstamo en [desde, hasta)"""
+        if desde is None and hasta is None:
+            return self
+        fecha_prestamo = np.asarray(self.fecha_prestamo)
+        mascara = np.ones(len(fecha_prestamo), dtype=bool)
+        if desde is not None:
+            mascara &= fecha_prestamo >= a_microsegundos(desde)
+        if hasta is not None:
+            mascara &= fecha_prestamo < a_microsegundos(hasta)
+        filtrada = TablaPrestamos()
+        filtrada.libros, filtrada.lectores = self.libros, self.lectores
+        for nombre in COLUMNAS_FECHA + ("dias_retraso", "libro", "lector"):
+            setattr(filtrada, nombre, np.asarray(getattr(self, nombre))[mascara])
+        return filtrada
+
+    def _atrasados(self, ahora: datetime) -> np.ndarray:
+        """Devueltos con retraso o activos con la fecha esperada vencida"""
+        activos = np.asarray(self.fecha_devolucion_real) == NULO
+        vencidos = np.asarray(self.fecha_devolucion_esperada) < a_microsegundos(ahora)
+        return (np.asarray(self.dias_retraso) > 0) | (activos & vencidos)
+
+
+class TablaIncremental:
+    """
+    Conserva la última tabla y al cambiar la versión la actualiza sin
+    reconstruirla: el historial de préstamos devueltos solo crece, así que
+    `ampliar` le añade las devoluciones posteriores a la última posición
+    leída, y `agregar_activos` añade los préstamos activos, que son pocos, a
+    una copia del historial. Si `ampliar` devuelve None la posición ya no
+    vale y el historial se vuelve a leer entero.
+    """
+
+    def __init__(self, ampliar: Callable[[TablaPrestamos, Optional[tuple]], Optional[tuple]],
+                 agregar_activos: Callable[[TablaPrestamos, tuple], None]):
+        self.ampliar = ampliar
+        self.agregar_activos = agregar_activos
+        self._candado = threading.Lock()
+        self._version: Optional[str] = None
+        self._tabla: Optional[TablaPrestamos] = None
+        self._historial = TablaPrestamos()
+        self._posicion: Optional[tuple] = None
+
+    def obtener(self, version: str) -> TablaPrestamos:
+        with self._candado:
+            if version != self._version:
+                try:
+                    posicion = self.ampliar(self._historial, self._posicion)
+                    if posicion is None:
+                        self._historial = TablaPrestamos()
+                        posicion = self.ampliar(self._historial, None)
+                except BaseException:
+                    # Un historial a medio ampliar no se puede retomar
+                    self._historial, self._posicion = TablaPrestamos(), None
+                    raise
+                self._posicion = posicion
+                tabla = self._historial.copiar()
+                self.agregar_activos(tabla, posicion)
+                self._tabla, self._version = tabla.congelar(), version
+            return self._tabla
+
+
+def retrasos_por_libro(tabla: TablaPrestamos, ahora: datetime) -> List[dict]:
+    libro = np.asarray(tabla.libro)
+    totales = np.bincount(libro, minlength=len(tabla.libros))
+    atrasados = np.bincount(libro[tabla._atrasados(ahora)], minlength=len(totales))
+    filas = [{
+        "libro_id": tabla.libros[codigo],
+        "prestamos": int(totales[codigo]),
+        "con_retraso": int(atrasados[codigo]),
+        "tasa_retraso": round(int(atrasados[codigo]) / int(totales[codigo]), 4),
+    } for codigo in np.flatnonzero(totales).tolist()]
+    filas.sort(key=lambda fila: (-fila["tasa_retraso"], -fila["prestamos"], fila["libro_id"]))
+    return filas
+
+
+def _percentil(ordenados: np.ndarray, fraccion: float) -> int:
+    """Percentil por el método del rango más cercano sobre valores ordenados"""
+    if not len(ordenados):
+        return 0
+    return int(ordenados[max(1, math.ceil(len(ordenados) * fraccion)) - 1])
+
+
+def distribucion_retrasos(tabla: TablaPrestamos) -> dict:
+    devueltos = np.asarray(tabla.fecha_devolucion_real) != NULO
+    retrasos = np.asarray(tabla.dias_retraso)[devueltos]
+    tarde = np.sort(retrasos[retrasos > 0])
+    total = len(tarde)
+    histograma = {}
+    for etiqueta, minimo, maximo in TRAMOS_RETRASO:
+        # `tarde` está ordenado: cada tramo es un intervalo de posiciones
+        fin = total if maximo is None else int(np.searchsorted(tarde, maximo, side="right"))
+        histograma[etiqueta] = fin - int(np.searchsorted(tarde, minimo, side="left"))
+    return {
+        "prestamos_devueltos": len(retrasos),
+        "con_retraso": total,
+        "media_dias": round(int(tarde.sum()) / total, 2) if total else 0.0,
+        "mediana_dias": _percentil(tarde, 0.5),
+        "p90_dias": _percentil(tarde, 0.9),
+        "maximo_dias": int(tarde[-1]) if total else 0,
+        "histograma": histograma,
+    }
+
+
+def prestamos_por_mes(tabla: TablaPrestamos) -> List[dict]:
+    # Los microsegundos desde 1970 son directamente datetime64[us]
+    meses = np.asarray(tabla.fecha_prestamo).astype("datetime64[us]").astype("datetime64[M]")
+    valores, cantidades = np.unique(meses, return_counts=True)
+    return [{"mes": str(mes), "prestamos": int(cantidad)}
+            for mes, cantidad in zip(valores, cantidades)]
+
+
+def lectores_por_suspension(tabla: TablaPrestamos, limite: int,
+                            dias_por_dia_retraso: int) -> List[dict]:
+    """Lectores con más días de suspensión acumulados por devoluciones tardías"""
+    dias = np.asarray(tabla.dias_retraso)
+    con_retraso = dias > 0
+    lectores = np.asarray(tabla.lector)[con_retraso]
+    veces = np.bincount(lectores, minlength=len(tabla.lectores))
+    suma = np.bincount(lectores, weights=dias[con_retraso],
+                       minlength=len(veces)).astype(np.int64)
+    codigos = np.flatnonzero(veces)
+    # Más días primero y, a igualdad, el código de lector menor
+    mejores = codigos[np.lexsort((codigos, -suma[codigos]))][:limite]
+    return [{
+        "lector_email": tabla.lectores[codigo],
+        "dias_suspension": int(suma[codigo]) * dias_por_dia_retraso,
+        "prestamos_con_retraso": int(veces[codigo]),
+    } for codigo in mejores.tolist()]
@@ -0,0 +1,26 @@
+from typing import Iterable, Iterator, Optional
+from pydantic import BaseModel
+
+MEDIA_TYPE_NDJSON = "application/x-ndjson"
+LINEAS_POR_BLOQUE = 500
+
+
+def quiere_ndjson(formato: Optional[str], accept: Optional[str]) -> bool:
+    if formato is not None:
+        return formato == "ndjson"
+    return accept is not None and MEDIA_TYPE_NDJSON in accept
+
+
+def lineas_ndjson(modelos: Iterable[BaseModel]) -> Iterator[bytes]:
+    """
+    Serializa cada modelo en una línea JSON. Las líneas se agrupan en
+    bloques para no pagar una escritura por registro.
+    """
+    bloque = []
+    for modelo in modelos:
+        bloque.append(modelo.model_dump_json())
+        if len(bloque) >= LINEAS_POR_BLOQUE:
+            yield ("\n".join(bloque) + "\n").encode()
+            bloque = []
+    if bloque:
+        yield ("\n".join(bloque) + "\n").encode()
@@ -0,0 +1,50 @@
+import itertools
+import os
+import threading
+import time
+
+BITS_SECUENCIA = 16
+MAX_SECUENCIA = (1 << BITS_SECUENCIA) - 1
+
+
+class GeneradorIds:
+    """
+    Generador de identificadores ordenables por tiempo al estilo Snowflake
+
+    Formato: prefijo + milisegundos (12 hex) + nodo (6 hex) + hilo (6 hex)
+    + secuencia (4 hex). El nodo es el pid del proceso y cada hilo recibe un
+    número propio la primera vez que genera un id, así que los hilos nunca
+    compiten por un candado: el estado (último milisegundo y secuencia) es
+    local a cada hilo. Dentro de un hilo los ids son estrictamente
+    crecientes aunque el reloj retroceda, y el orden lexicográfico de los
+    ids sigue el orden temporal con resolución de milisegundos.
+    """
+
+    def __init__(self, prefijo: str = ""):
+        self.prefijo = prefijo
+        self._hilos = itertools.count()
+        self._local = threading.local()
+
+    def _estado(self):
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, "pid", None) != pid:
+            local.pid = pid
+            local.hilo = next(self._hilos) & 0xFFFFFF
+            local.ultimo_ms = 0
+            local.secuencia = 0
+        return local
+
+    def nuevo(self) -> str:
+        local = self._estado()
+        ahora_ms = time.time_ns() // 1_000_000
+        if ahora_ms > local.ultimo_ms:
+            local.ultimo_ms = ahora_ms
+            local.secuencia = 0
+        elif local.secuencia < MAX_SECUENCIA:
+            local.secuencia += 1
+        else:
+            local.ultimo_ms += 1
+            local.secuencia = 0
+        return (f"{self.prefijo}{local.ultimo_ms:012x}{local.pid & 0xFFFFFF:06x}"
+                f"{local.hilo:06x}{local.secuencia:04x}")
@@ -0,0 +1,242 @@
+import codecs
+import json
+from contextlib import nullcontext
+from enum import Enum
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+TAMANIO_LOTE = 1000
+TAMANIO_MAXIMO_ELEMENTO = 1 << 20
+
+
+class ModoIngesta(str, Enum):
+    TODO_O_NADA = "todo_o_nada"
+    MEJOR_ESFUERZO = "mejor_esfuerzo"
+
+
+class CuerpoInvalido(ValueError):
+    pass
+
+
+class LectorRegistros:
+    """
+    Decodifica un arreglo JSON o un flujo NDJSON a medida que llegan los
+    fragmentos del cuerpo, sin guardarlo entero. En NDJSON cada línea es un
+    elemento y una línea mal formada solo invalida ese elemento; en un
+    arreglo JSON un error de sintaxis invalida el resto del cuerpo, pero los
+    elementos leídos antes del error siguen disponibles en `pendientes`.
+    """
+
+    def __init__(self, ndjson: bool):
+        self.ndjson = ndjson
+        self.errores: List[dict] = []
+        self.indice = 0
+        self._bytes = b""
+        self._decodificador = codecs.getincrementaldecoder("utf-8")()
+        self._texto = ""
+        self._abierto = False
+        self._cerrado = False
+        self._listos: List[Tuple[int, Any]] = []
+
+    def alimentar(self, fragmento: bytes) -> List[Tuple[int, Any]]:
+        if self.ndjson:
+            lineas = (self._bytes + fragmento).split(b"\n")
+            self._bytes = lineas.pop()
+            return self._lineas(lineas)
+        self._decodificar(fragmento, final=False)
+        self._elementos(final=False)
+        return self.pendientes()
+
+    def terminar(self) -> List[Tuple[int, Any]]:
+        if self.ndjson:
+            lineas, self._bytes = [self._bytes], b""
+            return self._lineas(lineas)
+        self._decodificar(b"", final=True)
+        self._elementos(final=True)
+        if not self._cerrado:
+            raise CuerpoInvalido("Cuerpo JSON inválido")
+        return self.pendientes()
+
+    def pendientes(self) -> List[Tuple[int, Any]]:
+        """Elementos leídos y aún no entregados, también tras un error."""
+        registros, self._listos = self._listos, []
+        return registros
+
+    def _decodificar(self, fragmento: bytes, final: bool):
+        # Un carácter UTF-8 puede quedar partido entre dos fragmentos
+        try:
+            self._texto += self._decodificador.decode(fragmento, final)
+        except UnicodeDecodeError as error:
+            raise CuerpoInvalido("Cuerpo JSON inválido") from error
+
+    def _lineas(self, lineas: List[bytes]) -> List[Tuple[int, Any]]:
+        registros = []
+        for linea in lineas:
+            if not linea.strip():
+                continue
+            try:
+                registros.append((self.indice, json.loads(linea)))
+            except ValueError:
+                self.errores.append({"indice": self.indice, "detalle": "Línea JSON inválida"})
+            self.indice += 1
+        return registros
+
+    def _elementos(self, final: bool):
+        texto, posicion = self._texto, 0
+        while True:
+            posicion = _saltar_espacios(texto, posicion)
+            if posicion == len(texto):
+                break
+            if self._cerrado:
+                raise CuerpoInvalido("Cuerpo JSON inválido")
+            if not self._abierto:
+                if texto[posicion] != "[":
+                    raise CuerpoInvalido("Se esperaba un arreglo JSON")
+                self._abierto = True
+                posicion += 1
+                continue
+            if texto[posicion] == "]" and self.indice == 0:
+                self._cerrado = True
+                posicion += 1
+                continue
+            try:
+                valor, fin = _DECODIFICADOR.raw_decode(texto, posicion)
+            except ValueError as error:
+                # Elemento incompleto: se reintenta con el siguiente fragmento
+                if final or len(texto) - posicion > TAMANIO_MAXIMO_ELEMENTO:
+                    raise CuerpoInvalido("Cuerpo JSON inválido") from error
+                break
+            # El elemento solo es completo si ya llegó el separador que lo
+            # sigue: un número puede continuar en el siguiente fragmento
+            separador = _saltar_espacios(texto, fin)
+            if separador == len(texto):
+                if final:
+                    raise CuerpoInvalido("Cuerpo JSON inválido")
+                break
+            self._listos.append((self.indice, valor))
+            self.indice += 1
+            if texto[separador] not in ",]":
+                raise CuerpoInvalido("Cuerpo JSON inválido")
+            self._cerrado = texto[separador] == "]"
+            posicion = separador + 1
+        self._texto = texto[posicion:]
+
+
+_DECODIFICADOR = json.JSONDecoder()
+
+
+def _saltar_espacios(texto: str, posicion: int) -> int:
+    while posicion < len(texto) and texto[posicion] in " \t\r\n":
+        posicion += 1
+    return posicion
+
+
+def _detalle_validacion(error: ValidationError, desde: int = 0) -> List[dict]:
+    return [{"loc": list(e["loc"][desde:]), "msg": e["msg"], "type": e["type"]}
+            for e in error.errors(include_url=False, include_context=False,
+                                  include_input=False)]
+
+
+def validar_por_lotes(modelo: Type[BaseModel], registros: List[Tuple[int, Any]],
+                      tamanio_lote: int = TAMANIO_LOTE):
+    """
+    Valida los registros en lotes con un TypeAdapter de lista. Solo cuando
+    un lote falla se valida elemento a elemento para aislar los errores.
+    """
+    adaptador_lista = TypeAdapter(List[modelo])
+    adaptador = TypeAdapter(modelo)
+    validos, errores = [], []
+    for inicio in range(0, len(registros), tamanio_lote):
+        lote = registros[inicio:inicio + tamanio_lote]
+        try:
+            modelos = adaptador_lista.validate_python([dato for _, dato in lote])
+            validos.extend(zip((indice for indice, _ in lote), modelos))
+            continue
+        except ValidationError:
+            pass
+        for indice, dato in lote:
+            try:
+                validos.append((indice, adaptador.validate_python(dato)))
+            except ValidationError as error:
+                errores.append({"indice": indice, "detalle": _detalle_validacion(error)})
+    return validos, errores
+
+
+class Ingesta:
+    """
+    Alta en bloque por lotes: `procesar` valida cada lote con las mismas
+    comprobaciones que el alta individual y `terminar` devuelve el reporte.
+
+    En modo mejor_esfuerzo cada lote se guarda al procesarlo. En modo
+    todo_o_nada solo se retienen los modelos validados; al terminar se
+    comprueban contra el almacén y se guardan dentro de un mismo `lote`, que
+    en SQLite es una transacción, así que nada cambia entre la comprobación
+    y el alta. No se guarda nada si algún registro tiene errores.
+    """
+
+    def __init__(self, modelo: Type[BaseModel], clave: Callable[[Any], str],
+                 existe: Callable[[str], bool], mensaje_duplicado: str,
+                 guardar: Callable[[Any], Any], modo: ModoIngesta,
+                 verificar: Optional[Callable[[Any], Optional[str]]] = None,
+                 lote: Callable[[], ContextManager] = nullcontext):
+        self.modelo = modelo
+        self.clave = clave
+        self.existe = existe
+        self.mensaje_duplicado = mensaje_duplicado
+        self.guardar = guardar
+        self.modo = modo
+        self.verificar = verificar
+        self.lote = lote
+        self.insertados = 0
+        self.errores: List[dict] = []
+        self._vistos = set()
+        self._pendientes: List[Tuple[int, Any]] = []
+
+    def procesar(self, registros: List[Tuple[int, Any]]):
+        if not registros:
+            return
+        validos, errores = validar_por_lotes(self.modelo, registros)
+        self.errores.extend(errores)
+        unicos = []
+        for indice, instancia in validos:
+            identificador = self.clave(instancia)
+            if identificador in self._vistos:
+                self.errores.append({"indice": indice, "detalle": self.mensaje_duplicado})
+                continue
+            self._vistos.add(identificador)
+            unicos.append((indice, instancia))
+        if self.modo == ModoIngesta.TODO_O_NADA:
+            self._pendientes.extend(unicos)
+            return
+        with self.lote():
+            self._guardar(self._comprobar(unicos))
+
+    def terminar(self, errores: List[dict] = ()) -> Dict[str, Any]:
+        self.errores.extend(errores)
+        if self.modo == ModoIngesta.TODO_O_NADA:
+            pendientes, self._pendientes = self._pendientes, []
+            with self.lote():
+                aceptados = self._comprobar(pendientes)
+                if not self.errores:
+                    self._guardar(aceptados)
+        self.errores.sort(key=lambda e: e["indice"])
+        return {"insertados": self.insertados, "errores": self.errores}
+
+    def _comprobar(self, registros: List[Tuple[int, Any]]) -> List[Any]:
+        aceptados = []
+        for indice, instancia in registros:
+            detalle = None
+            if self.existe(self.clave(instancia)):
+                detalle = self.mensaje_duplicado
+            elif self.verificar is not None:
+                detalle = self.verificar(instancia)
+            if detalle is not None:
+                self.errores.append({"indice": indice, "detalle": detalle})
+            else:
+                aceptados.append(instancia)
+        return aceptados
+
+    def _guardar(self, aceptados: List[Any]):
+        for instancia in aceptados:
+            self.guardar(instancia)
+        self.insertados += len(aceptados)
@@ -0,0 +1,153 @@
+import itertools
+import sys
+import threading
+import tracemalloc
+from enum import Enum
+from types import FunctionType, ModuleType
+from typing import Optional
+
+MUESTRA_POR_DEFECTO = 1000
+DIFERENCIAS_POR_DEFECTO = 20
+_SIN_RECORRER = (type, ModuleType, FunctionType, Enum)
+
+
+def tamanio_profundo(objeto) -> int:
+    """
+    Bytes de `objeto` y de todo lo que alcanza por contenedores, `__dict__`
+    y `__slots__`. Los objetos compartidos (cadenas internadas, miembros de
+    enums) se cuentan en cada objeto que los usa.
+    """
+    vistos = set()
+    pila = [objeto]
+    total = 0
+    while pila:
+        actual = pila.pop()
+        if id(actual) in vistos or isinstance(actual, _SIN_RECORRER):
+            continue
+        vistos.add(id(actual))
+        total += sys.getsizeof(actual)
+        if isinstance(actual, dict):
+            pila.extend(actual.keys())
+            pila.extend(actual.values())
+        elif isinstance(actual, (list, tuple, set, frozenset)):
+            pila.extend(actual)
+        elif not isinstance(actual, (str, bytes, int, float)):
+            for clase in type(actual).__mro__:
+                for nombre in getattr(clase, "__slots__", ()):
+                    valor = getattr(actual, nombre, None)
+                    if valor is not None:
+                        pila.append(valor)
+            atributos = getattr(actual, "__dict__", None)
+            if isinstance(atributos, dict):
+                pila.append(atributos)
+    return total
+
+
+def _muestrear(coleccion, muestra: int) -> list:
+    paso = max(1, len(coleccion) // muestra)
+    elementos = coleccion.items() if isinstance(coleccion, dict) else coleccion
+    # Otro hilo puede modificar la colección mientras se recorre
+    for _ in range(3):
+        try:
+            return list(itertools.islice(elementos, 0, None, paso))[:muestra]
+        except RuntimeError:
+            continue
+    return []
+
+
+def estimar_bytes(coleccion, muestra: int = MUESTRA_POR_DEFECTO,
+                  profundo: bool = True) -> int:
+    """
+    Bytes aproximados retenidos por una colección: su propio tamaño más el
+    tamaño medio de una muestra uniforme de elementos por su número, para
+    no recorrer millones de objetos en cada consulta.
+
+    Con `profundo=False` solo se suman los contenedores de los valores de
+    un diccionario, para índices cuyos elementos ya cuenta otro almacén.
+    """
+    total = sys.getsizeof(coleccion)
+    if not profundo and not isinstance(coleccion, dict):
+        return total
+    elementos = _muestrear(coleccion, muestra)
+    if not elementos:
+        return total
+    if not profundo:
+        medidos = sum(sys.getsizeof(valor) for _, valor in elementos)
+    elif isinstance(coleccion, dict):
+        medidos = sum(tamanio_profundo(clave) + tamanio_profundo(valor)
+                      for clave, valor in elementos)
+    else:
+        medidos = sum(tamanio_profundo(elemento) for elemento in elementos)
+    return total + medidos * len(coleccion) // len(elementos)
+
+
+def estimar_indices(principal: dict, secundario: dict,
+                    muestra: int = MUESTRA_POR_DEFECTO) -> int:
+    """
+    Bytes aproximados de dos índices sobre los mismos elementos: el
+    secundario solo aporta sus diccionarios, porque sus elementos ya los
+    cuenta el principal
+    """
+    return (estimar_bytes(principal, muestra)
+            + estimar_bytes(secundario, muestra, profundo=False))
+
+
+class ComparadorTracemalloc:
+    """
+    Instantáneas de tracemalloc comparadas con la anterior
+
+    La primera llamada a `comparar` activa tracemalloc (si no lo estaba) y
+    guarda la instantánea de partida; cada llamada siguiente devuelve las
+    líneas que más memoria ganaron o perdieron desde la llamada anterior.
+    tracemalloc ralentiza todas las asignaciones, así que `detener` lo
+    desactiva cuando ya no hace falta.
+    """
+
+    def __init__(self):
+        self._anterior: Optional[tracemalloc.Snapshot] = None
+        self._candado = threading.Lock()
+
+    def _instantanea(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def _estado(self, diferencias: Optional[list] = None) -> dict:
+        trazada, pico = tracemalloc.get_traced_memory()
+        return {"activo": tracemalloc.is_tracing(), "memoria_trazada": trazada,
+                "pico": pico, "diferencias": diferencias}
+
+    def iniciar(self) -> dict:
+        """Activa tracemalloc si hace falta y fija la instantánea de partida"""
+        with self._candado:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._anterior = self._instantanea()
+            return self._estado()
+
+    def comparar(self, limite: int = DIFERENCIAS_POR_DEFECTO) -> dict:
+        with self._candado:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._anterior = None
+            actual = self._instantanea()
+            diferencias = None
+            if self._anterior is not None:
+                diferencias = [{
+                    "archivo": estadistica.traceback[0].filename,
+                    "linea": estadistica.traceback[0].lineno,
+                    "bytes": estadistica.size,
+                    "diferencia_bytes": estadistica.size_diff,
+                    "objetos": estadistica.count,
+                    "diferencia_objetos": estadistica.count_diff,
+                } for estadistica in actual.compare_to(self._anterior, "lineno")[:limite]]
+            self._anterior = actual
+            return self._estado(diferencias)
+
+    def detener(self) -> dict:
+        with self._candado:
+            self._anterior = None
+            tracemalloc.stop()
+            return self._estado()
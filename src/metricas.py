@@ -0,0 +1,201 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+MEDIA_TYPE_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+CUBETAS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIN_RUTA = "sin_ruta"
+
+Etiquetas = Tuple[str, ...]
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metrica:
+    """
+    Familia de series con el mismo nombre y las mismas etiquetas
+
+    Con `funcion` los valores no se guardan: se leen en cada exposición,
+    lo que sirve para contadores que ya lleva otro componente.
+    """
+
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 funcion: Optional[Callable[[], Dict[Etiquetas, float]]] = None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.funcion = funcion
+        self.valores: Dict[Etiquetas, float] = {}
+        self._candado = threading.Lock()
+
+    def _serie(self, nombre: str, etiquetas: Etiquetas, valor: float,
+               extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pares = list(zip(self.etiquetas, etiquetas)) + list(extra)
+        if not pares:
+            return f"{nombre} {_numero(valor)}"
+        texto = ",".join(f'{clave}="{_escapar(valor_etiqueta)}"'
+                         for clave, valor_etiqueta in pares)
+        return f"{nombre}{{{texto}}} {_numero(valor)}"
+
+    def muestras(self) -> List[str]:
+        if self.funcion is not None:
+            valores = self.funcion()
+        else:
+            with self._candado:
+                valores = dict(self.valores)
+        return [self._serie(self.nombre, etiquetas, valor)
+                for etiquetas, valor in sorted(valores.items())]
+
+    def exponer(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}",
+                f"# TYPE {self.nombre} {self.tipo}"] + self.muestras()
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def incrementar(self, *etiquetas: str, valor: float = 1):
+        with self._candado:
+            self.valores[etiquetas] = self.valores.get(etiquetas, 0) + valor
+
+
+class Medidor(Metrica):
+    tipo = "gauge"
+
+    def fijar(self, *etiquetas: str, valor: float):
+        with self._candado:
+            self.valores[etiquetas] = valor
+
+
+class Histograma(Metrica):
+    """Cubetas acumuladas al exponer; al observar solo se suma una"""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 cubetas: Sequence[float] = CUBETAS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.cubetas = tuple(cubetas)
+        # etiquetas -> [cuenta por cubeta..., cuenta en +Inf, suma]
+        self.series: Dict[Etiquetas, List[float]] = {}
+
+    def observar(self, valor: float, *etiquetas: str):
+        indice = bisect.bisect_left(self.cubetas, valor)
+        with self._candado:
+            serie = self.series.get(etiquetas)
+            if serie is None:
+                serie = self.series[etiquetas] = [0] * (len(self.cubetas) + 1) + [0.0]
+            serie[indice] += 1
+            serie[-1] += valor
+
+    def muestras(self) -> List[str]:
+        with self._candado:
+            series = {etiquetas: list(serie) for etiquetas, serie in self.series.items()}
+        lineas = []
+        for etiquetas, serie in sorted(series.items()):
+            acumulado = 0
+            for limite, cuenta in zip(self.cubetas + (float("inf"),), serie):
+                acumulado += cuenta
+                lineas.append(self._serie(f"{self.nombre}_bucket", etiquetas, acumulado,
+                                          (("le", _numero(float(limite))),)))
+            lineas.append(self._serie(f"{self.nombre}_sum", etiquetas, serie[-1]))
+            lineas.append(self._serie(f"{self.nombre}_count", etiquetas, acumulado))
+        return lineas
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self.metricas: Dict[str, Metrica] = {}
+
+    def registrar(self, metrica: Metrica) -> Metrica:
+        if metrica.nombre in self.metricas:
+            raise ValueError(f"Métrica duplicada: {metrica.nombre}")
+        self.metricas[metrica.nombre] = metrica
+        return metrica
+
+    def exponer(self) -> str:
+        """Formato de texto de Prometheus"""
+        lineas = []
+        for metrica in self.metricas.values():
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+class MetricasHttp:
+    """
+    Peticiones, peticiones en curso y latencia por método y plantilla de
+    ruta (`/libros/{libro_id}`, no la ruta concreta)
+
+    Las peticiones en curso no se cuentan al llegar, cuando aún no se sabe
+    su ruta: se guardan sus scopes y se agrupan por ruta al exponer.
+    """
+
+    def __init__(self, registro: RegistroMetricas, prefijo: str):
+        self.peticiones = registro.registrar(Contador(
+            f"{prefijo}_peticiones_total", "Peticiones HTTP atendidas",
+            ("metodo", "ruta", "estado")))
+        self.duracion = registro.registrar(Histograma(
+            f"{prefijo}_duracion_peticion_segundos", "Latencia de las peticiones HTTP",
+            ("metodo", "ruta")))
+        registro.registrar(Medidor(
+            f"{prefijo}_peticiones_en_curso", "Peticiones HTTP sin responder",
+            ("metodo", "ruta"), funcion=self._contar_en_curso))
+        self.en_curso: Dict[int, dict] = {}
+
+    def _contar_en_curso(self) -> Dict[Etiquetas, float]:
+        cuentas: Dict[Etiquetas, float] = {}
+        for scope in list(self.en_curso.values()):
+            clave = (scope["method"], plantilla_ruta(scope))
+            cuentas[clave] = cuentas.get(clave, 0) + 1
+        return cuentas
+
+
+def plantilla_ruta(scope: dict) -> str:
+    # El router añade la ruta resuelta al mismo scope que recibe el middleware
+    ruta = scope.get("route")
+    return getattr(ruta, "path", SIN_RUTA)
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI que alimenta `MetricasHttp`"""
+
+    def __init__(self, app, metricas: MetricasHttp):
+        self.app = app
+        self.metricas = metricas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        metricas = self.metricas
+        clave = id(scope)
+        metricas.en_curso[clave] = scope
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            del metricas.en_curso[clave]
+            ruta = plantilla_ruta(scope)
+            metricas.peticiones.incrementar(scope["method"], ruta, str(estado))
+            metricas.duracion.observar(duracion, scope["method"], ruta)
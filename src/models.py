@@ -1,6 +1,7 @@
+import threading
 from enum import Enum
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
 from datetime import datetime
 
 
@@ -99,38 +100,83 @@ class Suscripcion(BaseModel):
 
 
 class BioAlert:
+    """
+    Suscripciones indexadas por libro y por lector. Un candado mantiene los
+    dos índices sincronizados: las notificaciones se despachan desde otro
+    hilo mientras las peticiones suscriben.
+    """
+
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(BioAlert, cls).__new__(cls)
-            cls._instance.suscripciones = []
+            cls._instance._por_libro = {}
+            cls._instance._por_lector = {}
+            cls._instance._candado = threading.RLock()
         return cls._instance
 
+    @property
+    def suscripciones(self) -> List[Suscripcion]:
+        with self._candado:
+            return [s for suscriptores in self._por_libro.values()
+                    for s in suscriptores.values()]
+
+    def limpiar(self):
+        with self._candado:
+            self._por_libro.clear()
+            self._por_lector.clear()
+
     def suscribir(self, lector_email: str, libro_id: str):
-        suscripcion = Suscripcion(
-            lector_email=lector_email,
-            libro_id=libro_id,
-            fecha_suscripcion=datetime.now()
-        )
-        self.suscripciones.append(suscripcion)
-        return suscripcion
+        with self._candado:
+            existente = self._por_libro.get(libro_id, {}).get(lector_email)
+            if existente is not None:
+                return existente
+            return self.agregar(Suscripcion(
+                lector_email=lector_email,
+                libro_id=libro_id,
+                fecha_suscripcion=datetime.now()
+            ))
+
+    def agregar(self, suscripcion: Suscripcion):
+        with self._candado:
+            por_lector = self._por_libro.setdefault(suscripcion.libro_id, {})
+            existente = por_lector.get(suscripcion.lector_email)
+            if existente is not None:
+                return existente
+            por_lector[suscripcion.lector_email] = suscripcion
+            self._por_lector.setdefault(
+                suscripcion.lector_email, {})[suscripcion.libro_id] = suscripcion
+            return suscripcion
 
     def notificar_disponibilidad(self, libro_id: str):
         notificaciones = []
-        suscripciones_libro = [
-            s for s in self.suscripciones if s.libro_id == libro_id]
-        for suscripcion in suscripciones_libro:
+        with self._candado:
+            suscriptores = self._por_libro.pop(libro_id, {})
+            for lector_email in suscriptores:
+                libros_lector = self._por_lector[lector_email]
+                del libros_lector[libro_id]
+                if not libros_lector:
+                    del self._por_lector[lector_email]
+        for lector_email in suscriptores:
             notificaciones.append({
-                "email": suscripcion.lector_email,
+                "email": lector_email,
                 "mensaje": f"El libro {libro_id} está disponible",
                 "fecha": datetime.now()
             })
-        self.suscripciones = [
-            s for s in self.suscripciones if s.libro_id != libro_id]
         return notificaciones
 
     def obtener_suscripciones(self, lector_email: Optional[str] = None):
         if lector_email:
-            return [s for s in self.suscripciones if s.lector_email == lector_email]
+            with self._candado:
+                return list(self._por_lector.get(lector_email, {}).values())
         return self.suscripciones
+
+    def uso_memoria(self, estimar: Callable[[dict, dict], int]) -> Tuple[int, int]:
+        """
+        (suscripciones, `estimar(por libro, por lector)`), con el candado
+        tomado para que los índices no cambien mientras se recorren
+        """
+        with self._candado:
+            suscripciones = sum(len(suscriptores) for suscriptores in self._por_libro.values())
+            return suscripciones, estimar(self._por_libro, self._por_lector)
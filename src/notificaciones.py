@@ -0,0 +1,174 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger("bioalert")
+
+
+class Sumidero(ABC):
+    """
+    Canal de entrega de notificaciones. `enviar` recibe todas las
+    notificaciones de un lector en un lote y debe lanzar una excepción si
+    la entrega falla, para que el despachador la reintente.
+    """
+
+    @abstractmethod
+    def enviar(self, email: str, notificaciones: List[dict]): ...
+
+
+class SumideroRegistro(Sumidero):
+    def enviar(self, email: str, notificaciones: List[dict]):
+        for notificacion in notificaciones:
+            logger.info("%s: %s", email, notificacion["mensaje"])
+
+
+class SumideroMemoria(Sumidero):
+    def __init__(self):
+        self.enviadas: List[dict] = []
+        self.lotes: List[List[dict]] = []
+
+    def enviar(self, email: str, notificaciones: List[dict]):
+        self.lotes.append(notificaciones)
+        self.enviadas.extend(notificaciones)
+
+
+class SumideroArchivo(Sumidero):
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._candado = threading.Lock()
+
+    def enviar(self, email: str, notificaciones: List[dict]):
+        lineas = "".join(
+            json.dumps(n, default=str, ensure_ascii=False) + "\n" for n in notificaciones)
+        with self._candado, open(self.ruta, "a", encoding="utf-8") as archivo:
+            archivo.write(lineas)
+
+
+def crear_sumidero(url: Optional[str]) -> Sumidero:
+    if not url:
+        return SumideroRegistro()
+    if url.startswith("archivo:///"):
+        return SumideroArchivo(url[len("archivo:///"):])
+    raise ValueError(f"Sumidero de notificaciones no soportado: {url}")
+
+
+class DespachadorNotificaciones:
+    """
+    Entrega asíncrona de las notificaciones BioAlert
+
+    `encolar` solo anota que un libro volvió a estar disponible. Un hilo en
+    segundo plano toma lotes de hasta `tamanio_lote` libros (o lo que haya
+    tras `intervalo` segundos), agrupa las notificaciones por lector y las
+    entrega al sumidero, reintentando con espera exponencial. Si la cola está
+    llena durante `espera_maxima` segundos el propio llamador despacha el
+    libro, lo que frena a los productores en lugar de perder avisos.
+
+    Las notificaciones que agotan los reintentos se cuentan en
+    `total_fallidas`; solo las últimas `max_fallidas` se conservan en
+    `fallidas` para inspeccionarlas, de modo que un sumidero caído no hace
+    crecer la memoria.
+    """
+
+    def __init__(self, notificar: Callable[[str], List[dict]],
+                 sumidero: Optional[Sumidero] = None, capacidad: int = 10000,
+                 tamanio_lote: int = 100, intervalo: float = 0.05,
+                 reintentos: int = 3, espera_reintento: float = 0.1,
+                 espera_maxima: float = 1.0, max_fallidas: int = 1000):
+        self.notificar = notificar
+        self.sumidero = sumidero if sumidero is not None else SumideroRegistro()
+        self.tamanio_lote = tamanio_lote
+        self.intervalo = intervalo
+        self.reintentos = reintentos
+        self.espera_reintento = espera_reintento
+        self.espera_maxima = espera_maxima
+        self.enviadas = 0
+        self.fallidas: deque = deque(maxlen=max_fallidas)
+        self.total_fallidas = 0
+        self._cola: queue.Queue = queue.Queue(maxsize=capacidad)
+        self._candado = threading.Lock()
+        self._hilo: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+
+    def _iniciar(self):
+        with self._candado:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._detener.clear()
+                self._hilo = threading.Thread(
+                    target=self._ejecutar, name="bioalert-despachador", daemon=True)
+                self._hilo.start()
+
+    def encolar(self, libro_id: str):
+        self._iniciar()
+        try:
+            self._cola.put(libro_id, timeout=self.espera_maxima)
+        except queue.Full:
+            self.despachar([libro_id])
+
+    def esperar(self):
+        """Bloquea hasta que se hayan procesado todos los libros encolados."""
+        self._cola.join()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def _tomar_lote(self) -> List[str]:
+        try:
+            lote = [self._cola.get(timeout=self.intervalo)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamanio_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _ejecutar(self):
+        while not self._detener.is_set() or not self._cola.empty():
+            lote = self._tomar_lote()
+            if not lote:
+                continue
+            try:
+                self.despachar(lote)
+            except Exception:
+                logger.exception("Error al despachar notificaciones BioAlert")
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
+
+    def despachar(self, libros: List[str]):
+        por_lector: Dict[str, List[dict]] = {}
+        for libro_id in dict.fromkeys(libros):
+            for notificacion in self.notificar(libro_id):
+                por_lector.setdefault(notificacion["email"], []).append(notificacion)
+        for email, notificaciones in por_lector.items():
+            self._enviar(email, notificaciones)
+
+    def _enviar(self, email: str, notificaciones: List[dict]):
+        espera = self.espera_reintento
+        for intento in range(self.reintentos + 1):
+            try:
+                self.sumidero.enviar(email, notificaciones)
+                with self._candado:
+                    self.enviadas += len(notificaciones)
+                return
+            except Exception:
+                if intento == self.reintentos:
+                    logger.exception("No se pudo notificar a %s", email)
+                    with self._candado:
+                        self.fallidas.extend(notificaciones)
+                        self.total_fallidas += len(notificaciones)
+                    return
+                time.sleep(espera)
+                espera *= 2
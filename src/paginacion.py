@@ -0,0 +1,49 @@
+import base64
+import binascii
+from typing import Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+
+def codificar_cursor(posicion: int) -> str:
+    return base64.urlsafe_b64encode(f"p{posicion}".encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> int:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        texto = base64.urlsafe_b64decode(cursor + relleno).decode()
+    except (binascii.Error, UnicodeDecodeError) as error:
+        raise ValueError("Cursor inválido") from error
+    if not texto.startswith("p") or not texto[1:].isdigit():
+        raise ValueError("Cursor inválido")
+    return int(texto[1:])
+
+
+def paginar(claves: List[str], tabla: Dict[str, T], desde: int,
+            limite: int) -> Tuple[List[T], Optional[int]]:
+    """
+    Devuelve los elementos de `tabla` en las posiciones [desde, desde + limite)
+    de `claves` y la posición siguiente, o None si no quedan elementos.
+
+    `claves` solo admite inserciones al final, por lo que una posición
+    identifica siempre el mismo elemento aunque haya altas concurrentes.
+    """
+    hasta = desde + limite
+    items = [tabla[clave] for clave in claves[desde:hasta]]
+    siguiente = hasta if hasta < len(claves) else None
+    return items, siguiente
+
+
+def recorrer(claves: List[str], tabla: Dict[str, T]) -> Iterator[T]:
+    """
+    Recorre `tabla` en orden de inserción sin copiarla. Se detiene en el
+    último elemento existente al empezar, así que las altas concurrentes no
+    invalidan el recorrido.
+    """
+    total = len(claves)
+    for posicion in range(total):
+        yield tabla[claves[posicion]]
@@ -0,0 +1,258 @@
+import contextvars
+import cProfile
+import functools
+import inspect
+import io
+import itertools
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi.routing import APIRoute
+from src.metricas import plantilla_ruta
+
+CAPACIDAD_POR_DEFECTO = 20
+# Sin cabecera por defecto: cualquier cliente podría forzar perfiles
+CABECERA_POR_DEFECTO = ""
+
+
+class FormatoPerfil(str, Enum):
+    PSTATS = "pstats"
+    COLAPSADO = "colapsado"
+
+
+class OrdenPerfil(str, Enum):
+    """Claves de ordenación de pstats"""
+    ACUMULADO = "cumulative"
+    PROPIO = "tottime"
+    LLAMADAS = "ncalls"
+
+
+_muestra_actual: contextvars.ContextVar = contextvars.ContextVar("muestra_perfil", default=None)
+
+
+class Muestra:
+    """Perfil de una petición; `usado` indica si el endpoint llegó a ejecutarse"""
+
+    __slots__ = ("perfil", "usado")
+
+    def __init__(self):
+        self.perfil = cProfile.Profile()
+        self.usado = False
+
+
+def perfilable(endpoint: Callable) -> Callable:
+    """
+    Envuelve un endpoint para perfilarlo si la petición fue elegida. La
+    decisión viaja en una variable de contexto, que anyio copia al hilo del
+    threadpool donde corren los endpoints síncronos: cProfile solo ve el
+    hilo en el que se activa.
+
+    En los endpoints asíncronos el perfil incluye lo que el bucle de eventos
+    ejecute mientras el endpoint espera.
+    """
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def envoltura_asincrona(*args, **kwargs):
+            muestra = _muestra_actual.get()
+            if muestra is None:
+                return await endpoint(*args, **kwargs)
+            muestra.usado = True
+            muestra.perfil.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                muestra.perfil.disable()
+        return envoltura_asincrona
+
+    @functools.wraps(endpoint)
+    def envoltura(*args, **kwargs):
+        muestra = _muestra_actual.get()
+        if muestra is None:
+            return endpoint(*args, **kwargs)
+        muestra.usado = True
+        muestra.perfil.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            muestra.perfil.disable()
+    return envoltura
+
+
+class RutaPerfilable(APIRoute):
+    """Clase de ruta que envuelve cada endpoint con `perfilable`"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, perfilable(endpoint), **kwargs)
+
+
+class Perfilador:
+    """
+    Elige qué peticiones perfilar y guarda los últimos `capacidad` perfiles
+
+    Se perfila una fracción aleatoria `fraccion` de las peticiones y toda
+    petición que traiga la cabecera `cabecera` (vacía, por defecto, para
+    desactivarla).
+    """
+
+    def __init__(self, capacidad: int = CAPACIDAD_POR_DEFECTO, fraccion: float = 0.0,
+                 cabecera: str = CABECERA_POR_DEFECTO):
+        self.capacidad = capacidad
+        self.fraccion = fraccion
+        self.cabecera = cabecera
+        self._perfiles: deque = deque(maxlen=capacidad)
+        self._ids = itertools.count(1)
+        self._candado = threading.Lock()
+
+    @property
+    def cabecera(self) -> str:
+        return self._cabecera
+
+    @cabecera.setter
+    def cabecera(self, valor: str):
+        self._cabecera = valor
+        self._cabecera_asgi = valor.lower().encode("latin-1")
+
+    def motivo(self, scope: dict) -> Optional[str]:
+        if self.fraccion > 0 and random.random() < self.fraccion:
+            return "muestreo"
+        if self._cabecera_asgi:
+            for nombre, _ in scope["headers"]:
+                if nombre == self._cabecera_asgi:
+                    return "cabecera"
+        return None
+
+    def guardar(self, scope: dict, motivo: str, duracion: float, estado: int,
+                muestra: Muestra):
+        estadisticas = pstats.Stats(muestra.perfil)
+        with self._candado:
+            self._perfiles.append({
+                "id": next(self._ids),
+                "metodo": scope["method"],
+                "ruta": plantilla_ruta(scope),
+                "estado": estado,
+                "motivo": motivo,
+                "duracion_ms": round(duracion * 1000, 3),
+                "fecha": datetime.now(),
+                "estadisticas": estadisticas,
+            })
+
+    def listar(self) -> List[dict]:
+        with self._candado:
+            perfiles = list(self._perfiles)
+        return [{clave: valor for clave, valor in perfil.items() if clave != "estadisticas"}
+                for perfil in reversed(perfiles)]
+
+    def obtener(self, perfil_id: int) -> Optional[pstats.Stats]:
+        with self._candado:
+            for perfil in self._perfiles:
+                if perfil["id"] == perfil_id:
+                    return perfil["estadisticas"]
+        return None
+
+    def limpiar(self):
+        with self._candado:
+            self._perfiles.clear()
+
+
+def crear_perfilador() -> Perfilador:
+    return Perfilador(
+        int(os.environ.get("BIBLIOTECA_PERFILES", CAPACIDAD_POR_DEFECTO)),
+        float(os.environ.get("BIBLIOTECA_PERFIL_FRACCION", "0")),
+        os.environ.get("BIBLIOTECA_PERFIL_CABECERA", CABECERA_POR_DEFECTO))
+
+
+class MiddlewarePerfiles:
+    """Middleware ASGI que decide qué peticiones perfila `RutaPerfilable`"""
+
+    def __init__(self, app, perfilador: Perfilador):
+        self.app = app
+        self.perfilador = perfilador
+
+    async def __call__(self, scope, receive, send):
+        motivo = self.perfilador.motivo(scope) if scope["type"] == "http" else None
+        if motivo is None:
+            await self.app(scope, receive, send)
+            return
+
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        muestra = Muestra()
+        token = _muestra_actual.set(muestra)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            _muestra_actual.reset(token)
+            # Las peticiones que no llegan a un endpoint (404, 422) no dejan perfil
+            if muestra.usado:
+                self.perfilador.guardar(scope, motivo, duracion, estado, muestra)
+
+
+def informe_pstats(estadisticas: pstats.Stats, orden: str = "cumulative",
+                   limite: int = 30) -> str:
+    # Copia: ordenar modifica el objeto, que otras peticiones pueden estar leyendo
+    salida = io.StringIO()
+    pstats.Stats(stream=salida).add(estadisticas).sort_stats(orden).print_stats(limite)
+    return salida.getvalue()
+
+
+def _etiqueta(funcion: Tuple[str, int, str]) -> str:
+    archivo, linea, nombre = funcion
+    if archivo == "~":
+        etiqueta = nombre
+    else:
+        etiqueta = f"{nombre} ({os.path.basename(archivo)}:{linea})"
+    # ';' separa los marcos en el formato de pilas colapsadas
+    return etiqueta.replace(";", ",")
+
+
+def pilas_colapsadas(estadisticas: pstats.Stats) -> str:
+    """
+    Pilas en formato colapsado (`marco;marco;marco microsegundos`), para
+    flamegraph.pl o speedscope
+
+    cProfile solo guarda aristas llamador -> llamado, no pilas completas: el
+    tiempo propio de cada función se reparte entre sus llamadores en
+    proporción al tiempo acumulado que cada uno le aporta.
+    """
+    datos = estadisticas.stats
+    hijos: Dict[tuple, Dict[tuple, float]] = {}
+    for funcion, (_, _, _, _, llamadores) in datos.items():
+        for llamador, (_, _, _, acumulado) in llamadores.items():
+            hijos.setdefault(llamador, {})[funcion] = acumulado
+    raices = [funcion for funcion, (_, _, _, _, llamadores) in datos.items()
+              if not llamadores]
+
+    pilas: Dict[str, float] = {}
+
+    def recorrer(funcion: tuple, pila: List[str], en_pila: set, peso: float):
+        _, _, propio, acumulado, _ = datos[funcion]
+        pila.append(_etiqueta(funcion))
+        clave = ";".join(pila)
+        pilas[clave] = pilas.get(clave, 0.0) + propio * peso
+        en_pila.add(funcion)
+        for hijo, tiempo in hijos.get(funcion, {}).items():
+            total_hijo = datos[hijo][3]
+            if hijo not in en_pila and total_hijo > 0:
+                recorrer(hijo, pila, en_pila, peso * tiempo / total_hijo)
+        en_pila.discard(funcion)
+        pila.pop()
+
+    for raiz in raices:
+        recorrer(raiz, [], set(), 1.0)
+    return "".join(f"{pila} {round(segundos * 1e6)}\n"
+                   for pila, segundos in sorted(pilas.items())
+                   if round(segundos * 1e6) > 0)
@@ -0,0 +1,558 @@
+import itertools
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from src.models import EstadoCopia, Libro, Copia, Lector, Prestamo, Suscripcion, BioAlert
+from src.bloqueos import CandadosSegmentados
+from src.busqueda import IndiceTrigramas
+from src.paginacion import paginar, recorrer
+from src.compacto import CopiaCompacta, PrestamoCompacto, a_instante
+from src.archivo import ArchivoPrestamos
+from src.estadisticas import TablaPrestamos
+from src.memoria import estimar_bytes, estimar_indices
+
+Pagina = Tuple[list, Optional[int]]
+URL_SQLITE_POR_DEFECTO = "sqlite://biblioteca.db"
+
+
+def _materializar(pagina: Pagina) -> Pagina:
+    items, siguiente = pagina
+    return [item.a_modelo() for item in items], siguiente
+
+
+def _copiar_libro(libro: Libro) -> Libro:
+    return libro.model_copy(update={"autor": libro.autor.model_copy()})
+
+
+def _copiar_lector(lector: Lector) -> Lector:
+    # Las fechas y cadenas son inmutables: basta con copiar la lista
+    return lector.model_copy(update={"prestamos_activos": list(lector.prestamos_activos)})
+
+
+class Repositorio(ABC):
+    """
+    Interfaz de almacenamiento de la biblioteca
+
+    Los objetos que devuelve `obtener_*` son copias de trabajo: tras
+    modificarlos hay que persistirlos con el método `actualizar_*`
+    correspondiente. Los de búsquedas, páginas e iteraciones pueden ser los
+    que guarda el almacén y no deben modificarse. Las posiciones de
+    paginación son opacas y propias de cada implementación.
+
+    Las operaciones de lectura-modificación-escritura sobre copias y lectores
+    deben hacerse dentro de `bloquear` con todas las claves implicadas.
+
+    Cada escritura cambia la versión de las claves que afecta: "libros",
+    "libro:<id>", "copias", "copia:<id>", "copias_libro:<libro_id>",
+    "lectores", "lector:<email>", "prestamos", "prestamo:<id>" y
+    "prestamos_lector:<email>". "historial" solo cambia cuando se reescribe
+    un préstamo ya devuelto.
+
+    `compartido` indica que otros procesos escriben en el mismo almacén, de
+    modo que el estado que cada proceso guarde aparte puede quedar obsoleto.
+    """
+
+    compartido = False
+
+    def __init__(self):
+        self.candados = CandadosSegmentados()
+
+    def bloquear(self, copias: Iterable[str] = (), lectores: Iterable[str] = ()):
+        claves = [f"copia:{copia_id}" for copia_id in copias]
+        claves.extend(f"lector:{email}" for email in lectores)
+        return self.candados.bloquear(claves)
+
+    def cerrar(self):
+        pass
+
+    @contextmanager
+    def lote(self):
+        """
+        Agrupa las escrituras de un mismo hilo que se hacen dentro del bloque
+        para que cuesten una sola espera de durabilidad o una sola
+        transacción, según el almacén
+        """
+        yield
+
+    @abstractmethod
+    def limpiar(self): ...
+
+    @abstractmethod
+    def version(self, clave: str) -> str:
+        """
+        Versión opaca de una clave: cambia con cada escritura que la afecta y
+        con `limpiar`, y no se repite tras reiniciar el almacén.
+        """
+
+    @abstractmethod
+    def agregar_libro(self, libro: Libro) -> Libro: ...
+
+    @abstractmethod
+    def obtener_libro(self, libro_id: str) -> Optional[Libro]: ...
+
+    @abstractmethod
+    def buscar_libros_por_autor(self, nombre_autor: str) -> List[Libro]: ...
+
+    @abstractmethod
+    def pagina_libros(self, desde: int, limite: int) -> Pagina: ...
+
+    @abstractmethod
+    def iterar_libros(self) -> Iterator[Libro]: ...
+
+    @abstractmethod
+    def agregar_copia(self, copia: Copia) -> Copia: ...
+
+    @abstractmethod
+    def obtener_copia(self, copia_id: str) -> Optional[Copia]: ...
+
+    @abstractmethod
+    def actualizar_copia(self, copia: Copia) -> Copia: ...
+
+    @abstractmethod
+    def copias_de_libro(self, libro_id: str) -> List[Copia]: ...
+
+    @abstractmethod
+    def disponibilidad(self, libro_ids: Iterable[str]) -> Dict[str, Dict[EstadoCopia, int]]:
+        """
+        Número de copias de cada libro por estado, mantenido en cada alta o
+        cambio de estado. Los estados sin copias no aparecen.
+        """
+
+    @abstractmethod
+    def pagina_copias(self, desde: int, limite: int) -> Pagina: ...
+
+    @abstractmethod
+    def iterar_copias(self) -> Iterator[Copia]: ...
+
+    @abstractmethod
+    def agregar_lector(self, lector: Lector) -> Lector: ...
+
+    @abstractmethod
+    def obtener_lector(self, email: str) -> Optional[Lector]: ...
+
+    @abstractmethod
+    def actualizar_lector(self, lector: Lector) -> Lector: ...
+
+    @abstractmethod
+    def pagina_lectores(self, desde: int, limite: int) -> Pagina: ...
+
+    @abstractmethod
+    def iterar_lectores(self) -> Iterator[Lector]: ...
+
+    @abstractmethod
+    def agregar_prestamo(self, prestamo: Prestamo) -> Prestamo: ...
+
+    @abstractmethod
+    def obtener_prestamo(self, prestamo_id: str) -> Optional[Prestamo]: ...
+
+    @abstractmethod
+    def actualizar_prestamo(self, prestamo: Prestamo) -> Prestamo: ...
+
+    @abstractmethod
+    def prestamos_de_lector(self, email: str) -> List[Prestamo]: ...
+
+    @abstractmethod
+    def prestamos_de_copia(self, copia_id: str) -> List[Prestamo]: ...
+
+    @abstractmethod
+    def pagina_prestamos(self, desde: int, limite: int) -> Pagina: ...
+
+    @abstractmethod
+    def pagina_prestamos_lector(self, email: str, desde: int, limite: int) -> Pagina: ...
+
+    @abstractmethod
+    def iterar_prestamos(self) -> Iterator[Prestamo]: ...
+
+    @abstractmethod
+    def iterar_prestamos_activos(self) -> Iterator[Prestamo]:
+        """Préstamos sin fecha de devolución, sin recorrer el historial"""
+
+    @abstractmethod
+    def prestamos_vencidos(self, desde: Optional[datetime], hasta: datetime) -> List[Prestamo]:
+        """
+        Préstamos activos con fecha de devolución esperada en [desde, hasta),
+        sin límite inferior si `desde` es None, ordenados por esa fecha
+        """
+
+    @abstractmethod
+    def ampliar_historial(self, tabla: TablaPrestamos,
+                          posicion: Optional[tuple]) -> Optional[tuple]:
+        """
+        Añade a `tabla` los préstamos devueltos después de `posicion` (todos
+        si es None) y devuelve la posición opaca hasta la que ha leído. Si
+        `posicion` ya no vale (tras `limpiar` o al reescribirse un préstamo
+        devuelto) devuelve None sin tocar la tabla.
+        """
+
+    @abstractmethod
+    def agregar_activos(self, tabla: TablaPrestamos, posicion: tuple):
+        """
+        Añade a `tabla` los préstamos activos y los devueltos después de
+        `posicion`, cada uno una sola vez aunque se devuelva entre medias
+        """
+
+    def tabla_prestamos(self) -> TablaPrestamos:
+        """Vista columnar de todos los préstamos, con el libro de cada copia"""
+        tabla = TablaPrestamos()
+        self.agregar_activos(tabla, self.ampliar_historial(tabla, None))
+        return tabla
+
+    @abstractmethod
+    def uso_memoria(self) -> List[dict]:
+        """
+        Objetos y bytes aproximados (None si no se conocen) de cada almacén,
+        como `{"nombre", "objetos", "bytes_aproximados"}`
+        """
+
+    @abstractmethod
+    def suscribir(self, lector_email: str, libro_id: str) -> Suscripcion: ...
+
+    @abstractmethod
+    def notificar_disponibilidad(self, libro_id: str) -> List[dict]: ...
+
+    @abstractmethod
+    def obtener_suscripciones(self, lector_email: Optional[str] = None) -> List[Suscripcion]: ...
+
+
+class RepositorioMemoria(Repositorio):
+    """
+    Almacén en memoria de la biblioteca con índices secundarios
+
+    Mantiene los índices libro_id -> copias, lector_email -> préstamos y
+    copia_id -> préstamos actualizados en cada alta, de modo que las
+    consultas por libro o por lector cuestan O(tamaño del resultado).
+    Los nombres de autor se indexan por trigramas para la búsqueda parcial.
+    Cada colección conserva además su orden de inserción para paginar con
+    cursores estables. Las suscripciones se delegan en el singleton BioAlert.
+    Copias y préstamos se guardan en forma compacta (`src.compacto`) y cada
+    lectura devuelve un modelo nuevo, así que modificar lo devuelto no
+    altera el almacén hasta llamar a `actualizar_*`. Los contadores de copias
+    por libro y estado se ajustan comparando con el estado guardado.
+
+    `prestamos` solo contiene préstamos activos: al devolverse pasan al
+    archivo columnar `archivo`. Los índices por lector y copia y el orden de
+    inserción guardan ids de ambos, así que listados y cursores no cambian.
+    Un préstamo devuelto no vuelve a estar activo.
+    """
+
+    def __init__(self, bio_alert: Optional[BioAlert] = None):
+        super().__init__()
+        self.libros: Dict[str, Libro] = {}
+        self.copias: Dict[str, CopiaCompacta] = {}
+        self.lectores: Dict[str, Lector] = {}
+        self.prestamos: Dict[str, PrestamoCompacto] = {}
+        self.archivo = ArchivoPrestamos()
+        self._vista_prestamos = _VistaPrestamos(self)
+        self.orden_libros: List[str] = []
+        self.orden_copias: List[str] = []
+        self.orden_lectores: List[str] = []
+        self.orden_prestamos: List[str] = []
+        self.copias_por_libro: Dict[str, List[str]] = {}
+        self.prestamos_por_lector: Dict[str, List[str]] = {}
+        self.prestamos_por_copia: Dict[str, List[str]] = {}
+        self.estados_por_libro: Dict[str, Dict[EstadoCopia, int]] = {}
+        self._candado_estados = threading.Lock()
+        self.indice_autores = IndiceTrigramas()
+        self.bio_alert = bio_alert if bio_alert is not None else BioAlert()
+        self.versiones: Dict[str, int] = {}
+        self._reloj = itertools.count(1)
+        self.epoca = uuid.uuid4().hex[:12]
+
+    def limpiar(self):
+        self.libros.clear()
+        self.copias.clear()
+        self.lectores.clear()
+        self.prestamos.clear()
+        self.archivo.limpiar()
+        self.orden_libros.clear()
+        self.orden_copias.clear()
+        self.orden_lectores.clear()
+        self.orden_prestamos.clear()
+        self.copias_por_libro.clear()
+        self.prestamos_por_lector.clear()
+        self.prestamos_por_copia.clear()
+        self.estados_por_libro.clear()
+        self.indice_autores.limpiar()
+        self.bio_alert.limpiar()
+        self.versiones.clear()
+        self.epoca = uuid.uuid4().hex[:12]
+
+    def version(self, clave: str) -> str:
+        return f"{self.epoca}.{self.versiones.get(clave, 0)}"
+
+    def _tocar(self, *claves: str):
+        # Un único contador global: next() es atómico, así que dos
+        # escrituras concurrentes nunca dejan la misma versión
+        marca = next(self._reloj)
+        for clave in claves:
+            self.versiones[clave] = marca
+
+    def agregar_libro(self, libro: Libro) -> Libro:
+        if libro.id not in self.libros:
+            self.orden_libros.append(libro.id)
+        self.libros[libro.id] = libro
+        self.indice_autores.agregar(libro.id, libro.autor.nombre)
+        self._tocar("libros", f"libro:{libro.id}")
+        return libro
+
+    def obtener_libro(self, libro_id: str) -> Optional[Libro]:
+        libro = self.libros.get(libro_id)
+        return _copiar_libro(libro) if libro is not None else None
+
+    def buscar_libros_por_autor(self, nombre_autor: str) -> List[Libro]:
+        return [self.libros[libro_id]
+                for libro_id in self.indice_autores.buscar(nombre_autor)]
+
+    def pagina_libros(self, desde: int, limite: int):
+        return paginar(self.orden_libros, self.libros, desde, limite)
+
+    def iterar_libros(self):
+        return recorrer(self.orden_libros, self.libros)
+
+    def agregar_copia(self, copia: Copia) -> Copia:
+        if copia.id not in self.copias:
+            self.orden_copias.append(copia.id)
+            self.copias_por_libro.setdefault(
+                copia.libro_id, []).append(copia.id)
+        self._guardar_copia(copia)
+        return copia
+
+    def _guardar_copia(self, copia: Copia):
+        compacta = CopiaCompacta.desde_modelo(copia)
+        # Los candados por copia no excluyen a otras copias del mismo libro,
+        # que comparten contadores
+        with self._candado_estados:
+            anterior = self.copias.get(copia.id)
+            self.copias[copia.id] = compacta
+            self._contar_estado(copia, anterior.estado if anterior is not None else None)
+        self._tocar("copias", f"copia:{copia.id}", f"copias_libro:{copia.libro_id}")
+
+    def _contar_estado(self, copia: Copia, anterior: Optional[EstadoCopia]):
+        if anterior == copia.estado:
+            return
+        contadores = self.estados_por_libro.setdefault(copia.libro_id, {})
+        if anterior is not None:
+            contadores[anterior] -= 1
+            if not contadores[anterior]:
+                del contadores[anterior]
+        contadores[copia.estado] = contadores.get(copia.estado, 0) + 1
+
+    def obtener_copia(self, copia_id: str) -> Optional[Copia]:
+        compacta = self.copias.get(copia_id)
+        return compacta.a_modelo() if compacta is not None else None
+
+    def actualizar_copia(self, copia: Copia) -> Copia:
+        self._guardar_copia(copia)
+        return copia
+
+    def copias_de_libro(self, libro_id: str) -> List[Copia]:
+        return [self.copias[copia_id].a_modelo()
+                for copia_id in self.copias_por_libro.get(libro_id, [])]
+
+    def disponibilidad(self, libro_ids: Iterable[str]):
+        return {libro_id: dict(self.estados_por_libro.get(libro_id, {}))
+                for libro_id in libro_ids}
+
+    def pagina_copias(self, desde: int, limite: int):
+        return _materializar(paginar(self.orden_copias, self.copias, desde, limite))
+
+    def iterar_copias(self):
+        return (copia.a_modelo() for copia in recorrer(self.orden_copias, self.copias))
+
+    def agregar_lector(self, lector: Lector) -> Lector:
+        if lector.email not in self.lectores:
+            self.orden_lectores.append(lector.email)
+        self.lectores[lector.email] = lector
+        self._tocar("lectores", f"lector:{lector.email}")
+        return lector
+
+    def obtener_lector(self, email: str) -> Optional[Lector]:
+        lector = self.lectores.get(email)
+        return _copiar_lector(lector) if lector is not None else None
+
+    def actualizar_lector(self, lector: Lector) -> Lector:
+        self.lectores[lector.email] = lector
+        self._tocar("lectores", f"lector:{lector.email}")
+        return lector
+
+    def pagina_lectores(self, desde: int, limite: int):
+        return paginar(self.orden_lectores, self.lectores, desde, limite)
+
+    def iterar_lectores(self):
+        return recorrer(self.orden_lectores, self.lectores)
+
+    def agregar_prestamo(self, prestamo: Prestamo) -> Prestamo:
+        if prestamo.id not in self.prestamos and prestamo.id not in self.archivo:
+            self.orden_prestamos.append(prestamo.id)
+            self.prestamos_por_lector.setdefault(
+                prestamo.lector_email, []).append(prestamo.id)
+            self.prestamos_por_copia.setdefault(
+                prestamo.copia_id, []).append(prestamo.id)
+        self._guardar_prestamo(prestamo)
+        return prestamo
+
+    def _guardar_prestamo(self, prestamo: Prestamo):
+        claves = ["prestamos", f"prestamo:{prestamo.id}",
+                  f"prestamos_lector:{prestamo.lector_email}"]
+        if prestamo.fecha_devolucion_real is None:
+            self.prestamos[prestamo.id] = PrestamoCompacto.desde_modelo(prestamo)
+        else:
+            if prestamo.id in self.archivo:
+                claves.append("historial")
+            # Se archiva antes de quitarlo para que siempre esté en uno de los dos
+            self.archivo.agregar(prestamo)
+            self.prestamos.pop(prestamo.id, None)
+        self._tocar(*claves)
+
+    def obtener_prestamo(self, prestamo_id: str) -> Optional[Prestamo]:
+        compacto = self.prestamos.get(prestamo_id)
+        if compacto is not None:
+            return compacto.a_modelo()
+        return self.archivo.obtener(prestamo_id)
+
+    def actualizar_prestamo(self, prestamo: Prestamo) -> Prestamo:
+        self._guardar_prestamo(prestamo)
+        return prestamo
+
+    def prestamos_de_lector(self, email: str) -> List[Prestamo]:
+        return [self.obtener_prestamo(prestamo_id)
+                for prestamo_id in self.prestamos_por_lector.get(email, [])]
+
+    def prestamos_de_copia(self, copia_id: str) -> List[Prestamo]:
+        return [self.obtener_prestamo(prestamo_id)
+                for prestamo_id in self.prestamos_por_copia.get(copia_id, [])]
+
+    def pagina_prestamos(self, desde: int, limite: int):
+        return paginar(self.orden_prestamos, self._vista_prestamos, desde, limite)
+
+    def pagina_prestamos_lector(self, email: str, desde: int, limite: int):
+        return paginar(self.prestamos_por_lector.get(email, []),
+                       self._vista_prestamos, desde, limite)
+
+    def iterar_prestamos(self):
+        return recorrer(self.orden_prestamos, self._vista_prestamos)
+
+    def iterar_prestamos_activos(self):
+        return (prestamo.a_modelo() for prestamo in list(self.prestamos.values()))
+
+    def prestamos_vencidos(self, desde: Optional[datetime], hasta: datetime):
+        # Recorre los activos: un solo proceso usa la agenda de vencimientos
+        inicio, fin = a_instante(desde), a_instante(hasta)
+        vencidos = sorted(
+            (prestamo for prestamo in list(self.prestamos.values())
+             if (inicio is None or prestamo.fecha_devolucion_esperada >= inicio)
+             and prestamo.fecha_devolucion_esperada < fin),
+            key=lambda prestamo: prestamo.fecha_devolucion_esperada)
+        return [prestamo.a_modelo() for prestamo in vencidos]
+
+    def ampliar_historial(self, tabla: TablaPrestamos, posicion: Optional[tuple]):
+        # La posición es la versión de "historial" y la fila del archivo
+        version = self.version("historial")
+        desde = 0
+        if posicion is not None:
+            if posicion[0] != version:
+                return None
+            desde = posicion[1]
+        return version, tabla.agregar_archivo(self.archivo, desde, self._libro_de_copia)
+
+    def agregar_activos(self, tabla: TablaPrestamos, posicion: tuple):
+        # Los activos se leen antes que el archivo: un préstamo devuelto
+        # entre medias aparece en ambos y se cuenta solo una vez
+        activos = list(self.prestamos.values())
+        tabla.agregar_archivo(self.archivo, posicion[1], self._libro_de_copia)
+        for prestamo in activos:
+            if prestamo.id not in self.archivo:
+                tabla.agregar(prestamo.a_modelo(), self._libro_de_copia(prestamo.copia_id))
+
+    def _libro_de_copia(self, copia_id: str) -> str:
+        copia = self.copias.get(copia_id)
+        return copia.libro_id if copia is not None else ""
+
+    def uso_memoria(self) -> List[dict]:
+        # Los bytes se estiman con una muestra de cada colección; los índices
+        # solo cuentan sus contenedores, porque sus ids ya los cuenta su almacén
+        monticulo, mapeados = self.archivo.uso_memoria()
+        suscripciones, bytes_suscripciones = self.bio_alert.uso_memoria(estimar_indices)
+        indices = (
+            sum(estimar_bytes(orden, profundo=False) for orden in (
+                self.orden_libros, self.orden_copias, self.orden_lectores,
+                self.orden_prestamos))
+            + sum(estimar_bytes(indice, profundo=False) for indice in (
+                self.copias_por_libro, self.prestamos_por_lector,
+                self.prestamos_por_copia, self.estados_por_libro))
+            + self.indice_autores.uso_memoria()
+            + estimar_bytes(self.versiones))
+        claves_indices = (len(self.copias_por_libro) + len(self.prestamos_por_lector)
+                          + len(self.prestamos_por_copia) + len(self.estados_por_libro)
+                          + len(self.indice_autores))
+        return [
+            _almacen("libros", len(self.libros), estimar_bytes(self.libros)),
+            _almacen("copias", len(self.copias), estimar_bytes(self.copias)),
+            _almacen("lectores", len(self.lectores), estimar_bytes(self.lectores)),
+            _almacen("prestamos_activos", len(self.prestamos), estimar_bytes(self.prestamos)),
+            _almacen("prestamos_archivados", len(self.archivo), monticulo),
+            _almacen("archivo_mapeado", len(self.archivo) if mapeados else 0, mapeados),
+            _almacen("suscripciones", suscripciones, bytes_suscripciones),
+            _almacen("indices", claves_indices, indices),
+        ]
+
+    def suscribir(self, lector_email: str, libro_id: str) -> Suscripcion:
+        return self.bio_alert.suscribir(lector_email, libro_id)
+
+    def notificar_disponibilidad(self, libro_id: str) -> List[dict]:
+        return self.bio_alert.notificar_disponibilidad(libro_id)
+
+    def obtener_suscripciones(self, lector_email: Optional[str] = None) -> List[Suscripcion]:
+        return self.bio_alert.obtener_suscripciones(lector_email)
+
+
+def _almacen(nombre: str, objetos: int, bytes_aproximados: Optional[int]) -> dict:
+    return {"nombre": nombre, "objetos": objetos, "bytes_aproximados": bytes_aproximados}
+
+
+class _VistaPrestamos:
+    """Acceso por id a préstamos activos y archivados, para paginar y recorrer"""
+
+    def __init__(self, repositorio: RepositorioMemoria):
+        self.repositorio = repositorio
+
+    def __getitem__(self, prestamo_id: str) -> Prestamo:
+        return self.repositorio.obtener_prestamo(prestamo_id)
+
+
+def crear_repositorio(url: Optional[str] = None) -> Repositorio:
+    """
+    Crea el almacén indicado por `url`: vacío o `memoria` para el almacén en
+    memoria, `diario://ruta` para el almacén en memoria con diario e
+    instantáneas, `sqlite://ruta` para SQLite. La ruta es lo que sigue a `//`:
+    `sqlite:///tmp/biblioteca.db` es la ruta absoluta `/tmp/biblioteca.db` y
+    `sqlite://biblioteca.db` es relativa al directorio de trabajo.
+    """
+    if not url or url == "memoria":
+        return RepositorioMemoria()
+    if url.startswith("diario://"):
+        from src.repositorio_persistente import RepositorioPersistente
+        return RepositorioPersistente(url[len("diario://"):])
+    if url.startswith("sqlite://"):
+        from src.repositorio_sqlite import RepositorioSQLite
+        return RepositorioSQLite(url[len("sqlite://"):])
+    raise ValueError(f"Almacenamiento no soportado: {url}")
+
+
+def url_para_workers(url: Optional[str], workers: int) -> Optional[str]:
+    """
+    Con varios procesos worker cada uno tendría su propio almacén en memoria,
+    así que solo se admite un almacén compartido entre procesos (SQLite). Si
+    no se indica ninguno se usa `URL_SQLITE_POR_DEFECTO`.
+    """
+    if workers <= 1:
+        return url
+    if not url:
+        return URL_SQLITE_POR_DEFECTO
+    if not url.startswith("sqlite://"):
+        raise ValueError(
+            "Con varios workers el almacenamiento debe ser compartido (sqlite://...)")
+    return url
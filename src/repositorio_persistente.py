@@ -0,0 +1,248 @@
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+from src.models import Libro, Copia, Lector, Prestamo, Suscripcion, BioAlert
+from src.repositorio import RepositorioMemoria
+from src.archivo import ArchivoPrestamos
+from src.diario import (
+    DiarioEscritura, cargar_instantanea, guardar_instantanea, leer_segmento,
+    listar_segmentos)
+
+PATRON_ARCHIVO = re.compile(r"^archivo-\d{8}(\.tmp)?$")
+
+
+class RepositorioPersistente(RepositorioMemoria):
+    """
+    Almacén en memoria que sobrevive a reinicios
+
+    Cada mutación se aplica en memoria y se anota en un diario de escritura
+    anticipada; la llamada retorna cuando el registro es durable, o al salir
+    de `lote` si se hace dentro de uno. Un hilo en
+    segundo plano compacta el diario en una instantánea binaria cada vez que
+    se acumulan `registros_por_instantanea` registros, de modo que el
+    arranque carga la última instantánea y solo reproduce la cola del diario.
+
+    Los préstamos devueltos no van en la instantánea: el archivo columnar se
+    vuelca junto a ella en `archivo-<seq>/` y al arrancar se mapea en memoria
+    (`mapear_archivo`) en lugar de reconstruirse registro a registro.
+    """
+
+    def __init__(self, directorio: str, bio_alert: Optional[BioAlert] = None,
+                 intervalo_fsync: float = 0.005, lote_maximo: int = 512,
+                 fsync: bool = True, intervalo_compactacion: float = 30.0,
+                 registros_por_instantanea: int = 10000, mapear_archivo: bool = True):
+        super().__init__(bio_alert)
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.mapear_archivo = mapear_archivo
+        self.registros_por_instantanea = registros_por_instantanea
+        self._candado = threading.RLock()
+        self._lote = threading.local()
+        self._seq_instantanea, seq = self._recuperar()
+        self.diario = DiarioEscritura(
+            directorio, seq, intervalo_fsync, lote_maximo, fsync)
+        self._detener = threading.Event()
+        self._compactador = threading.Thread(
+            target=self._compactar_periodicamente, args=(intervalo_compactacion,),
+            name="diario-compactador", daemon=True)
+        self._compactador.start()
+
+    def _recuperar(self):
+        RepositorioMemoria.limpiar(self)
+        instantanea = cargar_instantanea(self.directorio)
+        seq_instantanea = 0
+        if instantanea is not None:
+            seq_instantanea = instantanea["seq"]
+            for datos in instantanea["libros"]:
+                RepositorioMemoria.agregar_libro(self, Libro.model_validate(datos))
+            for datos in instantanea["copias"]:
+                RepositorioMemoria.agregar_copia(self, Copia.model_validate(datos))
+            for datos in instantanea["lectores"]:
+                RepositorioMemoria.agregar_lector(self, Lector.model_validate(datos))
+            if "orden_prestamos" in instantanea:
+                self._recuperar_prestamos(instantanea)
+            else:
+                for datos in instantanea["prestamos"]:
+                    RepositorioMemoria.agregar_prestamo(self, Prestamo.model_validate(datos))
+            for datos in instantanea["suscripciones"]:
+                self.bio_alert.agregar(Suscripcion.model_validate(datos))
+
+        seq = seq_instantanea
+        for _, ruta in listar_segmentos(self.directorio):
+            for seq_registro, operacion, datos in leer_segmento(ruta):
+                if seq_registro <= seq:
+                    continue
+                self._aplicar(operacion, datos)
+                seq = seq_registro
+        self._borrar_archivos(conservar=(instantanea or {}).get("archivo"))
+        return seq_instantanea, seq
+
+    def _recuperar_prestamos(self, instantanea: dict):
+        if instantanea["archivo"] is not None:
+            self.archivo = ArchivoPrestamos.abrir(
+                os.path.join(self.directorio, instantanea["archivo"]), self.mapear_archivo)
+        for datos in instantanea["prestamos"]:
+            RepositorioMemoria._guardar_prestamo(self, Prestamo.model_validate(datos))
+        # Los índices por lector y copia se rehacen en el orden original de
+        # alta para que los cursores sigan siendo válidos tras reiniciar
+        for prestamo_id in instantanea["orden_prestamos"]:
+            activo = self.prestamos.get(prestamo_id)
+            if activo is not None:
+                copia_id, lector_email = activo.copia_id, activo.lector_email
+            else:
+                copia_id, lector_email = self.archivo.claves(self.archivo.filas[prestamo_id])
+            self.orden_prestamos.append(prestamo_id)
+            self.prestamos_por_lector.setdefault(lector_email, []).append(prestamo_id)
+            self.prestamos_por_copia.setdefault(copia_id, []).append(prestamo_id)
+
+    def _borrar_archivos(self, conservar: Optional[str]):
+        for nombre in os.listdir(self.directorio):
+            if PATRON_ARCHIVO.match(nombre) and nombre != conservar:
+                shutil.rmtree(os.path.join(self.directorio, nombre))
+
+    def _aplicar(self, operacion: str, datos):
+        if operacion == "libro":
+            RepositorioMemoria.agregar_libro(self, Libro.model_validate(datos))
+        elif operacion == "copia":
+            RepositorioMemoria.agregar_copia(self, Copia.model_validate(datos))
+        elif operacion == "lector":
+            RepositorioMemoria.agregar_lector(self, Lector.model_validate(datos))
+        elif operacion == "prestamo":
+            RepositorioMemoria.agregar_prestamo(self, Prestamo.model_validate(datos))
+        elif operacion == "suscripcion":
+            self.bio_alert.agregar(Suscripcion.model_validate(datos))
+        elif operacion == "notificacion":
+            self.bio_alert.notificar_disponibilidad(datos["libro_id"])
+        elif operacion == "limpiar":
+            RepositorioMemoria.limpiar(self)
+        else:
+            raise ValueError(f"Operación de diario desconocida: {operacion}")
+
+    @contextmanager
+    def lote(self):
+        """
+        Dentro del bloque las mutaciones del hilo se anotan sin esperar; al
+        salir se espera una sola vez a que la última sea durable
+        """
+        estado = self._lote
+        if getattr(estado, "profundidad", 0):
+            estado.profundidad += 1
+            try:
+                yield
+            finally:
+                estado.profundidad -= 1
+            return
+        estado.profundidad, estado.ultimo = 1, 0
+        try:
+            yield
+        finally:
+            estado.profundidad = 0
+            if estado.ultimo:
+                self.diario.esperar(estado.ultimo)
+
+    def _esperar(self, seq: int):
+        if getattr(self._lote, "profundidad", 0):
+            self._lote.ultimo = seq
+        else:
+            self.diario.esperar(seq)
+
+    def _mutar(self, operacion: str, datos, aplicar):
+        with self._candado:
+            resultado = aplicar()
+            seq = self.diario.registrar(operacion, datos)
+        self._esperar(seq)
+        return resultado
+
+    def compactar(self):
+        with self._candado:
+            seq, segmento = self.diario.rotar()
+            libros = list(self.libros.values())
+            copias = [copia.a_modelo() for copia in self.copias.values()]
+            lectores = list(self.lectores.values())
+            prestamos = [prestamo.a_modelo() for prestamo in self.prestamos.values()]
+            orden_prestamos = list(self.orden_prestamos)
+            archivados = len(self.archivo)
+            suscripciones = self.bio_alert.suscripciones
+        archivo = None
+        if archivados:
+            # Las filas posteriores a la captura tienen secuencia mayor que
+            # `seq` y se reproducen desde el diario
+            archivo = f"archivo-{seq:08d}"
+            ruta_archivo = os.path.join(self.directorio, archivo)
+            for ruta in (ruta_archivo, ruta_archivo + ".tmp"):
+                if os.path.exists(ruta):
+                    shutil.rmtree(ruta)
+            self.archivo.guardar(ruta_archivo, archivados)
+        guardar_instantanea(self.directorio, {
+            "version": 2,
+            "seq": seq,
+            "libros": [libro.model_dump() for libro in libros],
+            "copias": [copia.model_dump() for copia in copias],
+            "lectores": [lector.model_dump() for lector in lectores],
+            "prestamos": [prestamo.model_dump() for prestamo in prestamos],
+            "orden_prestamos": orden_prestamos,
+            "archivo": archivo,
+            "suscripciones": [s.model_dump() for s in suscripciones],
+        })
+        self._seq_instantanea = seq
+        for numero, ruta in listar_segmentos(self.directorio):
+            if numero < segmento:
+                os.remove(ruta)
+        self._borrar_archivos(conservar=archivo)
+
+    def _compactar_periodicamente(self, intervalo: float):
+        while not self._detener.wait(intervalo):
+            if self.diario.seq - self._seq_instantanea >= self.registros_por_instantanea:
+                self.compactar()
+
+    def cerrar(self):
+        self._detener.set()
+        self._compactador.join()
+        self.diario.cerrar()
+        self.archivo.cerrar()
+
+    def limpiar(self):
+        self._mutar("limpiar", None, lambda: RepositorioMemoria.limpiar(self))
+
+    def agregar_libro(self, libro: Libro) -> Libro:
+        return self._mutar("libro", libro.model_dump(mode="json"),
+                           lambda: RepositorioMemoria.agregar_libro(self, libro))
+
+    def agregar_copia(self, copia: Copia) -> Copia:
+        return self._mutar("copia", copia.model_dump(mode="json"),
+                           lambda: RepositorioMemoria.agregar_copia(self, copia))
+
+    def actualizar_copia(self, copia: Copia) -> Copia:
+        return self._mutar("copia", copia.model_dump(mode="json"),
+                           lambda: RepositorioMemoria.actualizar_copia(self, copia))
+
+    def agregar_lector(self, lector: Lector) -> Lector:
+        return self._mutar("lector", lector.model_dump(mode="json"),
+                           lambda: RepositorioMemoria.agregar_lector(self, lector))
+
+    def actualizar_lector(self, lector: Lector) -> Lector:
+        return self._mutar("lector", lector.model_dump(mode="json"),
+                           lambda: RepositorioMemoria.actualizar_lector(self, lector))
+
+    def agregar_prestamo(self, prestamo: Prestamo) -> Prestamo:
+        return self._mutar("prestamo", prestamo.model_dump(mode="json"),
+                           lambda: RepositorioMemoria.agregar_prestamo(self, prestamo))
+
+    def actualizar_prestamo(self, prestamo: Prestamo) -> Prestamo:
+        return self._mutar("prestamo", prestamo.model_dump(mode="json"),
+                           lambda: RepositorioMemoria.actualizar_prestamo(self, prestamo))
+
+    def suscribir(self, lector_email: str, libro_id: str) -> Suscripcion:
+        with self._candado:
+            suscripcion = RepositorioMemoria.suscribir(self, lector_email, libro_id)
+            seq = self.diario.registrar("suscripcion", suscripcion.model_dump(mode="json"))
+        self._esperar(seq)
+        return suscripcion
+
+    def notificar_disponibilidad(self, libro_id: str) -> List[dict]:
+        return self._mutar(
+            "notificacion", {"libro_id": libro_id},
+            lambda: RepositorioMemoria.notificar_disponibilidad(self, libro_id))
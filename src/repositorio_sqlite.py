@@ -0,0 +1,569 @@
+import sqlite3
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+from src.models import EstadoCopia, Libro, Copia, Lector, Prestamo, Suscripcion
+from src.busqueda import normalizar, trigramas
+from src.repositorio import Repositorio
+from src.archivo import NULO, a_microsegundos
+from src.estadisticas import TablaPrestamos
+
+TAMANIO_BLOQUE = 500
+TABLAS_MEMORIA = ("libros", "copias", "lectores", "prestamos", "suscripciones")
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS libros (
+    id TEXT PRIMARY KEY,
+    autor TEXT NOT NULL,
+    datos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS autor_trigramas (
+    trigrama TEXT NOT NULL,
+    libro_id TEXT NOT NULL,
+    PRIMARY KEY (trigrama, libro_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS copias (
+    id TEXT PRIMARY KEY,
+    libro_id TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    datos TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_copias_libro ON copias (libro_id);
+CREATE INDEX IF NOT EXISTS idx_copias_estado ON copias (estado);
+CREATE TABLE IF NOT EXISTS versiones (
+    clave TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    clave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS disponibilidad (
+    libro_id TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    PRIMARY KEY (libro_id, estado)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lectores (
+    email TEXT PRIMARY KEY,
+    datos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prestamos (
+    id TEXT PRIMARY KEY,
+    copia_id TEXT NOT NULL,
+    lector_email TEXT NOT NULL,
+    datos TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_prestamos_lector ON prestamos (lector_email);
+CREATE INDEX IF NOT EXISTS idx_prestamos_copia ON prestamos (copia_id);
+CREATE INDEX IF NOT EXISTS idx_prestamos_activos ON prestamos (id)
+    WHERE json_extract(datos, '$.fecha_devolucion_real') IS NULL;
+CREATE INDEX IF NOT EXISTS idx_prestamos_vencimiento
+    ON prestamos (json_extract(datos, '$.fecha_devolucion_esperada'))
+    WHERE json_extract(datos, '$.fecha_devolucion_real') IS NULL;
+CREATE TABLE IF NOT EXISTS devoluciones (
+    prestamo_id TEXT NOT NULL UNIQUE,
+    copia_id TEXT NOT NULL,
+    lector_email TEXT NOT NULL,
+    fecha_prestamo INTEGER NOT NULL,
+    fecha_devolucion_esperada INTEGER NOT NULL,
+    fecha_devolucion_real INTEGER NOT NULL,
+    dias_retraso INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS suscripciones (
+    libro_id TEXT NOT NULL,
+    lector_email TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    PRIMARY KEY (libro_id, lector_email)
+);
+CREATE INDEX IF NOT EXISTS idx_suscripciones_lector ON suscripciones (lector_email);
+"""
+
+UPSERT_LIBRO = """
+INSERT INTO libros (id, autor, datos) VALUES (?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET autor = excluded.autor, datos = excluded.datos
+"""
+UPSERT_COPIA = """
+INSERT INTO copias (id, libro_id, estado, datos) VALUES (?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET libro_id = excluded.libro_id,
+    estado = excluded.estado, datos = excluded.datos
+"""
+SUMAR_DISPONIBILIDAD = """
+INSERT INTO disponibilidad (libro_id, estado, total) VALUES (?, ?, ?)
+ON CONFLICT (libro_id, estado) DO UPDATE SET total = total + excluded.total
+"""
+RECALCULAR_DISPONIBILIDAD = """
+INSERT INTO disponibilidad (libro_id, estado, total)
+SELECT libro_id, estado, COUNT(*) FROM copias GROUP BY libro_id, estado
+"""
+TOCAR_VERSION = """
+INSERT INTO versiones (clave, version) VALUES (?, 1)
+ON CONFLICT (clave) DO UPDATE SET version = version + 1
+"""
+LEER_VERSION = """
+SELECT (SELECT valor FROM meta WHERE clave = 'epoca'),
+       (SELECT version FROM versiones WHERE clave = ?)
+"""
+TABLA_ACTIVOS = """
+SELECT json_extract(p.datos, '$.fecha_prestamo'),
+       json_extract(p.datos, '$.fecha_devolucion_esperada'),
+       json_extract(p.datos, '$.dias_retraso'),
+       COALESCE(c.libro_id, ''), p.lector_email
+FROM prestamos p INDEXED BY idx_prestamos_activos LEFT JOIN copias c ON c.id = p.copia_id
+WHERE json_extract(p.datos, '$.fecha_devolucion_real') IS NULL
+ORDER BY p.rowid
+"""
+TABLA_DEVOLUCIONES = """
+SELECT d.rowid, d.fecha_prestamo, d.fecha_devolucion_esperada, d.fecha_devolucion_real,
+       d.dias_retraso, COALESCE(c.libro_id, ''), d.lector_email
+FROM devoluciones d LEFT JOIN copias c ON c.id = d.copia_id
+WHERE d.rowid > ?
+ORDER BY d.rowid
+"""
+INSERTAR_DEVOLUCION = """
+INSERT INTO devoluciones (copia_id, lector_email, fecha_prestamo, fecha_devolucion_esperada,
+                          fecha_devolucion_real, dias_retraso, prestamo_id)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+ACTUALIZAR_DEVOLUCION = """
+UPDATE devoluciones SET copia_id = ?, lector_email = ?, fecha_prestamo = ?,
+    fecha_devolucion_esperada = ?, fecha_devolucion_real = ?, dias_retraso = ?
+WHERE prestamo_id = ?
+"""
+UPSERT_LECTOR = """
+INSERT INTO lectores (email, datos) VALUES (?, ?)
+ON CONFLICT (email) DO UPDATE SET datos = excluded.datos
+"""
+UPSERT_PRESTAMO = """
+INSERT INTO prestamos (id, copia_id, lector_email, datos) VALUES (?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET copia_id = excluded.copia_id,
+    lector_email = excluded.lector_email, datos = excluded.datos
+"""
+
+
+class RepositorioSQLite(Repositorio):
+    """
+    Almacén persistente sobre SQLite en modo WAL
+
+    Cada hilo reutiliza su propia conexión. Las consultas usan SQL constante
+    con parámetros, de modo que la caché de sentencias de sqlite3 las prepara
+    una sola vez. Las columnas libro_id, lector_email y estado están
+    indexadas y los cursores de paginación son rowids. La tabla
+    disponibilidad guarda el número de copias por libro y estado y se
+    actualiza en la misma transacción que cada copia, igual que la tabla
+    versiones; la época de meta cambia con `limpiar`, de modo que todos los
+    procesos sobre la misma base ven las mismas versiones. La tabla
+    devoluciones repite cada préstamo devuelto con sus fechas en
+    microsegundos y solo crece, así que las estadísticas leen únicamente
+    las filas nuevas.
+    """
+
+    compartido = True
+
+    def __init__(self, ruta: str):
+        super().__init__()
+        self.ruta = ruta
+        self._local = threading.local()
+        self._conexiones: List[sqlite3.Connection] = []
+        self._candado_conexiones = threading.Lock()
+        self._conexion().executescript(ESQUEMA)
+        with self.transaccion() as conexion:
+            contadores = conexion.execute(
+                "SELECT EXISTS (SELECT 1 FROM disponibilidad)").fetchone()[0]
+            if not contadores:
+                conexion.execute(RECALCULAR_DISPONIBILIDAD)
+            if not conexion.execute("SELECT EXISTS (SELECT 1 FROM devoluciones)").fetchone()[0]:
+                conexion.executemany(INSERTAR_DEVOLUCION, [
+                    _devolucion(Prestamo.model_validate_json(datos)) for (datos,) in conexion.execute(
+                        "SELECT datos FROM prestamos "
+                        "WHERE json_extract(datos, '$.fecha_devolucion_real') IS NOT NULL "
+                        "ORDER BY rowid")])
+            conexion.execute("INSERT OR IGNORE INTO meta (clave, valor) VALUES ('epoca', ?)",
+                             (uuid.uuid4().hex[:12],))
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(
+                self.ruta, isolation_level=None, timeout=30,
+                check_same_thread=False, cached_statements=256)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+            self._local.profundidad = 0
+            with self._candado_conexiones:
+                self._conexiones.append(conexion)
+        return conexion
+
+    @contextmanager
+    def transaccion(self):
+        """
+        Transacción de escritura (BEGIN IMMEDIATE). Las transacciones
+        anidadas en el mismo hilo se integran en la exterior.
+        """
+        conexion = self._conexion()
+        if self._local.profundidad:
+            self._local.profundidad += 1
+            try:
+                yield conexion
+            finally:
+                self._local.profundidad -= 1
+            return
+        conexion.execute("BEGIN IMMEDIATE")
+        self._local.profundidad = 1
+        try:
+            yield conexion
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+        else:
+            conexion.execute("COMMIT")
+        finally:
+            self._local.profundidad = 0
+
+    @contextmanager
+    def lote(self):
+        with self.transaccion():
+            yield
+
+    @contextmanager
+    def _lectura(self):
+        """Consultas sobre una misma instantánea de la base (BEGIN diferido)"""
+        conexion = self._conexion()
+        if self._local.profundidad:
+            yield conexion
+            return
+        conexion.execute("BEGIN")
+        self._local.profundidad = 1
+        try:
+            yield conexion
+        finally:
+            conexion.execute("COMMIT")
+            self._local.profundidad = 0
+
+    @contextmanager
+    def bloquear(self, copias=(), lectores=()):
+        """
+        Además de los candados del proceso abre una transacción de escritura,
+        que excluye a otros procesos sobre la misma base de datos.
+        """
+        with super().bloquear(copias, lectores), self.transaccion():
+            yield
+
+    def cerrar(self):
+        with self._candado_conexiones:
+            for conexion in self._conexiones:
+                conexion.close()
+            self._conexiones.clear()
+        self._local = threading.local()
+
+    def limpiar(self):
+        with self.transaccion() as conexion:
+            for tabla in ("libros", "autor_trigramas", "copias", "disponibilidad",
+                          "lectores", "prestamos", "devoluciones", "suscripciones",
+                          "versiones"):
+                conexion.execute(f"DELETE FROM {tabla}")
+            conexion.execute("UPDATE meta SET valor = ? WHERE clave = 'epoca'",
+                             (uuid.uuid4().hex[:12],))
+
+    def version(self, clave: str) -> str:
+        epoca, version = self._conexion().execute(LEER_VERSION, (clave,)).fetchone()
+        return f"{epoca}.{version or 0}"
+
+    @staticmethod
+    def _tocar(conexion: sqlite3.Connection, *claves: str):
+        conexion.executemany(TOCAR_VERSION, [(clave,) for clave in claves])
+
+    def _uno(self, sql: str, parametros: tuple, modelo):
+        fila = self._conexion().execute(sql, parametros).fetchone()
+        return modelo.model_validate_json(fila[0]) if fila else None
+
+    def _todos(self, sql: str, parametros: tuple, modelo) -> list:
+        filas = self._conexion().execute(sql, parametros).fetchall()
+        return [modelo.model_validate_json(fila[0]) for fila in filas]
+
+    def _pagina(self, sql: str, parametros: tuple, desde: int, limite: int, modelo):
+        filas = self._conexion().execute(
+            sql, parametros + (desde, limite + 1)).fetchall()
+        siguiente = filas[limite - 1][0] if len(filas) > limite else None
+        return [modelo.model_validate_json(datos) for _, datos in filas[:limite]], siguiente
+
+    def _recorrer(self, sql: str, modelo):
+        desde = 0
+        while desde is not None:
+            items, desde = self._pagina(sql, (), desde, TAMANIO_BLOQUE, modelo)
+            yield from items
+
+    def agregar_libro(self, libro: Libro) -> Libro:
+        autor = normalizar(libro.autor.nombre)
+        with self.transaccion() as conexion:
+            conexion.execute(UPSERT_LIBRO, (libro.id, autor, libro.model_dump_json()))
+            conexion.execute(
+                "DELETE FROM autor_trigramas WHERE libro_id = ?", (libro.id,))
+            conexion.executemany(
+                "INSERT INTO autor_trigramas (trigrama, libro_id) VALUES (?, ?)",
+                [(trigrama, libro.id) for trigrama in trigramas(autor)])
+            self._tocar(conexion, "libros", f"libro:{libro.id}")
+        return libro
+
+    def obtener_libro(self, libro_id: str) -> Optional[Libro]:
+        return self._uno("SELECT datos FROM libros WHERE id = ?", (libro_id,), Libro)
+
+    def buscar_libros_por_autor(self, nombre_autor: str) -> List[Libro]:
+        normalizada = normalizar(nombre_autor)
+        consulta_trigramas = sorted(trigramas(normalizada))
+        if not consulta_trigramas:
+            return self._todos(
+                "SELECT datos FROM libros WHERE instr(autor, ?) > 0 ORDER BY rowid",
+                (normalizada,), Libro)
+        marcadores = ", ".join("?" * len(consulta_trigramas))
+        sql = (
+            "SELECT datos FROM libros WHERE id IN ("
+            "SELECT libro_id FROM autor_trigramas "
+            f"WHERE trigrama IN ({marcadores}) "
+            "GROUP BY libro_id HAVING COUNT(*) = ?) "
+            "AND instr(autor, ?) > 0 ORDER BY rowid")
+        return self._todos(
+            sql, (*consulta_trigramas, len(consulta_trigramas), normalizada), Libro)
+
+    def pagina_libros(self, desde: int, limite: int):
+        return self._pagina(
+            "SELECT rowid, datos FROM libros WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (), desde, limite, Libro)
+
+    def iterar_libros(self):
+        return self._recorrer(
+            "SELECT rowid, datos FROM libros WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            Libro)
+
+    def agregar_copia(self, copia: Copia) -> Copia:
+        with self.transaccion() as conexion:
+            anterior = conexion.execute(
+                "SELECT libro_id, estado FROM copias WHERE id = ?", (copia.id,)).fetchone()
+            conexion.execute(UPSERT_COPIA, (copia.id, copia.libro_id,
+                                            copia.estado.value, copia.model_dump_json()))
+            if anterior != (copia.libro_id, copia.estado.value):
+                if anterior is not None:
+                    conexion.execute(SUMAR_DISPONIBILIDAD, (*anterior, -1))
+                conexion.execute(
+                    SUMAR_DISPONIBILIDAD, (copia.libro_id, copia.estado.value, 1))
+            self._tocar(conexion, "copias", f"copia:{copia.id}",
+                        f"copias_libro:{copia.libro_id}")
+        return copia
+
+    def obtener_copia(self, copia_id: str) -> Optional[Copia]:
+        return self._uno("SELECT datos FROM copias WHERE id = ?", (copia_id,), Copia)
+
+    def actualizar_copia(self, copia: Copia) -> Copia:
+        return self.agregar_copia(copia)
+
+    def copias_de_libro(self, libro_id: str) -> List[Copia]:
+        return self._todos(
+            "SELECT datos FROM copias WHERE libro_id = ? ORDER BY rowid",
+            (libro_id,), Copia)
+
+    def disponibilidad(self, libro_ids):
+        libro_ids = list(libro_ids)
+        resultado = {libro_id: {} for libro_id in libro_ids}
+        if not libro_ids:
+            return resultado
+        marcadores = ", ".join("?" * len(libro_ids))
+        filas = self._conexion().execute(
+            "SELECT libro_id, estado, total FROM disponibilidad "
+            f"WHERE libro_id IN ({marcadores}) AND total > 0", libro_ids)
+        for libro_id, estado, total in filas:
+            resultado[libro_id][EstadoCopia(estado)] = total
+        return resultado
+
+    def pagina_copias(self, desde: int, limite: int):
+        return self._pagina(
+            "SELECT rowid, datos FROM copias WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (), desde, limite, Copia)
+
+    def iterar_copias(self):
+        return self._recorrer(
+            "SELECT rowid, datos FROM copias WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            Copia)
+
+    def agregar_lector(self, lector: Lector) -> Lector:
+        with self.transaccion() as conexion:
+            conexion.execute(UPSERT_LECTOR, (lector.email, lector.model_dump_json()))
+            self._tocar(conexion, "lectores", f"lector:{lector.email}")
+        return lector
+
+    def obtener_lector(self, email: str) -> Optional[Lector]:
+        return self._uno("SELECT datos FROM lectores WHERE email = ?", (email,), Lector)
+
+    def actualizar_lector(self, lector: Lector) -> Lector:
+        return self.agregar_lector(lector)
+
+    def pagina_lectores(self, desde: int, limite: int):
+        return self._pagina(
+            "SELECT rowid, datos FROM lectores WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (), desde, limite, Lector)
+
+    def iterar_lectores(self):
+        return self._recorrer(
+            "SELECT rowid, datos FROM lectores WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            Lector)
+
+    def agregar_prestamo(self, prestamo: Prestamo) -> Prestamo:
+        claves = ["prestamos", f"prestamo:{prestamo.id}",
+                  f"prestamos_lector:{prestamo.lector_email}"]
+        with self.transaccion() as conexion:
+            conexion.execute(UPSERT_PRESTAMO, (prestamo.id, prestamo.copia_id,
+                                               prestamo.lector_email,
+                                               prestamo.model_dump_json()))
+            if prestamo.fecha_devolucion_real is None:
+                if conexion.execute("DELETE FROM devoluciones WHERE prestamo_id = ?",
+                                    (prestamo.id,)).rowcount:
+                    claves.append("historial")
+            else:
+                devolucion = _devolucion(prestamo)
+                if conexion.execute(ACTUALIZAR_DEVOLUCION, devolucion).rowcount:
+                    claves.append("historial")
+                else:
+                    conexion.execute(INSERTAR_DEVOLUCION, devolucion)
+            self._tocar(conexion, *claves)
+        return prestamo
+
+    def obtener_prestamo(self, prestamo_id: str) -> Optional[Prestamo]:
+        return self._uno("SELECT datos FROM prestamos WHERE id = ?", (prestamo_id,), Prestamo)
+
+    def actualizar_prestamo(self, prestamo: Prestamo) -> Prestamo:
+        return self.agregar_prestamo(prestamo)
+
+    def prestamos_de_lector(self, email: str) -> List[Prestamo]:
+        return self._todos(
+            "SELECT datos FROM prestamos WHERE lector_email = ? ORDER BY rowid",
+            (email,), Prestamo)
+
+    def prestamos_de_copia(self, copia_id: str) -> List[Prestamo]:
+        return self._todos(
+            "SELECT datos FROM prestamos WHERE copia_id = ? ORDER BY rowid",
+            (copia_id,), Prestamo)
+
+    def pagina_prestamos(self, desde: int, limite: int):
+        return self._pagina(
+            "SELECT rowid, datos FROM prestamos WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (), desde, limite, Prestamo)
+
+    def pagina_prestamos_lector(self, email: str, desde: int, limite: int):
+        return self._pagina(
+            "SELECT rowid, datos FROM prestamos WHERE lector_email = ? AND rowid > ? "
+            "ORDER BY rowid LIMIT ?",
+            (email,), desde, limite, Prestamo)
+
+    def iterar_prestamos(self):
+        return self._recorrer(
+            "SELECT rowid, datos FROM prestamos WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            Prestamo)
+
+    def iterar_prestamos_activos(self):
+        # El índice parcial solo contiene préstamos sin devolver
+        return iter(self._todos(
+            "SELECT datos FROM prestamos INDEXED BY idx_prestamos_activos "
+            "WHERE json_extract(datos, '$.fecha_devolucion_real') IS NULL",
+            (), Prestamo))
+
+    def prestamos_vencidos(self, desde: Optional[datetime], hasta: datetime):
+        # Las fechas se guardan en ISO 8601 sin zona, que ordena igual como
+        # texto que como fecha
+        return self._todos(
+            "SELECT datos FROM prestamos INDEXED BY idx_prestamos_vencimiento "
+            "WHERE json_extract(datos, '$.fecha_devolucion_real') IS NULL "
+            "AND json_extract(datos, '$.fecha_devolucion_esperada') >= ? "
+            "AND json_extract(datos, '$.fecha_devolucion_esperada') < ? "
+            "ORDER BY json_extract(datos, '$.fecha_devolucion_esperada')",
+            ("" if desde is None else desde.isoformat(), hasta.isoformat()), Prestamo)
+
+    def ampliar_historial(self, tabla: TablaPrestamos, posicion: Optional[tuple]):
+        # La posición es la versión de "historial" y el último rowid leído
+        with self._lectura() as conexion:
+            version = self.version("historial")
+            desde = 0
+            if posicion is not None:
+                if posicion[0] != version:
+                    return None
+                desde = posicion[1]
+            return version, _agregar_devoluciones(conexion, tabla, desde)
+
+    def agregar_activos(self, tabla: TablaPrestamos, posicion: tuple):
+        # Se leen solo las columnas necesarias, sin validar cada préstamo;
+        # la devolución y su fila en devoluciones se escriben en la misma
+        # transacción, así que en una instantánea cada préstamo está en una
+        with self._lectura() as conexion:
+            _agregar_devoluciones(conexion, tabla, posicion[1])
+            for (fecha_prestamo, esperada, dias_retraso,
+                 libro_id, lector_email) in conexion.execute(TABLA_ACTIVOS):
+                tabla.agregar_fila(_microsegundos(fecha_prestamo), _microsegundos(esperada),
+                                   NULO, dias_retraso, libro_id, lector_email)
+
+    def uso_memoria(self) -> List[dict]:
+        # Los datos viven en el fichero: solo se cuentan las filas
+        conexion = self._conexion()
+        return [{
+            "nombre": tabla,
+            "objetos": conexion.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0],
+            "bytes_aproximados": None,
+        } for tabla in TABLAS_MEMORIA]
+
+    def suscribir(self, lector_email: str, libro_id: str) -> Suscripcion:
+        suscripcion = Suscripcion(
+            lector_email=lector_email,
+            libro_id=libro_id,
+            fecha_suscripcion=datetime.now()
+        )
+        with self.transaccion() as conexion:
+            conexion.execute(
+                "INSERT OR IGNORE INTO suscripciones (libro_id, lector_email, datos) "
+                "VALUES (?, ?, ?)",
+                (libro_id, lector_email, suscripcion.model_dump_json()))
+            fila = conexion.execute(
+                "SELECT datos FROM suscripciones WHERE libro_id = ? AND lector_email = ?",
+                (libro_id, lector_email)).fetchone()
+        return Suscripcion.model_validate_json(fila[0])
+
+    def notificar_disponibilidad(self, libro_id: str) -> List[dict]:
+        with self.transaccion() as conexion:
+            filas = conexion.execute(
+                "SELECT lector_email FROM suscripciones WHERE libro_id = ? ORDER BY rowid",
+                (libro_id,)).fetchall()
+            conexion.execute(
+                "DELETE FROM suscripciones WHERE libro_id = ?", (libro_id,))
+        return [{
+            "email": lector_email,
+            "mensaje": f"El libro {libro_id} está disponible",
+            "fecha": datetime.now()
+        } for (lector_email,) in filas]
+
+    def obtener_suscripciones(self, lector_email: Optional[str] = None) -> List[Suscripcion]:
+        if lector_email:
+            return self._todos(
+                "SELECT datos FROM suscripciones WHERE lector_email = ? ORDER BY rowid",
+                (lector_email,), Suscripcion)
+        return self._todos(
+            "SELECT datos FROM suscripciones ORDER BY rowid", (), Suscripcion)
+
+
+def _microsegundos(fecha: Optional[str]) -> int:
+    return a_microsegundos(datetime.fromisoformat(fecha) if fecha is not None else None)
+
+
+def _devolucion(prestamo: Prestamo) -> tuple:
+    """Parámetros de INSERTAR_DEVOLUCION y ACTUALIZAR_DEVOLUCION"""
+    return (prestamo.copia_id, prestamo.lector_email,
+            a_microsegundos(prestamo.fecha_prestamo),
+            a_microsegundos(prestamo.fecha_devolucion_esperada),
+            a_microsegundos(prestamo.fecha_devolucion_real),
+            prestamo.dias_retraso, prestamo.id)
+
+
+def _agregar_devoluciones(conexion: sqlite3.Connection, tabla: TablaPrestamos,
+                          desde: int) -> int:
+    ultima = desde
+    for ultima, *fila in conexion.execute(TABLA_DEVOLUCIONES, (desde,)):
+        tabla.agregar_fila(*fila)
+    return ultima
@@ -0,0 +1,130 @@
+from datetime import datetime
+from typing import Any, Dict, Generic, List, Optional, TypeVar
+from pydantic import BaseModel
+from src.models import Prestamo, Suscripcion
+
+T = TypeVar("T")
+
+
+class PaginaCursor(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+class InfoApi(BaseModel):
+    mensaje: str
+    version: str
+
+
+class ErrorIngesta(BaseModel):
+    indice: int
+    detalle: Any
+
+
+class ResultadoIngesta(BaseModel):
+    insertados: int
+    errores: List[ErrorIngesta]
+
+
+class DisponibilidadLibro(BaseModel):
+    libro_id: str
+    disponible: bool
+    total_copias: int
+    copias: Dict[str, int]
+
+
+class DisponibilidadLibros(BaseModel):
+    libros: List[DisponibilidadLibro]
+    no_encontrados: List[str]
+
+
+class DevolucionPrestamo(BaseModel):
+    prestamo: Prestamo
+    multa_dias: int
+
+
+class SuscripcionCreada(BaseModel):
+    mensaje: str
+    suscripcion: Suscripcion
+
+
+class EstadisticasCache(BaseModel):
+    capacidad: int
+    entradas: int
+    bytes: int
+    aciertos: int
+    fallos: int
+    expulsiones: int
+
+
+class RetrasoLibro(BaseModel):
+    libro_id: str
+    prestamos: int
+    con_retraso: int
+    tasa_retraso: float
+
+
+class DistribucionRetrasos(BaseModel):
+    prestamos_devueltos: int
+    con_retraso: int
+    media_dias: float
+    mediana_dias: int
+    p90_dias: int
+    maximo_dias: int
+    histograma: Dict[str, int]
+
+
+class PrestamosMes(BaseModel):
+    mes: str
+    prestamos: int
+
+
+class LectorSuspendido(BaseModel):
+    lector_email: str
+    dias_suspension: int
+    prestamos_con_retraso: int
+
+
+class PerfilResumen(BaseModel):
+    id: int
+    metodo: str
+    ruta: str
+    estado: int
+    motivo: str
+    duracion_ms: float
+    fecha: datetime
+
+
+class ConfiguracionPerfiles(BaseModel):
+    capacidad: int
+    fraccion: float
+    cabecera: str
+
+
+class MemoriaAlmacen(BaseModel):
+    nombre: str
+    objetos: int
+    bytes_aproximados: Optional[int] = None
+
+
+class DiferenciaMemoria(BaseModel):
+    archivo: str
+    linea: int
+    bytes: int
+    diferencia_bytes: int
+    objetos: int
+    diferencia_objetos: int
+
+
+class EstadoTracemalloc(BaseModel):
+    activo: bool
+    memoria_trazada: int
+    pico: int
+    diferencias: Optional[List[DiferenciaMemoria]] = None
+
+
+class InformeMemoria(BaseModel):
+    almacen: str
+    almacenes: List[MemoriaAlmacen]
+    total_bytes_aproximados: int
+    tracemalloc: Optional[EstadoTracemalloc] = None
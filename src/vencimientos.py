@@ -0,0 +1,148 @@
+import heapq
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger("vencimientos")
+
+
+class AgendaVencimientos:
+    """
+    Montículo de préstamos activos ordenado por fecha de devolución esperada
+
+    Cancelar o reprogramar un préstamo no toca el montículo: la entrada
+    antigua se descarta al salir si ya no coincide con la fecha programada.
+    Extraer los vencidos cuesta O(k log n) para k préstamos recién vencidos.
+    """
+
+    def __init__(self):
+        self._monticulo: List[Tuple[datetime, str]] = []
+        self._programados: Dict[str, datetime] = {}
+        self._vencidos: Dict[str, None] = {}
+        self._candado = threading.Lock()
+
+    def __len__(self):
+        return len(self._programados)
+
+    def limpiar(self):
+        with self._candado:
+            self._monticulo.clear()
+            self._programados.clear()
+            self._vencidos.clear()
+
+    def programar(self, prestamo_id: str, fecha: datetime):
+        with self._candado:
+            self._programados[prestamo_id] = fecha
+            self._vencidos.pop(prestamo_id, None)
+            heapq.heappush(self._monticulo, (fecha, prestamo_id))
+
+    def cancelar(self, prestamo_id: str):
+        with self._candado:
+            self._programados.pop(prestamo_id, None)
+            self._vencidos.pop(prestamo_id, None)
+
+    def extraer_vencidos(self, ahora: datetime) -> List[str]:
+        extraidos = []
+        with self._candado:
+            while self._monticulo and self._monticulo[0][0] < ahora:
+                fecha, prestamo_id = heapq.heappop(self._monticulo)
+                if self._programados.get(prestamo_id) != fecha:
+                    continue
+                del self._programados[prestamo_id]
+                self._vencidos[prestamo_id] = None
+                extraidos.append(prestamo_id)
+        return extraidos
+
+    def vencidos(self) -> List[str]:
+        with self._candado:
+            return list(self._vencidos)
+
+
+class AgendaCompartida:
+    """
+    Agenda de vencimientos para un almacén que escriben varios procesos
+
+    No guarda los préstamos: cada extracción pide a `consultar(desde, hasta)`
+    los ids de los activos que vencen entre el barrido anterior y `ahora`,
+    así que ve también los que crearon o devolvieron otros procesos. Un
+    préstamo programado con fecha anterior al último barrido sale en el
+    siguiente.
+    """
+
+    def __init__(self, consultar: Callable[[Optional[datetime], datetime], List[str]]):
+        self._consultar = consultar
+        self._ultimo: Optional[datetime] = None
+        self._pendientes: Dict[str, None] = {}
+        self._candado = threading.Lock()
+
+    def limpiar(self):
+        with self._candado:
+            self._ultimo = None
+            self._pendientes.clear()
+
+    def programar(self, prestamo_id: str, fecha: datetime):
+        with self._candado:
+            if self._ultimo is not None and fecha < self._ultimo:
+                self._pendientes[prestamo_id] = None
+            else:
+                self._pendientes.pop(prestamo_id, None)
+
+    def cancelar(self, prestamo_id: str):
+        with self._candado:
+            self._pendientes.pop(prestamo_id, None)
+
+    def extraer_vencidos(self, ahora: datetime) -> List[str]:
+        with self._candado:
+            extraidos = dict(self._pendientes)
+            self._pendientes.clear()
+            if self._ultimo is None or self._ultimo < ahora:
+                extraidos.update(dict.fromkeys(self._consultar(self._ultimo, ahora)))
+                self._ultimo = ahora
+        return list(extraidos)
+
+    def vencidos(self) -> List[str]:
+        with self._candado:
+            hasta = self._ultimo
+        return [] if hasta is None else self._consultar(None, hasta)
+
+
+class BarredorVencimientos:
+    """
+    Hilo que cada `intervalo` segundos extrae los préstamos recién vencidos
+    de la agenda y llama a `marcar` con cada uno
+    """
+
+    def __init__(self, agenda: Union[AgendaVencimientos, AgendaCompartida],
+                 marcar: Callable[[str], None], intervalo: float = 60.0):
+        self.agenda = agenda
+        self.marcar = marcar
+        self.intervalo = intervalo
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def barrer(self, ahora: Optional[datetime] = None) -> List[str]:
+        prestamos = self.agenda.extraer_vencidos(ahora or datetime.now())
+        for prestamo_id in prestamos:
+            try:
+                self.marcar(prestamo_id)
+            except Exception:
+                logger.exception("No se pudo marcar el préstamo %s como vencido", prestamo_id)
+        return prestamos
+
+    def iniciar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(
+            target=self._ejecutar, name="barredor-vencimientos", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def _ejecutar(self):
+        while not self._detener.wait(self.intervalo):
+            self.barrer()
@@ -0,0 +1,134 @@
+import threading
+from datetime import datetime
+import pytest
+from src.archivo import COLUMNAS, ArchivoPrestamos, Columna
+from test.utilidades import crear_prestamo
+
+INICIO = datetime(2025, 1, 1, 9, 30, 0, 250)
+
+
+def llenar(archivo):
+    archivo.agregar(crear_prestamo("p1", "c1", "a@uni.edu", INICIO, dias_retraso=0))
+    archivo.agregar(crear_prestamo("p2", "c2", "b@uni.edu", INICIO, dias_retraso=3))
+    archivo.agregar(crear_prestamo("p3", "c1", "a@uni.edu", INICIO, dias_retraso=1))
+
+
+def test_ida_y_vuelta():
+    archivo = ArchivoPrestamos()
+    llenar(archivo)
+
+    assert archivo.obtener("p2") == crear_prestamo("p2", "c2", "b@uni.edu", INICIO, dias_retraso=3)
+    assert archivo.claves(2) == ("c1", "a@uni.edu")
+    assert archivo.obtener("nadie") is None
+    assert len(archivo.lectores) == 2
+    assert list(archivo.columnas["dias_retraso"]) == [0, 3, 1]
+
+
+def test_agregar_existente_sobrescribe_la_fila():
+    archivo = ArchivoPrestamos()
+    llenar(archivo)
+    archivo.agregar(crear_prestamo("p1", "c1", "a@uni.edu", INICIO, dias_retraso=5))
+
+    assert len(archivo) == 3
+    assert archivo.obtener("p1").dias_retraso == 5
+
+
+def test_guardar_y_abrir_mapeado(tmp_path):
+    archivo = ArchivoPrestamos()
+    llenar(archivo)
+    archivo.guardar(str(tmp_path / "archivo"), filas=2)
+
+    abierto = ArchivoPrestamos.abrir(str(tmp_path / "archivo"), mapear=True)
+    assert len(abierto) == 2
+    assert isinstance(abierto.columnas["fecha_prestamo"].base, memoryview)
+    assert abierto.obtener("p2") == archivo.obtener("p2")
+
+    # Las filas nuevas van a la cola en memoria y las modificaciones de la
+    # base no tocan el fichero
+    abierto.agregar(crear_prestamo("p4", "c3", "a@uni.edu", INICIO, dias_retraso=0))
+    abierto.agregar(crear_prestamo("p1", "c1", "a@uni.edu", INICIO, dias_retraso=7))
+    assert abierto.claves(2) == ("c3", "a@uni.edu")
+    assert abierto.obtener("p1").dias_retraso == 7
+    abierto.cerrar()
+
+    releido = ArchivoPrestamos.abrir(str(tmp_path / "archivo"), mapear=False)
+    assert releido.obtener("p1").dias_retraso == 0
+    assert "p4" not in releido
+
+
+def test_abrir_archivo_vacio(tmp_path):
+    ArchivoPrestamos().guardar(str(tmp_path / "vacio"))
+    abierto = ArchivoPrestamos.abrir(str(tmp_path / "vacio"))
+    assert len(abierto) == 0
+    abierto.agregar(crear_prestamo("p1", "c1", "a@uni.edu", INICIO, dias_retraso=0))
+    assert abierto.obtener("p1").copia_id == "c1"
+
+
+def test_uso_memoria_separa_lo_mapeado(tmp_path):
+    archivo = ArchivoPrestamos()
+    llenar(archivo)
+    monticulo, mapeados = archivo.uso_memoria()
+    assert monticulo > 0 and mapeados == 0
+
+    archivo.guardar(str(tmp_path / "archivo"))
+    abierto = ArchivoPrestamos.abrir(str(tmp_path / "archivo"), mapear=True)
+    _, mapeados = abierto.uso_memoria()
+    # Seis columnas de 8 o 4 bytes por fila
+    assert mapeados == 3 * (4 * 8 + 2 * 4)
+    abierto.cerrar()
+
+
+def test_guardar_mientras_se_agregan_filas(tmp_path):
+    archivo = ArchivoPrestamos()
+    for numero in range(50000):
+        archivo.agregar(crear_prestamo(
+            f"p{numero}", f"c{numero % 100}", "a@uni.edu", INICIO, dias_retraso=0))
+    errores = []
+    terminado = threading.Event()
+
+    def agregar():
+        numero = 50000
+        try:
+            while not terminado.is_set():
+                archivo.agregar(crear_prestamo(
+                    f"p{numero}", "c1", "b@uni.edu", INICIO, dias_retraso=0))
+                numero += 1
+        except Exception as error:
+            errores.append(error)
+
+    hilo = threading.Thread(target=agregar)
+    hilo.start()
+    try:
+        for vuelta in range(20):
+            archivo.guardar(str(tmp_path / f"archivo{vuelta}"))
+    finally:
+        terminado.set()
+        hilo.join()
+
+    assert errores == []
+    assert {len(columna) for columna in archivo.columnas.values()} == {len(archivo)}
+    guardado = ArchivoPrestamos.abrir(str(tmp_path / "archivo19"), mapear=False)
+    assert guardado.obtener("p49999") == archivo.obtener("p49999")
+
+
+def test_agregar_fallido_no_deja_columnas_desalineadas(monkeypatch):
+    archivo = ArchivoPrestamos()
+    llenar(archivo)
+
+    objetivo = archivo.columnas["dias_retraso"]
+    original = Columna.append
+
+    def append(columna, valor):
+        if columna is objetivo:
+            raise BufferError("cannot resize an array that is exporting buffers")
+        original(columna, valor)
+
+    monkeypatch.setattr(Columna, "append", append)
+    with pytest.raises(BufferError):
+        archivo.agregar(crear_prestamo("p4", "c3", "a@uni.edu", INICIO, dias_retraso=0))
+    monkeypatch.undo()
+
+    assert "p4" not in archivo
+    assert {len(archivo.columnas[nombre]) for nombre in COLUMNAS} == {3}
+    archivo.agregar(crear_prestamo("p4", "c3", "a@uni.edu", INICIO, dias_retraso=0))
+    assert archivo.obtener("p4").copia_id == "c3"
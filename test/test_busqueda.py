@@ -0,0 +1,49 @@
+from src.busqueda import IndiceTrigramas, normalizar, trigramas
+
+
+def test_normalizar_quita_acentos_y_mayusculas():
+    assert normalizar("José Núñez") == "jose nunez"
+
+
+def test_trigramas():
+    assert trigramas("abcd") == {"abc", "bcd"}
+    assert trigramas("ab") == set()
+
+
+def test_buscar_parcial_sin_acentos():
+    indice = IndiceTrigramas()
+    indice.agregar("libro1", "Gabriel García Márquez")
+    indice.agregar("libro2", "Ian Somerville")
+    indice.agregar("libro3", "Isabel Allende")
+
+    assert indice.buscar("garcia") == ["libro1"]
+    assert indice.buscar("MÁRQUEZ") == ["libro1"]
+    assert indice.buscar("somer") == ["libro2"]
+    assert indice.buscar("inexistente") == []
+
+
+def test_buscar_consulta_corta():
+    indice = IndiceTrigramas()
+    indice.agregar("libro1", "Ian Somerville")
+    indice.agregar("libro2", "Isabel Allende")
+
+    assert indice.buscar("al") == ["libro2"]
+    assert indice.buscar("I") == ["libro1", "libro2"]
+
+
+def test_buscar_verifica_orden_de_trigramas():
+    indice = IndiceTrigramas()
+    indice.agregar("libro1", "abcxbcd")
+
+    assert indice.buscar("abcd") == []
+    assert indice.buscar("xbcd") == ["libro1"]
+
+
+def test_agregar_reemplaza_texto():
+    indice = IndiceTrigramas()
+    indice.agregar("libro1", "Ian Somerville")
+    indice.agregar("libro1", "Isabel Allende")
+
+    assert indice.buscar("somerville") == []
+    assert indice.buscar("allende") == ["libro1"]
+    assert len(indice) == 1
@@ -0,0 +1,31 @@
+from src.cache import CacheRespuestas
+
+
+def test_acierto_y_fallo_por_version():
+    cache = CacheRespuestas(capacidad=4)
+    assert cache.cuerpo("libro:1", "a.1", lambda: {"id": "1"}) == b'{"id":"1"}'
+    assert cache.cuerpo("libro:1", "a.1", lambda: {"id": "otro"}) == b'{"id":"1"}'
+    assert cache.cuerpo("libro:1", "a.2", lambda: {"id": "2"}) == b'{"id":"2"}'
+
+    estadisticas = cache.estadisticas()
+    assert (estadisticas["aciertos"], estadisticas["fallos"]) == (1, 2)
+    assert estadisticas["entradas"] == 1
+
+
+def test_expulsa_la_menos_usada():
+    cache = CacheRespuestas(capacidad=2)
+    cache.guardar("a", "1", b"a")
+    cache.guardar("b", "1", b"b")
+    cache.obtener("a", "1")
+    cache.guardar("c", "1", b"c")
+
+    assert cache.obtener("b", "1") is None
+    assert cache.obtener("a", "1") == b"a"
+    assert cache.estadisticas()["expulsiones"] == 1
+
+
+def test_capacidad_cero_desactiva():
+    cache = CacheRespuestas(capacidad=0)
+    cache.guardar("a", "1", b"a")
+    assert cache.obtener("a", "1") is None
+    assert cache.estadisticas()["entradas"] == 0
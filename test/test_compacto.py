@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+from src.compacto import CopiaCompacta, PrestamoCompacto, a_fecha, a_instante
+from src.models import Copia, EstadoCopia, Prestamo
+from src.repositorio import RepositorioMemoria
+
+
+def test_instante_conserva_microsegundos_y_zona():
+    sin_zona = datetime(2025, 3, 30, 2, 30, 15, 123456)
+    con_zona = datetime(2025, 3, 30, 2, 30, tzinfo=timezone(timedelta(hours=-5)))
+    assert isinstance(a_instante(sin_zona), int)
+    assert a_fecha(a_instante(sin_zona)) == sin_zona
+    assert a_fecha(a_instante(con_zona)) == con_zona
+    assert a_fecha(a_instante(None)) is None
+
+
+def test_prestamo_compacto_ida_y_vuelta():
+    prestamo = Prestamo(
+        id="p1", copia_id="c1", lector_email="a@uni.edu",
+        fecha_prestamo=datetime(2025, 1, 1, 10, 0),
+        fecha_devolucion_esperada=datetime(2025, 1, 31, 10, 0),
+        fecha_devolucion_real=datetime(2025, 2, 3, 9, 15), dias_retraso=2)
+    assert PrestamoCompacto.desde_modelo(prestamo).a_modelo() == prestamo
+
+
+def test_copia_compacta_interna_cadenas_repetidas():
+    a = CopiaCompacta.desde_modelo(Copia(
+        id="c1", libro_id="".join(["libro", "1"]), estado=EstadoCopia.DISPONIBLE,
+        edicion="9th"))
+    b = CopiaCompacta.desde_modelo(Copia(
+        id="c2", libro_id="".join(["libro", "1"]), estado=EstadoCopia.PRESTADA,
+        edicion="".join(["9", "th"])))
+    assert a.libro_id is b.libro_id
+    assert a.edicion is b.edicion
+    assert b.a_modelo().estado == EstadoCopia.PRESTADA
+
+
+def test_modificar_copia_leida_no_altera_el_almacen():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_copia(
+        Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+
+    copia = repositorio.obtener_copia("c1")
+    copia.estado = EstadoCopia.PRESTADA
+
+    assert repositorio.obtener_copia("c1").estado == EstadoCopia.DISPONIBLE
+    repositorio.actualizar_copia(copia)
+    assert repositorio.obtener_copia("c1").estado == EstadoCopia.PRESTADA
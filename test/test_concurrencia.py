@@ -0,0 +1,152 @@
+import random
+import sys
+import threading
+import pytest
+from fastapi import HTTPException
+from main import repositorio, inicializar_datos, crear_prestamo, actualizar_estado_copia
+from src.models import EstadoCopia, Copia, Lector
+from src.bloqueos import CandadosSegmentados
+from src.repositorio import RepositorioMemoria
+
+
+def setup_function():
+    repositorio.limpiar()
+    inicializar_datos()
+
+
+@pytest.fixture
+def cambio_de_hilo_frecuente():
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(intervalo)
+
+
+def test_candados_segmentados_ordenados_y_sin_repetir():
+    candados = CandadosSegmentados(segmentos=4)
+    indices = candados.indices(["a", "b", "c", "d", "e", "a"])
+    assert indices == sorted(set(indices))
+    with candados.bloquear(["a", "a"]):
+        pass
+
+
+def test_prestamos_concurrentes_respetan_invariantes(cambio_de_hilo_frecuente):
+    rondas, num_hilos = 40, 12
+    copias = [f"copia_stress{i}" for i in range(rondas)]
+    lectores = [f"lector{i}@universidad.edu" for i in range(num_hilos)]
+    for copia_id in copias:
+        repositorio.agregar_copia(Copia(
+            id=copia_id, libro_id="libro_se_somerville", estado=EstadoCopia.DISPONIBLE))
+    for email in lectores:
+        repositorio.agregar_lector(Lector(email=email, nombre=email))
+
+    barrera = threading.Barrier(num_hilos)
+    exitos = []
+
+    def trabajar(email):
+        azar = random.Random(email)
+        for ronda, copia_id in enumerate(copias):
+            barrera.wait()
+            try:
+                exitos.append(crear_prestamo(copia_id, email))
+            except HTTPException:
+                pass
+            if ronda % 2:
+                barrera.wait()
+                try:
+                    exitos.append(crear_prestamo(azar.choice(copias), email))
+                except HTTPException:
+                    pass
+
+    hilos = [threading.Thread(target=trabajar, args=(email,)) for email in lectores]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    activos = {email: repositorio.obtener_lector(email).prestamos_activos for email in lectores}
+    prestamos = [repositorio.obtener_prestamo(p) for ids in activos.values() for p in ids]
+    prestadas = [p.copia_id for p in prestamos]
+    assert len(prestadas) == len(set(prestadas))
+    assert all(len(ids) <= 3 for ids in activos.values())
+    for copia_id in copias:
+        estado = repositorio.obtener_copia(copia_id).estado
+        assert (estado == EstadoCopia.PRESTADA) == (copia_id in prestadas)
+    assert sorted(p.copia_id for p in exitos) == sorted(prestadas)
+
+
+def test_contadores_por_libro_con_copias_concurrentes(cambio_de_hilo_frecuente):
+    # Los hilos cambian copias del mismo libro, a veces la misma a la vez
+    num_hilos, num_copias, cambios = 16, 64, 300
+    estados = [EstadoCopia.DISPONIBLE, EstadoCopia.PRESTADA, EstadoCopia.CON_RETRASO]
+    copias = [f"copia_contador{i}" for i in range(num_copias)]
+    for copia_id in copias:
+        repositorio.agregar_copia(Copia(
+            id=copia_id, libro_id="libro_contado", estado=EstadoCopia.DISPONIBLE))
+
+    barrera = threading.Barrier(num_hilos)
+    errores = []
+
+    def trabajar(semilla):
+        azar = random.Random(semilla)
+        barrera.wait()
+        try:
+            for _ in range(cambios):
+                copia = repositorio.obtener_copia(azar.choice(copias))
+                copia.estado = azar.choice(estados)
+                repositorio.actualizar_copia(copia)
+        except Exception as error:
+            errores.append(error)
+
+    hilos = [threading.Thread(target=trabajar, args=(h,)) for h in range(num_hilos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == []
+    recuento = {}
+    for copia in repositorio.copias_de_libro("libro_contado"):
+        recuento[copia.estado] = recuento.get(copia.estado, 0) + 1
+    assert repositorio.disponibilidad(["libro_contado"])["libro_contado"] == recuento
+
+
+def _clave_en_otro_segmento(plantilla, ocupados):
+    for i in range(1000):
+        clave = plantilla.format(i)
+        if not set(repositorio.candados.indices([clave])) & ocupados:
+            return clave
+
+
+@pytest.mark.skipif(not isinstance(repositorio, RepositorioMemoria),
+                    reason="SQLite serializa las transacciones de escritura")
+def test_prestamos_de_copias_distintas_no_se_bloquean():
+    # El hash de las claves cambia entre ejecuciones: se eligen un lector y
+    # una copia cuyos segmentos no coincidan con el de copia1
+    ocupados = set(repositorio.candados.indices(["copia:copia1"]))
+    email = _clave_en_otro_segmento("lector:paralelo{}@universidad.edu", ocupados)
+    email = email.removeprefix("lector:")
+    repositorio.agregar_lector(Lector(email=email, nombre="Paralelo"))
+    ocupados |= set(repositorio.candados.indices([f"lector:{email}"]))
+    copia_libre = _clave_en_otro_segmento("copia:copia_libre{}", ocupados)
+    copia_libre = copia_libre.removeprefix("copia:")
+    repositorio.agregar_copia(Copia(
+        id=copia_libre, libro_id="libro_se_somerville", estado=EstadoCopia.DISPONIBLE))
+
+    terminado_libre = threading.Event()
+    terminado_ocupado = threading.Event()
+    hilo_libre = threading.Thread(target=lambda: (
+        crear_prestamo(copia_libre, email), terminado_libre.set()))
+    hilo_ocupado = threading.Thread(target=lambda: (
+        actualizar_estado_copia("copia1", EstadoCopia.EN_REPARACION),
+        terminado_ocupado.set()))
+
+    with repositorio.bloquear(copias=["copia1"]):
+        hilo_libre.start()
+        hilo_ocupado.start()
+        assert terminado_libre.wait(timeout=5)
+        assert not terminado_ocupado.wait(timeout=0.2)
+    assert terminado_ocupado.wait(timeout=5)
+    hilo_libre.join()
+    hilo_ocupado.join()
+    assert repositorio.obtener_copia("copia1").estado == EstadoCopia.EN_REPARACION
@@ -0,0 +1,133 @@
+from datetime import datetime
+from src.archivo import ArchivoPrestamos
+from src.estadisticas import (
+    TablaIncremental, TablaPrestamos, distribucion_retrasos, lectores_por_suspension,
+    prestamos_por_mes, retrasos_por_libro)
+from test.utilidades import crear_prestamo
+
+AHORA = datetime(2025, 6, 1)
+LIBROS = {"c1": "libro1", "c2": "libro1", "c3": "libro2"}
+
+
+def prestamos():
+    return [
+        crear_prestamo("p1", "c1", "a@uni.edu", datetime(2025, 1, 10), dias_retraso=0),
+        crear_prestamo("p2", "c2", "b@uni.edu", datetime(2025, 1, 20), dias_retraso=3),
+        crear_prestamo("p3", "c3", "a@uni.edu", datetime(2025, 2, 5), dias_retraso=10),
+        crear_prestamo("p4", "c3", "b@uni.edu", datetime(2025, 3, 1), dias_retraso=1),
+        # Activo y vencido respecto a AHORA
+        crear_prestamo("p5", "c1", "c@uni.edu", datetime(2025, 4, 1)),
+        # Activo y en plazo
+        crear_prestamo("p6", "c2", "a@uni.edu", datetime(2025, 5, 20)),
+    ]
+
+
+def crear_tabla(lista=None):
+    tabla = TablaPrestamos()
+    for prestamo in prestamos() if lista is None else lista:
+        tabla.agregar(prestamo, LIBROS[prestamo.copia_id])
+    return tabla
+
+
+def test_retrasos_por_libro_cuenta_devueltos_tarde_y_vencidos():
+    assert retrasos_por_libro(crear_tabla(), AHORA) == [
+        {"libro_id": "libro2", "prestamos": 2, "con_retraso": 2, "tasa_retraso": 1.0},
+        {"libro_id": "libro1", "prestamos": 4, "con_retraso": 2, "tasa_retraso": 0.5},
+    ]
+
+
+def test_distribucion_retrasos():
+    distribucion = distribucion_retrasos(crear_tabla())
+    assert distribucion["prestamos_devueltos"] == 4
+    assert distribucion["con_retraso"] == 3
+    assert distribucion["media_dias"] == 4.67
+    assert distribucion["mediana_dias"] == 3
+    assert distribucion["p90_dias"] == 10
+    assert distribucion["maximo_dias"] == 10
+    assert distribucion["histograma"] == {
+        "1": 1, "2-3": 1, "4-7": 0, "8-14": 1, "15-30": 0, "31+": 0}
+
+
+def test_distribucion_retrasos_sin_datos():
+    distribucion = distribucion_retrasos(TablaPrestamos())
+    assert distribucion["con_retraso"] == 0
+    assert distribucion["media_dias"] == 0.0
+    assert distribucion["mediana_dias"] == 0
+
+
+def test_prestamos_por_mes_y_filtro_de_fechas():
+    tabla = crear_tabla()
+    assert prestamos_por_mes(tabla) == [
+        {"mes": "2025-01", "prestamos": 2}, {"mes": "2025-02", "prestamos": 1},
+        {"mes": "2025-03", "prestamos": 1}, {"mes": "2025-04", "prestamos": 1},
+        {"mes": "2025-05", "prestamos": 1}]
+
+    filtrada = tabla.filtrar(desde=datetime(2025, 2, 1), hasta=datetime(2025, 4, 1))
+    assert prestamos_por_mes(filtrada) == [
+        {"mes": "2025-02", "prestamos": 1}, {"mes": "2025-03", "prestamos": 1}]
+    assert tabla.filtrar() is tabla
+
+
+def test_lectores_por_suspension():
+    assert lectores_por_suspension(crear_tabla(), 1, 2) == [
+        {"lector_email": "a@uni.edu", "dias_suspension": 20, "prestamos_con_retraso": 1}]
+    assert [fila["lector_email"] for fila in lectores_por_suspension(crear_tabla(), 5, 2)] == [
+        "a@uni.edu", "b@uni.edu"]
+
+
+def test_agregar_archivo_equivale_a_agregar_prestamos(tmp_path):
+    archivo = ArchivoPrestamos()
+    devueltos = [prestamo for prestamo in prestamos()
+                 if prestamo.fecha_devolucion_real is not None]
+    for prestamo in devueltos[:2]:
+        archivo.agregar(prestamo)
+    archivo.guardar(str(tmp_path / "archivo"))
+    archivo = ArchivoPrestamos.abrir(str(tmp_path / "archivo"))
+
+    # Las dos primeras filas están mapeadas y las siguientes en la cola
+    desde_archivo = TablaPrestamos()
+    assert desde_archivo.agregar_archivo(archivo, 0, LIBROS.__getitem__) == 2
+    for prestamo in devueltos[2:]:
+        archivo.agregar(prestamo)
+    assert desde_archivo.agregar_archivo(archivo, 2, LIBROS.__getitem__) == 4
+    esperada = crear_tabla(devueltos)
+    assert retrasos_por_libro(desde_archivo, AHORA) == retrasos_por_libro(esperada, AHORA)
+    assert list(desde_archivo.fecha_prestamo) == list(esperada.fecha_prestamo)
+    assert lectores_por_suspension(desde_archivo, 5, 2) == lectores_por_suspension(
+        esperada, 5, 2)
+    archivo.cerrar()
+
+
+def test_tabla_incremental_solo_lee_lo_nuevo():
+    devueltos = [prestamo for prestamo in prestamos()
+                 if prestamo.fecha_devolucion_real is not None]
+    historial = {"version": "a.0", "prestamos": devueltos[:2]}
+    lecturas = []
+
+    def ampliar(tabla, posicion):
+        version, desde = posicion or (historial["version"], 0)
+        if version != historial["version"]:
+            return None
+        lecturas.append(desde)
+        for prestamo in historial["prestamos"][desde:]:
+            tabla.agregar(prestamo, LIBROS[prestamo.copia_id])
+        return version, len(historial["prestamos"])
+
+    def agregar_activos(tabla, posicion):
+        for prestamo in prestamos()[4:]:
+            tabla.agregar(prestamo, LIBROS[prestamo.copia_id])
+
+    incremental = TablaIncremental(ampliar, agregar_activos)
+    primera = incremental.obtener("a.1")
+    assert incremental.obtener("a.1") is primera
+    assert len(primera) == 4
+
+    historial["prestamos"] = devueltos
+    segunda = incremental.obtener("a.2")
+    assert lecturas == [0, 2]
+    assert len(primera) == 4
+    assert retrasos_por_libro(segunda, AHORA) == retrasos_por_libro(crear_tabla(), AHORA)
+
+    historial["version"] = "b.0"
+    assert len(incremental.obtener("b.1")) == 6
+    assert lecturas == [0, 2, 0]
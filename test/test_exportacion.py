@@ -0,0 +1,25 @@
+import json
+from src.models import EstadoCopia, Copia
+from src import exportacion
+from src.exportacion import lineas_ndjson, quiere_ndjson
+
+
+def test_quiere_ndjson():
+    assert quiere_ndjson("ndjson", None)
+    assert not quiere_ndjson("json", "application/x-ndjson")
+    assert quiere_ndjson(None, "application/x-ndjson")
+    assert not quiere_ndjson(None, "application/json")
+    assert not quiere_ndjson(None, None)
+
+
+def test_lineas_ndjson_por_bloques(monkeypatch):
+    monkeypatch.setattr(exportacion, "LINEAS_POR_BLOQUE", 2)
+    copias = [Copia(id=f"c{i}", libro_id="libro1", estado=EstadoCopia.DISPONIBLE)
+              for i in range(5)]
+
+    bloques = list(lineas_ndjson(copias))
+
+    assert len(bloques) == 3
+    lineas = b"".join(bloques).decode().splitlines()
+    assert [json.loads(linea)["id"] for linea in lineas] == [
+        "c0", "c1", "c2", "c3", "c4"]
@@ -0,0 +1,44 @@
+import threading
+from src import identificadores
+from src.identificadores import GeneradorIds
+
+
+def test_ids_crecientes_y_unicos_en_un_hilo():
+    generador = GeneradorIds("prestamo_")
+    ids = [generador.nuevo() for _ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(i.startswith("prestamo_") and len(i) == len("prestamo_") + 28 for i in ids)
+
+
+def test_ids_unicos_entre_hilos():
+    generador = GeneradorIds()
+    resultados = []
+
+    def generar():
+        resultados.extend(generador.nuevo() for _ in range(2000))
+
+    hilos = [threading.Thread(target=generar) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert len(set(resultados)) == 16000
+
+
+def test_reloj_que_retrocede_no_rompe_el_orden(monkeypatch):
+    generador = GeneradorIds()
+    instantes = iter([5_000_000_000, 4_000_000_000, 4_000_000_000])
+    monkeypatch.setattr(identificadores.time, "time_ns", lambda: next(instantes))
+    ids = [generador.nuevo() for _ in range(3)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 3
+
+
+def test_secuencia_agotada_avanza_el_milisegundo(monkeypatch):
+    generador = GeneradorIds()
+    monkeypatch.setattr(identificadores, "MAX_SECUENCIA", 1)
+    monkeypatch.setattr(identificadores.time, "time_ns", lambda: 7_000_000_000)
+    ids = [generador.nuevo() for _ in range(3)]
+    assert ids == sorted(ids)
+    assert ids[2][:12] > ids[0][:12]
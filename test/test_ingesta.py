@@ -0,0 +1,139 @@
+from contextlib import contextmanager
+import pytest
+from src.models import Lector
+from src.ingesta import CuerpoInvalido, Ingesta, LectorRegistros, ModoIngesta, validar_por_lotes
+
+
+def leer_registros(cuerpo, ndjson):
+    lector = LectorRegistros(ndjson)
+    registros = lector.alimentar(cuerpo) + lector.terminar()
+    return registros, lector.errores
+
+
+def test_leer_registros_json():
+    registros, errores = leer_registros(b'[{"a": 1}, {"a": 2}]', ndjson=False)
+    assert registros == [(0, {"a": 1}), (1, {"a": 2})]
+    assert errores == []
+
+
+def test_leer_registros_json_invalido():
+    with pytest.raises(CuerpoInvalido):
+        leer_registros(b'{"a": 1}', ndjson=False)
+    with pytest.raises(CuerpoInvalido):
+        leer_registros(b'[{"a": ', ndjson=False)
+
+
+def test_leer_registros_ndjson_con_linea_invalida():
+    registros, errores = leer_registros(b'{"a": 1}\n{"a": \n\n{"a": 3}\n', ndjson=True)
+    assert registros == [(0, {"a": 1}), (2, {"a": 3})]
+    assert errores == [{"indice": 1, "detalle": "Línea JSON inválida"}]
+
+
+def test_validar_por_lotes_aisla_errores():
+    registros = [
+        (0, {"email": "a@uni.edu", "nombre": "A"}),
+        (1, {"email": "no-es-email", "nombre": "B"}),
+        (2, {"email": "c@uni.edu", "nombre": "C"}),
+    ]
+    validos, errores = validar_por_lotes(Lector, registros, tamanio_lote=2)
+    assert [indice for indice, _ in validos] == [0, 2]
+    assert [e["indice"] for e in errores] == [1]
+    assert errores[0]["detalle"][0]["loc"] == ["email"]
+
+
+def ingerir_lectores(registros, modo, existentes=()):
+    guardados = []
+    ingesta = Ingesta(
+        modelo=Lector, clave=lambda lector: lector.email,
+        existe=lambda email: email in existentes,
+        mensaje_duplicado="El lector ya existe",
+        guardar=guardados.append, modo=modo)
+    ingesta.procesar(registros)
+    return ingesta.terminar(), guardados
+
+
+def test_ingerir_todo_o_nada_no_guarda_si_hay_errores():
+    registros = [
+        (0, {"email": "a@uni.edu", "nombre": "A"}),
+        (1, {"email": "a@uni.edu", "nombre": "A bis"}),
+    ]
+    reporte, guardados = ingerir_lectores(registros, ModoIngesta.TODO_O_NADA)
+    assert reporte == {"insertados": 0, "errores": [
+        {"indice": 1, "detalle": "El lector ya existe"}]}
+    assert guardados == []
+
+
+def test_ingerir_mejor_esfuerzo_guarda_validos():
+    registros = [
+        (0, {"email": "a@uni.edu", "nombre": "A"}),
+        (1, {"email": "b@uni.edu", "nombre": "B"}),
+        (2, {"email": "c@uni.edu"}),
+    ]
+    reporte, guardados = ingerir_lectores(
+        registros, ModoIngesta.MEJOR_ESFUERZO, existentes={"b@uni.edu"})
+    assert reporte["insertados"] == 1
+    assert [e["indice"] for e in reporte["errores"]] == [1, 2]
+    assert [lector.email for lector in guardados] == ["a@uni.edu"]
+
+
+def test_lector_registros_por_fragmentos():
+    cuerpo = b'[{"nombre": "\xc3\xb1and\xc3\xba"}, 12345, [1, 2]]'
+    lector = LectorRegistros(ndjson=False)
+    registros = []
+    for inicio in range(0, len(cuerpo), 3):
+        registros.extend(lector.alimentar(cuerpo[inicio:inicio + 3]))
+    registros.extend(lector.terminar())
+    assert registros == [(0, {"nombre": "ñandú"}), (1, 12345), (2, [1, 2])]
+
+
+def test_lector_registros_ndjson_linea_partida():
+    lector = LectorRegistros(ndjson=True)
+    assert lector.alimentar(b'{"a": 1}\n{"a"') == [(0, {"a": 1})]
+    assert lector.alimentar(b': 2}\n{"a": 3}') == [(1, {"a": 2})]
+    assert lector.terminar() == [(2, {"a": 3})]
+
+
+def test_lector_registros_arreglo_incompleto():
+    lector = LectorRegistros(ndjson=False)
+    assert lector.alimentar(b'[{"a": 1}, {"a": 2') == [(0, {"a": 1})]
+    with pytest.raises(CuerpoInvalido):
+        lector.terminar()
+
+
+def test_lector_registros_contenido_tras_el_arreglo_conserva_elementos():
+    lector = LectorRegistros(ndjson=False)
+    with pytest.raises(CuerpoInvalido):
+        lector.alimentar(b'[{"a": 1}, {"a": 2}] sobra')
+    assert lector.pendientes() == [(0, {"a": 1}), (1, {"a": 2})]
+    assert lector.indice == 2
+
+
+def test_lector_registros_sin_coma_conserva_elementos():
+    lector = LectorRegistros(ndjson=False)
+    with pytest.raises(CuerpoInvalido):
+        lector.alimentar(b'[{"a": 1} {"a": 2}]')
+    assert lector.pendientes() == [(0, {"a": 1})]
+    assert lector.indice == 1
+
+
+def test_ingesta_todo_o_nada_comprueba_y_guarda_en_un_lote():
+    eventos = []
+
+    @contextmanager
+    def lote():
+        eventos.append("inicio")
+        yield
+        eventos.append("fin")
+
+    ingesta = Ingesta(
+        modelo=Lector, clave=lambda lector: lector.email,
+        existe=lambda email: eventos.append(f"existe {email}") and False,
+        mensaje_duplicado="El lector ya existe",
+        guardar=lambda lector: eventos.append(f"guardar {lector.email}"),
+        modo=ModoIngesta.TODO_O_NADA, lote=lote)
+    ingesta.procesar([(0, {"email": "a@uni.edu", "nombre": "A"})])
+    ingesta.procesar([(1, {"email": "b@uni.edu", "nombre": "B"})])
+    assert eventos == []
+    assert ingesta.terminar() == {"insertados": 2, "errores": []}
+    assert eventos == ["inicio", "existe a@uni.edu", "existe b@uni.edu",
+                       "guardar a@uni.edu", "guardar b@uni.edu", "fin"]
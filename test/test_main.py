@@ -1,17 +1,20 @@
 from fastapi.testclient import TestClient
 from datetime import datetime, timedelta
-from main import app, libros_db, copias_db, lectores_db, prestamos_db, bio_alert, inicializar_datos
+from main import (app, repositorio, despachador, agenda_vencimientos,
+                  cache_respuestas, perfilador, barredor, inicializar_datos)
 from src.models import EstadoCopia, Autor, Libro, Copia, Lector
+from src.notificaciones import SumideroMemoria
 
 client = TestClient(app)
 
 
 def setup_function():
-    libros_db.clear()
-    copias_db.clear()
-    lectores_db.clear()
-    prestamos_db.clear()
-    bio_alert.suscripciones.clear()
+    despachador.esperar()
+    repositorio.limpiar()
+    agenda_vencimientos.limpiar()
+    cache_respuestas.limpiar()
+    perfilador.limpiar()
+    despachador.sumidero = SumideroMemoria()
     inicializar_datos()
 
 
@@ -360,8 +363,9 @@ def test_devolver_prestamo_con_retraso():
         "/prestamos/?copia_id=copia2&lector_email=devolucion_retraso@universidad.edu")
     prestamo_id = prestamo_response.json()["id"]
 
-    prestamo = prestamos_db[prestamo_id]
+    prestamo = repositorio.obtener_prestamo(prestamo_id)
     prestamo.fecha_devolucion_esperada = datetime.now() - timedelta(days=5)
+    repositorio.actualizar_prestamo(prestamo)
 
     response = client.put(f"/prestamos/{prestamo_id}/devolver")
     assert response.status_code == 200
@@ -472,3 +476,561 @@ def test_listar_suscripciones_por_lector():
         "/bioalert/suscripciones?lector_email=filtrar_suscripciones@universidad.edu")
     assert response.status_code == 200
     assert len(response.json()) >= 1
+
+
+def test_buscar_libros_por_autor_ignora_acentos():
+    libro_data = {
+        "id": "libro_cien_anios",
+        "nombre": "Cien años de soledad",
+        "anio": 1967,
+        "autor": {
+            "nombre": "Gabriel García Márquez",
+            "fecha_nacimiento": "1927-03-06T00:00:00"
+        }
+    }
+    client.post("/libros/", json=libro_data)
+
+    response = client.get("/libros/autor/garcia marquez")
+    assert response.status_code == 200
+    assert [libro["id"] for libro in response.json()] == ["libro_cien_anios"]
+
+
+def test_listar_copias_paginado():
+    response = client.get("/copias/?limit=2")
+    assert response.status_code == 200
+    pagina = response.json()
+    assert [c["id"] for c in pagina["items"]] == ["copia1", "copia2"]
+    assert pagina["next_cursor"] is not None
+
+    response = client.get(f"/copias/?limit=2&cursor={pagina['next_cursor']}")
+    pagina = response.json()
+    assert [c["id"] for c in pagina["items"]] == ["copia3"]
+    assert pagina["next_cursor"] is None
+
+
+def test_listar_libros_cursor_invalido():
+    response = client.get("/libros/?cursor=invalido")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor inválido"
+
+
+def test_obtener_prestamos_lector_paginado():
+    lector_data = {
+        "email": "paginado@universidad.edu",
+        "nombre": "Test Paginado"
+    }
+    client.post("/lectores/", json=lector_data)
+    client.post(
+        "/prestamos/?copia_id=copia1&lector_email=paginado@universidad.edu")
+    client.post(
+        "/prestamos/?copia_id=copia2&lector_email=paginado@universidad.edu")
+
+    response = client.get("/prestamos/lector/paginado@universidad.edu?limit=1")
+    assert response.status_code == 200
+    pagina = response.json()
+    assert pagina["items"][0]["copia_id"] == "copia1"
+
+    response = client.get(
+        f"/prestamos/lector/paginado@universidad.edu?limit=1&cursor={pagina['next_cursor']}")
+    pagina = response.json()
+    assert pagina["items"][0]["copia_id"] == "copia2"
+    assert pagina["next_cursor"] is None
+
+
+def test_listar_copias_ndjson():
+    response = client.get("/copias/?format=ndjson")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lineas = response.text.splitlines()
+    assert len(lineas) == 3
+    assert '"id":"copia1"' in lineas[0]
+
+
+def test_listar_libros_ndjson_por_accept():
+    response = client.get(
+        "/libros/", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert len(response.text.splitlines()) == 1
+
+
+def test_crear_copias_bulk_todo_o_nada():
+    copias = [
+        {"id": "copia_bulk1", "libro_id": "libro_se_somerville", "estado": "disponible"},
+        {"id": "copia_bulk2", "libro_id": "libro_inexistente", "estado": "disponible"},
+    ]
+    response = client.post("/copias/bulk", json=copias)
+    assert response.status_code == 400
+    assert response.json()["detail"]["errores"] == [
+        {"indice": 1, "detalle": "Libro no encontrado"}]
+    assert client.get("/copias/copia_bulk1").status_code == 404
+
+
+def test_crear_copias_bulk_mejor_esfuerzo():
+    copias = [
+        {"id": "copia_bulk1", "libro_id": "libro_se_somerville", "estado": "disponible"},
+        {"id": "copia1", "libro_id": "libro_se_somerville", "estado": "disponible"},
+    ]
+    response = client.post("/copias/bulk?modo=mejor_esfuerzo", json=copias)
+    assert response.status_code == 201
+    assert response.json()["insertados"] == 1
+    assert response.json()["errores"] == [
+        {"indice": 1, "detalle": "La copia ya existe"}]
+    assert len(client.get("/copias/libro/libro_se_somerville").json()) == 4
+
+
+def test_crear_lectores_bulk_ndjson():
+    cuerpo = (
+        '{"email": "bulk1@universidad.edu", "nombre": "Bulk 1"}\n'
+        '{"email": "bulk2@universidad.edu", "nombre": "Bulk 2"}\n'
+    )
+    response = client.post(
+        "/lectores/bulk", content=cuerpo,
+        headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 201
+    assert response.json() == {"insertados": 2, "errores": []}
+    assert client.get("/lectores/bulk2@universidad.edu").status_code == 200
+
+
+def test_crear_lectores_bulk_ndjson_por_fragmentos():
+    lineas = "".join(f'{{"email": "frag{i}@universidad.edu", "nombre": "F {i}"}}\n'
+                     for i in range(2500)).encode()
+    fragmentos = (lineas[inicio:inicio + 777] for inicio in range(0, len(lineas), 777))
+    response = client.post(
+        "/lectores/bulk", content=fragmentos,
+        headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 201
+    assert response.json() == {"insertados": 2500, "errores": []}
+    assert client.get("/lectores/frag2499@universidad.edu").status_code == 200
+
+
+def test_crear_lectores_bulk_arreglo_truncado():
+    cuerpo = '[{"email": "t1@universidad.edu", "nombre": "T1"}, {"email": "t2@'
+    response = client.post("/lectores/bulk", content=cuerpo,
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert client.get("/lectores/t1@universidad.edu").status_code == 404
+
+    response = client.post("/lectores/bulk?modo=mejor_esfuerzo", content=cuerpo,
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 201
+    assert response.json() == {"insertados": 1, "errores": [
+        {"indice": 1, "detalle": "Cuerpo JSON inválido"}]}
+
+
+def test_crear_lectores_bulk_contenido_tras_el_arreglo():
+    cuerpo = ('[{"email": "c1@universidad.edu", "nombre": "C1"}, '
+              '{"email": "c2@universidad.edu", "nombre": "C2"}] sobra')
+    response = client.post("/lectores/bulk", content=cuerpo,
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert client.get("/lectores/c1@universidad.edu").status_code == 404
+
+    response = client.post("/lectores/bulk?modo=mejor_esfuerzo", content=cuerpo,
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 201
+    assert response.json() == {"insertados": 2, "errores": [
+        {"indice": 2, "detalle": "Cuerpo JSON inválido"}]}
+    assert client.get("/lectores/c2@universidad.edu").status_code == 200
+
+
+def test_crear_lectores_bulk_sin_coma():
+    cuerpo = ('[{"email": "s1@universidad.edu", "nombre": "S1"} '
+              '{"email": "s2@universidad.edu", "nombre": "S2"}]')
+    response = client.post("/lectores/bulk", content=cuerpo,
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+    response = client.post("/lectores/bulk?modo=mejor_esfuerzo", content=cuerpo,
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 201
+    assert response.json() == {"insertados": 1, "errores": [
+        {"indice": 1, "detalle": "Cuerpo JSON inválido"}]}
+    assert client.get("/lectores/s1@universidad.edu").status_code == 200
+    assert client.get("/lectores/s2@universidad.edu").status_code == 404
+
+
+def test_crear_libros_bulk_cuerpo_invalido():
+    response = client.post("/libros/bulk", content="{}",
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Se esperaba un arreglo JSON"
+
+
+def test_devolver_prestamo_ya_devuelto():
+    lector_data = {
+        "email": "doble_devolucion@universidad.edu",
+        "nombre": "Test Doble Devolucion"
+    }
+    client.post("/lectores/", json=lector_data)
+    prestamo_response = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=doble_devolucion@universidad.edu")
+    prestamo_id = prestamo_response.json()["id"]
+
+    client.put(f"/prestamos/{prestamo_id}/devolver")
+    response = client.put(f"/prestamos/{prestamo_id}/devolver")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "El préstamo ya fue devuelto"
+
+
+def test_prestamo_tras_devolucion_inmediata_no_colisiona():
+    lector_data = {
+        "email": "represtamo@universidad.edu",
+        "nombre": "Test Represtamo"
+    }
+    client.post("/lectores/", json=lector_data)
+    primero = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=represtamo@universidad.edu").json()
+    client.put(f"/prestamos/{primero['id']}/devolver")
+    segundo = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=represtamo@universidad.edu").json()
+
+    assert primero["id"] != segundo["id"]
+    response = client.get("/prestamos/lector/represtamo@universidad.edu")
+    assert [p["id"] for p in response.json()] == [primero["id"], segundo["id"]]
+
+
+def test_devolver_prestamo_notifica_suscriptores_en_segundo_plano():
+    for email in ("devuelve@universidad.edu", "espera@universidad.edu"):
+        client.post("/lectores/", json={"email": email, "nombre": email})
+    prestamo_id = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=devuelve@universidad.edu").json()["id"]
+    client.post(
+        "/bioalert/suscribir?lector_email=espera@universidad.edu&libro_id=libro_se_somerville")
+
+    response = client.put(f"/prestamos/{prestamo_id}/devolver")
+    assert response.status_code == 200
+    assert "notificaciones_enviadas" not in response.json()
+
+    despachador.esperar()
+    enviadas = despachador.sumidero.enviadas
+    assert [n["email"] for n in enviadas] == ["espera@universidad.edu"]
+    assert client.get("/bioalert/suscripciones").json() == []
+
+
+def test_listar_prestamos_vencidos_marca_copia_con_retraso():
+    lector_data = {
+        "email": "vencido@universidad.edu",
+        "nombre": "Test Vencido"
+    }
+    client.post("/lectores/", json=lector_data)
+    vencido_id = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=vencido@universidad.edu").json()["id"]
+    client.post("/prestamos/?copia_id=copia2&lector_email=vencido@universidad.edu")
+
+    prestamo = repositorio.obtener_prestamo(vencido_id)
+    prestamo.fecha_devolucion_esperada = datetime.now() - timedelta(days=1)
+    repositorio.actualizar_prestamo(prestamo)
+    agenda_vencimientos.programar(vencido_id, prestamo.fecha_devolucion_esperada)
+
+    response = client.get("/prestamos/vencidos")
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [vencido_id]
+    assert client.get("/copias/copia1").json()["estado"] == "con_retraso"
+    assert client.get("/copias/copia2").json()["estado"] == "prestada"
+
+    client.put(f"/prestamos/{vencido_id}/devolver")
+    assert client.get("/prestamos/vencidos").json() == []
+    assert client.get("/copias/copia1").json()["estado"] == "disponible"
+
+
+def test_listar_prestamos_vencidos_omite_devueltos_en_otro_worker():
+    client.post("/lectores/", json={"email": "otro@universidad.edu", "nombre": "Otro"})
+    vencido_id = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=otro@universidad.edu").json()["id"]
+    prestamo = repositorio.obtener_prestamo(vencido_id)
+    prestamo.fecha_devolucion_esperada = datetime.now() - timedelta(days=1)
+    repositorio.actualizar_prestamo(prestamo)
+    agenda_vencimientos.programar(vencido_id, prestamo.fecha_devolucion_esperada)
+    assert [p["id"] for p in client.get("/prestamos/vencidos").json()] == [vencido_id]
+
+    # Otro worker lo devuelve: su agenda se cancela, esta no
+    prestamo = repositorio.obtener_prestamo(vencido_id)
+    prestamo.fecha_devolucion_real = datetime.now()
+    repositorio.actualizar_prestamo(prestamo)
+
+    assert client.get("/prestamos/vencidos").json() == []
+    assert agenda_vencimientos.vencidos() == []
+
+    # El barredor también descarta los devueltos al extraerlos
+    agenda_vencimientos.programar(vencido_id, prestamo.fecha_devolucion_esperada)
+    barredor.barrer()
+    assert agenda_vencimientos.vencidos() == []
+
+
+def test_disponibilidad_libro_sigue_prestamos_y_devoluciones():
+    libro_id = "libro_se_somerville"
+    response = client.get(f"/libros/{libro_id}/disponibilidad")
+    assert response.status_code == 200
+    assert response.json()["disponible"] is True
+    assert response.json()["total_copias"] == 3
+    assert response.json()["copias"]["disponible"] == 3
+
+    client.post("/lectores/", json={"email": "disp@universidad.edu", "nombre": "Disp"})
+    prestamo = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=disp@universidad.edu").json()
+    client.put("/copias/copia2/estado?estado=en_reparacion")
+    copias = client.get(f"/libros/{libro_id}/disponibilidad").json()["copias"]
+    assert copias["disponible"] == 1
+    assert copias["prestada"] == 1
+    assert copias["en_reparacion"] == 1
+
+    client.put(f"/prestamos/{prestamo['id']}/devolver")
+    copias = client.get(f"/libros/{libro_id}/disponibilidad").json()["copias"]
+    assert copias["disponible"] == 2
+    assert copias["prestada"] == 0
+
+
+def test_disponibilidad_libro_no_encontrado():
+    response = client.get("/libros/inexistente/disponibilidad")
+    assert response.status_code == 404
+
+
+def test_disponibilidad_varios_libros():
+    response = client.get(
+        "/libros/disponibilidad?ids=libro_se_somerville&ids=inexistente")
+    assert response.status_code == 200
+    assert [libro["libro_id"] for libro in response.json()["libros"]] == [
+        "libro_se_somerville"]
+    assert response.json()["libros"][0]["copias"]["disponible"] == 3
+    assert response.json()["no_encontrados"] == ["inexistente"]
+
+
+def test_listar_libros_etag_y_304():
+    response = client.get("/libros/")
+    etag = response.headers["etag"]
+
+    no_modificado = client.get("/libros/", headers={"If-None-Match": etag})
+    assert no_modificado.status_code == 304
+    assert no_modificado.content == b""
+    assert no_modificado.headers["etag"] == etag
+
+    client.post("/libros/", json={
+        "id": "libro_etag", "nombre": "Nuevo", "anio": 2020,
+        "autor": {"nombre": "Autor", "fecha_nacimiento": "1970-01-01T00:00:00"}})
+    modificado = client.get("/libros/", headers={"If-None-Match": etag})
+    assert modificado.status_code == 200
+    assert modificado.headers["etag"] != etag
+    assert len(modificado.json()) == 2
+
+
+def test_copias_libro_etag_cambia_al_prestar():
+    url = "/copias/libro/libro_se_somerville"
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    client.put("/copias/copia1/estado?estado=en_reparacion")
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["estado"] == "en_reparacion"
+
+
+def test_lector_etag():
+    client.post("/lectores/", json={"email": "etag@universidad.edu", "nombre": "Etag"})
+    url = "/lectores/etag@universidad.edu"
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/lectores/otro@universidad.edu",
+                      headers={"If-None-Match": etag}).status_code == 404
+
+    prestamo = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=etag@universidad.edu").json()
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["prestamos_activos"] == [prestamo["id"]]
+
+
+def test_etag_de_entidad_inexistente_responde_404():
+    epoca = client.get("/libros/").headers["etag"].strip('"').split(".")[0]
+    assert client.get("/lectores/nobody@x.edu",
+                      headers={"If-None-Match": f'"{epoca}.0"'}).status_code == 404
+    assert client.get("/lectores/nobody@x.edu",
+                      headers={"If-None-Match": "*"}).status_code == 404
+    assert client.get("/copias/libro/nolibro",
+                      headers={"If-None-Match": "*"}).status_code == 404
+    assert client.get("/copias/libro/nolibro",
+                      headers={"If-None-Match": f'"{epoca}.0"'}).status_code == 404
+
+
+def test_cache_respuestas_sirve_aciertos_e_invalida_con_escrituras():
+    primera = client.get("/copias/copia1")
+    segunda = client.get("/copias/copia1")
+    assert segunda.content == primera.content
+    estadisticas = client.get("/admin/cache").json()
+    assert estadisticas["aciertos"] == 1
+    assert estadisticas["fallos"] == 1
+
+    client.put("/copias/copia1/estado?estado=en_reparacion")
+    assert client.get("/copias/copia1").json()["estado"] == "en_reparacion"
+    copias = client.get("/copias/libro/libro_se_somerville").json()
+    assert copias[0]["estado"] == "en_reparacion"
+
+
+def test_cache_respuestas_no_guarda_404():
+    assert client.get("/libros/inexistente").status_code == 404
+    assert client.get("/libros/inexistente").status_code == 404
+    assert client.get("/admin/cache").json()["entradas"] == 0
+
+
+def test_cache_respuestas_codifica_igual_que_fastapi():
+    libro = repositorio.obtener_libro("libro_se_somerville")
+    response = client.get("/libros/libro_se_somerville")
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == libro.model_dump(mode="json")
+
+
+def test_todas_las_rutas_declaran_modelo_de_respuesta():
+    from fastapi.routing import APIRoute
+    sin_modelo = [ruta.path for ruta in app.routes
+                  if isinstance(ruta, APIRoute) and ruta.response_model is None]
+    assert sin_modelo == []
+    assert client.get("/openapi.json").status_code == 200
+
+
+def test_devolver_prestamo_respuesta_tipada():
+    client.post("/lectores/", json={"email": "tipado@universidad.edu", "nombre": "Tipado"})
+    prestamo = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=tipado@universidad.edu").json()
+    response = client.put(f"/prestamos/{prestamo['id']}/devolver")
+    assert set(response.json()) == {"prestamo", "multa_dias"}
+    assert response.json()["prestamo"]["fecha_devolucion_real"] is not None
+
+
+def test_estadisticas_de_prestamos():
+    client.post("/lectores/", json={"email": "stats@universidad.edu", "nombre": "Stats"})
+    prestamo = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=stats@universidad.edu").json()
+    client.post("/prestamos/?copia_id=copia2&lector_email=stats@universidad.edu")
+    # Retraso simulado: la fecha esperada ya pasó hace tres días
+    vencido = repositorio.obtener_prestamo(prestamo["id"])
+    vencido.fecha_devolucion_esperada = datetime.now() - timedelta(days=3, hours=1)
+    repositorio.actualizar_prestamo(vencido)
+    client.put(f"/prestamos/{prestamo['id']}/devolver")
+
+    por_libro = client.get("/estadisticas/retrasos-por-libro").json()
+    assert por_libro == [{"libro_id": "libro_se_somerville", "prestamos": 2,
+                          "con_retraso": 1, "tasa_retraso": 0.5}]
+
+    distribucion = client.get("/estadisticas/distribucion-retrasos").json()
+    assert distribucion["con_retraso"] == 1
+    assert distribucion["maximo_dias"] == 3
+
+    mes = datetime.now().strftime("%Y-%m")
+    assert client.get("/estadisticas/prestamos-por-mes").json() == [
+        {"mes": mes, "prestamos": 2}]
+
+    assert client.get("/estadisticas/lectores-suspendidos?limite=1").json() == [
+        {"lector_email": "stats@universidad.edu", "dias_suspension": 6,
+         "prestamos_con_retraso": 1}]
+
+
+def test_estadisticas_filtro_de_fechas():
+    client.post("/lectores/", json={"email": "stats@universidad.edu", "nombre": "Stats"})
+    client.post("/prestamos/?copia_id=copia1&lector_email=stats@universidad.edu")
+    futuro = (datetime.now() + timedelta(days=1)).isoformat()
+    assert client.get(f"/estadisticas/prestamos-por-mes?desde={futuro}").json() == []
+    assert len(client.get(f"/estadisticas/prestamos-por-mes?hasta={futuro}").json()) == 1
+
+    pasado = (datetime.now() - timedelta(days=1)).isoformat()
+    response = client.get(f"/estadisticas/retrasos-por-libro?desde={futuro}&hasta={pasado}")
+    assert response.status_code == 400
+
+
+def valor_metrica(texto, serie):
+    for linea in texto.splitlines():
+        if linea.startswith(serie + " "):
+            return float(linea.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metricas_por_plantilla_de_ruta_y_de_dominio():
+    serie_libro = ('biblioteca_peticiones_total{metodo="GET",ruta="/libros/{libro_id}",'
+                   'estado="404"}')
+    antes = client.get("/metrics").text
+    client.get("/libros/no_existe_1")
+    client.get("/libros/no_existe_2")
+
+    client.post("/lectores/", json={"email": "metricas@universidad.edu", "nombre": "M"})
+    prestamo = client.post(
+        "/prestamos/?copia_id=copia1&lector_email=metricas@universidad.edu").json()
+    vencido = repositorio.obtener_prestamo(prestamo["id"])
+    vencido.fecha_devolucion_esperada = datetime.now() - timedelta(days=2, hours=1)
+    repositorio.actualizar_prestamo(vencido)
+    client.put(f"/prestamos/{prestamo['id']}/devolver")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    despues = response.text
+    assert "no_existe" not in despues
+    assert valor_metrica(despues, serie_libro) - valor_metrica(antes, serie_libro) == 2
+    for serie, incremento in (("biblioteca_prestamos_creados_total", 1),
+                              ("biblioteca_devoluciones_total", 1),
+                              ("biblioteca_devoluciones_con_retraso_total", 1),
+                              ("biblioteca_dias_suspension_total", 4)):
+        assert valor_metrica(despues, serie) - valor_metrica(antes, serie) == incremento
+    assert ('biblioteca_duracion_peticion_segundos_count{metodo="PUT",'
+            'ruta="/prestamos/{prestamo_id}/devolver"}') in despues
+    assert 'biblioteca_peticiones_en_curso{metodo="GET",ruta="/metrics"} 1' in despues
+
+
+def test_perfil_por_cabecera_en_pstats_y_pilas_colapsadas():
+    client.post("/lectores/", json={"email": "perfil@universidad.edu", "nombre": "Perfil"})
+    # La cabecera está desactivada hasta que se configura
+    client.get("/libros/libro_se_somerville", headers={"X-Perfilar": "1"})
+    assert client.get("/admin/perfiles").json() == []
+
+    client.put("/admin/perfiles/muestreo?fraccion=0&cabecera=X-Perfilar")
+    try:
+        client.post("/prestamos/?copia_id=copia1&lector_email=perfil@universidad.edu",
+                    headers={"X-Perfilar": "1"})
+        client.get("/no_existe", headers={"X-Perfilar": "1"})
+    finally:
+        client.put("/admin/perfiles/muestreo?fraccion=0&cabecera=")
+
+    perfiles = client.get("/admin/perfiles").json()
+    assert len(perfiles) == 1
+    assert perfiles[0]["ruta"] == "/prestamos/"
+    assert perfiles[0]["estado"] == 201
+    assert perfiles[0]["motivo"] == "cabecera"
+
+    informe = client.get(f"/admin/perfiles/{perfiles[0]['id']}?orden=cumulative&limite=5")
+    assert informe.headers["content-type"].startswith("text/plain")
+    assert "crear_prestamo" in informe.text
+    colapsado = client.get(f"/admin/perfiles/{perfiles[0]['id']}?formato=colapsado").text
+    assert all(linea.startswith("crear_prestamo ") or "<method 'disable'" in linea
+               for linea in colapsado.splitlines())
+    assert client.get("/admin/perfiles/999").status_code == 404
+
+
+def test_perfil_por_muestreo_configurable_en_caliente():
+    response = client.put("/admin/perfiles/muestreo?fraccion=1")
+    assert response.json()["fraccion"] == 1.0
+    try:
+        client.get("/libros/libro_se_somerville")
+    finally:
+        client.put("/admin/perfiles/muestreo?fraccion=0")
+    perfiles = client.get("/admin/perfiles").json()
+    assert [(p["ruta"], p["motivo"]) for p in perfiles][-1] == ("/libros/{libro_id}", "muestreo")
+    assert client.put("/admin/perfiles/muestreo?fraccion=2").status_code == 422
+
+
+def test_memoria_por_almacen_y_diferencias_de_tracemalloc():
+    antes = {almacen["nombre"]: almacen["objetos"]
+             for almacen in client.get("/admin/memoria").json()["almacenes"]}
+    client.post("/libros/", json={
+        "id": "libro_memoria", "nombre": "Memoria", "anio": 2020,
+        "autor": {"nombre": "Autor Memoria", "fecha_nacimiento": "1970-01-01T00:00:00"}})
+    informe = client.get("/admin/memoria").json()
+    despues = {almacen["nombre"]: almacen["objetos"] for almacen in informe["almacenes"]}
+    assert despues["libros"] == antes["libros"] + 1
+    assert informe["tracemalloc"] is None
+    assert informe["total_bytes_aproximados"] >= 0
+
+    try:
+        assert client.put("/admin/memoria/tracemalloc?activo=true").json()["activo"]
+        estado = client.get("/admin/memoria?tracemalloc=true&diferencias=3").json()["tracemalloc"]
+        assert estado["activo"] and estado["memoria_trazada"] > 0
+        assert 0 < len(estado["diferencias"]) <= 3
+    finally:
+        assert client.put("/admin/memoria/tracemalloc?activo=false").json()["activo"] is False
@@ -0,0 +1,55 @@
+import sys
+import tracemalloc
+from src.memoria import ComparadorTracemalloc, estimar_bytes, estimar_indices, tamanio_profundo
+
+
+class ConSlots:
+    __slots__ = ("valor",)
+
+    def __init__(self, valor):
+        self.valor = valor
+
+
+def test_tamanio_profundo_sigue_contenedores_y_slots():
+    texto = "x" * 1000
+    assert tamanio_profundo([texto]) == sys.getsizeof([texto]) + sys.getsizeof(texto)
+    assert tamanio_profundo(ConSlots(texto)) == sys.getsizeof(ConSlots(texto)) + sys.getsizeof(texto)
+    # Un objeto repetido se cuenta una sola vez
+    assert tamanio_profundo([texto, texto]) == sys.getsizeof([texto, texto]) + sys.getsizeof(texto)
+
+
+def test_estimar_bytes_escala_la_muestra():
+    filas = {f"clave{i:05d}": [i] * 10 for i in range(10000)}
+    exacto = sys.getsizeof(filas) + sum(
+        tamanio_profundo(clave) + tamanio_profundo(valor) for clave, valor in filas.items())
+    assert abs(estimar_bytes(filas, muestra=100) - exacto) < exacto * 0.05
+    assert estimar_bytes(filas, profundo=False) < exacto
+    assert estimar_bytes({}) == sys.getsizeof({})
+
+
+def test_estimar_indices_cuenta_una_vez_los_elementos():
+    principal = {f"libro{i}": {"lector": "x" * 100} for i in range(100)}
+    secundario = {"lector": dict.fromkeys(principal)}
+    assert estimar_indices(principal, secundario) == (
+        estimar_bytes(principal) + estimar_bytes(secundario, profundo=False))
+    assert estimar_indices(principal, secundario) < (
+        estimar_bytes(principal) + estimar_bytes(secundario))
+
+
+def test_comparador_diferencia_entre_llamadas():
+    comparador = ComparadorTracemalloc()
+    try:
+        primera = comparador.comparar()
+        assert primera["activo"] and primera["diferencias"] is None
+
+        retenido = [bytearray(1000) for _ in range(1000)]
+        diferencias = comparador.comparar(limite=5)["diferencias"]
+        assert len(diferencias) <= 5
+        mayor = diferencias[0]
+        assert mayor["archivo"] == __file__
+        assert mayor["diferencia_bytes"] >= 1000 * 1000
+        assert mayor["diferencia_objetos"] >= 1000
+        del retenido
+    finally:
+        assert comparador.detener()["activo"] is False
+    assert not tracemalloc.is_tracing()
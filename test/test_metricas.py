@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from src.metricas import (
+    Contador, Histograma, Medidor, MetricasHttp, MiddlewareMetricas, RegistroMetricas)
+
+
+def test_contador_con_etiquetas_y_escapado():
+    registro = RegistroMetricas()
+    contador = registro.registrar(Contador("eventos_total", "Eventos", ("tipo",)))
+    contador.incrementar("a")
+    contador.incrementar("a", valor=2)
+    contador.incrementar('con "comillas"')
+    assert registro.exponer() == (
+        "# HELP eventos_total Eventos\n"
+        "# TYPE eventos_total counter\n"
+        'eventos_total{tipo="a"} 3\n'
+        'eventos_total{tipo="con \\"comillas\\""} 1\n')
+
+
+def test_histograma_acumula_cubetas():
+    histograma = Histograma("latencia_segundos", "Latencia", cubetas=(0.1, 1.0))
+    histograma.observar(0.05)
+    histograma.observar(0.1)
+    histograma.observar(3.0)
+    assert histograma.muestras() == [
+        'latencia_segundos_bucket{le="0.1"} 2',
+        'latencia_segundos_bucket{le="1.0"} 2',
+        'latencia_segundos_bucket{le="+Inf"} 3',
+        "latencia_segundos_sum 3.15",
+        "latencia_segundos_count 3",
+    ]
+
+
+def test_metrica_con_funcion_y_nombre_duplicado():
+    registro = RegistroMetricas()
+    registro.registrar(Medidor("cola", "Tamaño de la cola", funcion=lambda: {(): 7}))
+    assert registro.exponer().endswith("cola 7\n")
+    with pytest.raises(ValueError):
+        registro.registrar(Contador("cola", "Otra"))
+
+
+def test_middleware_cuenta_en_curso_y_excepciones():
+    registro = RegistroMetricas()
+    metricas = MetricasHttp(registro, "prueba")
+
+    class Ruta:
+        path = "/libros/{libro_id}"
+
+    async def app(scope, receive, send):
+        scope["route"] = Ruta()
+        assert metricas._contar_en_curso() == {("GET", "/libros/{libro_id}"): 1}
+        raise RuntimeError("fallo")
+
+    middleware = MiddlewareMetricas(app, metricas)
+    with pytest.raises(RuntimeError):
+        asyncio.run(middleware({"type": "http", "method": "GET"}, None, None))
+    assert metricas.en_curso == {}
+    assert metricas.peticiones.valores == {("GET", "/libros/{libro_id}", "500"): 1}
@@ -1,3 +1,6 @@
+import random
+import sys
+import threading
 from datetime import datetime
 from src.models import EstadoCopia, Autor, Libro, Copia, Lector, Prestamo, Suscripcion, BioAlert
 
@@ -111,7 +114,7 @@ def test_bioalert_singleton():
 
 def test_bioalert_suscribir():
     bio_alert = BioAlert()
-    bio_alert.suscripciones.clear()
+    bio_alert.limpiar()
 
     suscripcion = bio_alert.suscribir("test@universidad.edu", "libro1")
 
@@ -122,7 +125,7 @@ def test_bioalert_suscribir():
 
 def test_bioalert_notificar_disponibilidad():
     bio_alert = BioAlert()
-    bio_alert.suscripciones.clear()
+    bio_alert.limpiar()
 
     bio_alert.suscribir("test1@universidad.edu", "libro1")
     bio_alert.suscribir("test2@universidad.edu", "libro1")
@@ -137,7 +140,7 @@ def test_bioalert_notificar_disponibilidad():
 
 def test_bioalert_obtener_suscripciones():
     bio_alert = BioAlert()
-    bio_alert.suscripciones.clear()
+    bio_alert.limpiar()
 
     bio_alert.suscribir("test1@universidad.edu", "libro1")
     bio_alert.suscribir("test2@universidad.edu", "libro2")
@@ -152,9 +155,96 @@ def test_bioalert_obtener_suscripciones():
 
 def test_bioalert_obtener_suscripciones_sin_resultados():
     bio_alert = BioAlert()
-    bio_alert.suscripciones.clear()
+    bio_alert.limpiar()
 
     bio_alert.suscribir("test1@universidad.edu", "libro1")
 
     filtradas = bio_alert.obtener_suscripciones("inexistente@universidad.edu")
     assert len(filtradas) == 0
+
+
+def test_bioalert_suscribir_duplicado():
+    bio_alert = BioAlert()
+    bio_alert.limpiar()
+
+    primera = bio_alert.suscribir("test1@universidad.edu", "libro1")
+    segunda = bio_alert.suscribir("test1@universidad.edu", "libro1")
+
+    assert primera is segunda
+    assert len(bio_alert.suscripciones) == 1
+    assert len(bio_alert.notificar_disponibilidad("libro1")) == 1
+
+
+def test_bioalert_notificar_actualiza_suscripciones_lector():
+    bio_alert = BioAlert()
+    bio_alert.limpiar()
+
+    bio_alert.suscribir("test1@universidad.edu", "libro1")
+    bio_alert.suscribir("test1@universidad.edu", "libro2")
+
+    bio_alert.notificar_disponibilidad("libro1")
+
+    restantes = bio_alert.obtener_suscripciones("test1@universidad.edu")
+    assert [s.libro_id for s in restantes] == ["libro2"]
+    assert bio_alert.notificar_disponibilidad("libro1") == []
+
+
+def test_bioalert_indices_coinciden_con_notificaciones_concurrentes():
+    bio_alert = BioAlert()
+    bio_alert.limpiar()
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    lectores = [f"lector{i}@universidad.edu" for i in range(50)]
+    libros = ["libro1", "libro2", "libro3"]
+    errores = []
+    terminado = threading.Event()
+
+    def suscribir(semilla):
+        azar = random.Random(semilla)
+        try:
+            for _ in range(15000):
+                bio_alert.suscribir(azar.choice(lectores), azar.choice(libros))
+        except Exception as error:
+            errores.append(error)
+
+    def notificar():
+        try:
+            while not terminado.is_set():
+                for libro_id in libros:
+                    bio_alert.notificar_disponibilidad(libro_id)
+        except Exception as error:
+            errores.append(error)
+
+    try:
+        notificador = threading.Thread(target=notificar)
+        notificador.start()
+        hilos = [threading.Thread(target=suscribir, args=(semilla,)) for semilla in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        terminado.set()
+        notificador.join()
+    finally:
+        sys.setswitchinterval(intervalo)
+
+    assert errores == []
+    por_libro = {(s.lector_email, s.libro_id) for s in bio_alert.obtener_suscripciones()}
+    por_lector = {(s.lector_email, s.libro_id) for email in lectores
+                  for s in bio_alert.obtener_suscripciones(email)}
+    assert por_libro == por_lector
+    bio_alert.limpiar()
+
+
+def test_bioalert_uso_memoria_estima_con_el_candado():
+    bio_alert = BioAlert()
+    bio_alert.limpiar()
+    bio_alert.suscribir("test1@universidad.edu", "libro1")
+    bio_alert.suscribir("test2@universidad.edu", "libro1")
+
+    def estimar(por_libro, por_lector):
+        assert bio_alert._candado._is_owned()
+        return len(por_libro) + len(por_lector)
+
+    assert bio_alert.uso_memoria(estimar) == (2, 3)
+    bio_alert.limpiar()
@@ -0,0 +1,122 @@
+import json
+import threading
+import pytest
+from src.models import BioAlert
+from src.notificaciones import (
+    DespachadorNotificaciones, SumideroArchivo, SumideroMemoria, SumideroRegistro,
+    crear_sumidero)
+
+
+@pytest.fixture
+def bio_alert():
+    bio_alert = BioAlert()
+    bio_alert.limpiar()
+    yield bio_alert
+    bio_alert.limpiar()
+
+
+class SumideroIntermitente(SumideroMemoria):
+    def __init__(self, fallos):
+        super().__init__()
+        self.fallos = fallos
+
+    def enviar(self, email, notificaciones):
+        if self.fallos > 0:
+            self.fallos -= 1
+            raise ConnectionError("canal no disponible")
+        super().enviar(email, notificaciones)
+
+
+def test_crear_sumidero(tmp_path):
+    assert isinstance(crear_sumidero(None), SumideroRegistro)
+    assert isinstance(crear_sumidero(f"archivo:///{tmp_path}/n.jsonl"), SumideroArchivo)
+    with pytest.raises(ValueError):
+        crear_sumidero("smtp://correo")
+
+
+def test_despacho_agrupa_por_lector(bio_alert):
+    bio_alert.suscribir("a@uni.edu", "libro1")
+    bio_alert.suscribir("a@uni.edu", "libro2")
+    bio_alert.suscribir("b@uni.edu", "libro1")
+    sumidero = SumideroMemoria()
+    despachador = DespachadorNotificaciones(bio_alert.notificar_disponibilidad, sumidero)
+
+    despachador.encolar("libro1")
+    despachador.encolar("libro2")
+    despachador.encolar("libro1")
+    despachador.esperar()
+    despachador.detener()
+
+    assert despachador.enviadas == 3
+    lotes = {lote[0]["email"]: len(lote) for lote in sumidero.lotes}
+    assert lotes == {"a@uni.edu": 2, "b@uni.edu": 1}
+
+
+def test_reintenta_entregas_fallidas(bio_alert):
+    bio_alert.suscribir("a@uni.edu", "libro1")
+    sumidero = SumideroIntermitente(fallos=2)
+    despachador = DespachadorNotificaciones(
+        bio_alert.notificar_disponibilidad, sumidero, espera_reintento=0.001)
+
+    despachador.despachar(["libro1"])
+
+    assert [n["email"] for n in sumidero.enviadas] == ["a@uni.edu"]
+    assert list(despachador.fallidas) == []
+
+
+def test_agota_reintentos(bio_alert):
+    bio_alert.suscribir("a@uni.edu", "libro1")
+    despachador = DespachadorNotificaciones(
+        bio_alert.notificar_disponibilidad, SumideroIntermitente(fallos=10),
+        reintentos=2, espera_reintento=0.001)
+
+    despachador.despachar(["libro1"])
+
+    assert despachador.enviadas == 0
+    assert [n["email"] for n in despachador.fallidas] == ["a@uni.edu"]
+
+
+def test_fallidas_guarda_solo_las_ultimas(bio_alert):
+    for i in range(5):
+        bio_alert.suscribir(f"l{i}@uni.edu", "libro1")
+    despachador = DespachadorNotificaciones(
+        bio_alert.notificar_disponibilidad, SumideroIntermitente(fallos=100),
+        reintentos=0, max_fallidas=2)
+
+    despachador.despachar(["libro1"])
+
+    assert despachador.total_fallidas == 5
+    assert [n["email"] for n in despachador.fallidas] == ["l3@uni.edu", "l4@uni.edu"]
+
+
+def test_cola_llena_despacha_en_el_llamador(bio_alert):
+    bio_alert.suscribir("a@uni.edu", "libro1")
+    bio_alert.suscribir("b@uni.edu", "libro2")
+    sumidero = SumideroMemoria()
+    ocupado, liberar = threading.Event(), threading.Event()
+
+    def notificar(libro_id):
+        if libro_id == "libro0":
+            ocupado.set()
+            liberar.wait()
+        return bio_alert.notificar_disponibilidad(libro_id)
+
+    despachador = DespachadorNotificaciones(
+        notificar, sumidero, capacidad=1, intervalo=0.001, espera_maxima=0.01)
+    despachador.encolar("libro0")
+    ocupado.wait()
+    despachador.encolar("libro1")
+    despachador.encolar("libro2")
+
+    assert [n["email"] for n in sumidero.enviadas] == ["b@uni.edu"]
+    liberar.set()
+    despachador.esperar()
+    despachador.detener()
+    assert [n["email"] for n in sumidero.enviadas] == ["b@uni.edu", "a@uni.edu"]
+
+
+def test_sumidero_archivo(tmp_path):
+    ruta = tmp_path / "notificaciones.jsonl"
+    sumidero = SumideroArchivo(str(ruta))
+    sumidero.enviar("a@uni.edu", [{"email": "a@uni.edu", "mensaje": "hola"}])
+    assert json.loads(ruta.read_text())["mensaje"] == "hola"
@@ -0,0 +1,40 @@
+import pytest
+from src.paginacion import codificar_cursor, decodificar_cursor, paginar
+
+
+def test_cursor_ida_y_vuelta():
+    assert decodificar_cursor(codificar_cursor(0)) == 0
+    assert decodificar_cursor(codificar_cursor(12345)) == 12345
+
+
+def test_cursor_invalido():
+    with pytest.raises(ValueError):
+        decodificar_cursor("no-es-un-cursor")
+    with pytest.raises(ValueError):
+        decodificar_cursor(codificar_cursor(3)[:-1] + "!")
+
+
+def test_paginar_recorre_todas_las_claves():
+    claves = ["a", "b", "c", "d", "e"]
+    tabla = {clave: clave.upper() for clave in claves}
+
+    primera, siguiente = paginar(claves, tabla, 0, 2)
+    assert primera == ["A", "B"]
+    segunda, siguiente = paginar(claves, tabla, siguiente, 2)
+    assert segunda == ["C", "D"]
+    tercera, siguiente = paginar(claves, tabla, siguiente, 2)
+    assert tercera == ["E"]
+    assert siguiente is None
+
+
+def test_paginar_estable_con_inserciones():
+    claves = ["a", "b", "c"]
+    tabla = {clave: clave for clave in claves}
+
+    _, siguiente = paginar(claves, tabla, 0, 2)
+    claves.append("d")
+    tabla["d"] = "d"
+
+    items, siguiente = paginar(claves, tabla, siguiente, 2)
+    assert items == ["c", "d"]
+    assert siguiente is None
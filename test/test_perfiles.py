@@ -0,0 +1,67 @@
+import cProfile
+import pstats
+from src.perfiles import Perfilador, Muestra, perfilable, _muestra_actual, pilas_colapsadas
+
+
+def hoja():
+    return sum(range(20000))
+
+
+def rama():
+    return hoja() + hoja()
+
+
+def raiz():
+    return rama() + hoja()
+
+
+def perfilar(funcion):
+    perfil = cProfile.Profile()
+    perfil.runcall(funcion)
+    return pstats.Stats(perfil)
+
+
+def test_pilas_colapsadas_siguen_las_llamadas():
+    pilas = {}
+    for linea in pilas_colapsadas(perfilar(raiz)).splitlines():
+        pila, microsegundos = linea.rsplit(" ", 1)
+        pilas[tuple(marco.split(" ")[0] for marco in pila.split(";"))] = int(microsegundos)
+
+    assert ("raiz", "rama", "hoja") in pilas
+    assert ("raiz", "hoja") in pilas
+    # Dos llamadas desde rama frente a una directa: el tiempo se reparte así
+    assert pilas[("raiz", "rama", "hoja")] > pilas[("raiz", "hoja")]
+
+
+def test_perfilador_elige_por_cabecera_y_guarda_los_ultimos():
+    perfilador = Perfilador(capacidad=2, fraccion=0.0, cabecera="X-Perfilar")
+    scope = {"type": "http", "method": "GET", "headers": [(b"x-perfilar", b"1")]}
+    assert perfilador.motivo(scope) == "cabecera"
+    assert perfilador.motivo({**scope, "headers": []}) is None
+
+    perfilador.fraccion = 1.0
+    assert perfilador.motivo({**scope, "headers": []}) == "muestreo"
+
+    for _ in range(3):
+        muestra = Muestra()
+        muestra.perfil.runcall(hoja)
+        perfilador.guardar(scope, "cabecera", 0.01, 200, muestra)
+    assert [perfil["id"] for perfil in perfilador.listar()] == [3, 2]
+    assert perfilador.obtener(1) is None
+    assert perfilador.listar()[0]["ruta"] == "sin_ruta"
+
+
+def test_perfilable_solo_activa_el_perfil_si_hay_muestra():
+    envuelta = perfilable(rama)
+    assert envuelta.__name__ == "rama"
+    assert envuelta() == rama()
+
+    muestra = Muestra()
+    token = _muestra_actual.set(muestra)
+    try:
+        envuelta()
+    finally:
+        _muestra_actual.reset(token)
+    assert muestra.usado
+    nombres = {funcion[2] for funcion in pstats.Stats(muestra.perfil).stats}
+    assert {"rama", "hoja"} <= nombres
@@ -0,0 +1,212 @@
+import sys
+from datetime import datetime, timedelta
+from src.models import EstadoCopia, Copia, Lector
+from src.repositorio import RepositorioMemoria
+from src.estadisticas import TablaIncremental
+from test.utilidades import crear_libro, crear_prestamo
+
+
+def test_copias_de_libro_usa_indice():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_libro(crear_libro("libro1"))
+    repositorio.agregar_libro(crear_libro("libro2"))
+    repositorio.agregar_copia(
+        Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    repositorio.agregar_copia(
+        Copia(id="c2", libro_id="libro2", estado=EstadoCopia.DISPONIBLE))
+    repositorio.agregar_copia(
+        Copia(id="c3", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+
+    copias = repositorio.copias_de_libro("libro1")
+
+    assert [c.id for c in copias] == ["c1", "c3"]
+    assert repositorio.copias_de_libro("libro_inexistente") == []
+
+
+def test_prestamos_por_lector_y_por_copia():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+    repositorio.agregar_prestamo(crear_prestamo("p2", "c2", "b@uni.edu"))
+    repositorio.agregar_prestamo(crear_prestamo("p3", "c1", "b@uni.edu"))
+
+    assert [p.id for p in repositorio.prestamos_de_lector("b@uni.edu")] == [
+        "p2", "p3"]
+    assert [p.id for p in repositorio.prestamos_de_copia("c1")] == [
+        "p1", "p3"]
+
+
+def test_reemplazo_no_duplica_indices():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+
+    assert len(repositorio.prestamos_de_lector("a@uni.edu")) == 1
+    assert len(repositorio.prestamos_de_copia("c1")) == 1
+
+
+def test_limpiar_vacia_indices():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_copia(
+        Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+
+    repositorio.limpiar()
+
+    assert repositorio.copias_de_libro("libro1") == []
+    assert repositorio.prestamos_de_lector("a@uni.edu") == []
+    assert repositorio.copias == {}
+
+
+def test_disponibilidad_sigue_cambios_de_estado():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_copia(
+        Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    repositorio.agregar_copia(
+        Copia(id="c2", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+
+    copia = repositorio.obtener_copia("c1")
+    copia.estado = EstadoCopia.PRESTADA
+    repositorio.actualizar_copia(copia)
+    repositorio.actualizar_copia(copia)
+
+    assert repositorio.disponibilidad(["libro1", "libro2"]) == {
+        "libro1": {EstadoCopia.DISPONIBLE: 1, EstadoCopia.PRESTADA: 1},
+        "libro2": {},
+    }
+
+
+def test_version_cambia_con_escrituras_y_limpiar():
+    repositorio = RepositorioMemoria()
+    inicial = repositorio.version("copias_libro:libro1")
+    repositorio.agregar_copia(
+        Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    tras_alta = repositorio.version("copias_libro:libro1")
+    assert tras_alta != inicial
+    assert repositorio.version("copias_libro:libro2") == repositorio.version("libros")
+
+    repositorio.limpiar()
+    assert repositorio.version("copias_libro:libro1") not in (inicial, tras_alta)
+
+
+def test_obtener_devuelve_copias_de_trabajo():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_libro(crear_libro("libro1"))
+    repositorio.agregar_lector(Lector(email="a@uni.edu", nombre="A"))
+
+    libro = repositorio.obtener_libro("libro1")
+    libro.autor.nombre = "Otro"
+    lector = repositorio.obtener_lector("a@uni.edu")
+    lector.prestamos_activos.append("p1")
+    lector.dias_suspension = 3
+    assert repositorio.obtener_libro("libro1").autor.nombre == "Ian Somerville"
+    assert repositorio.obtener_lector("a@uni.edu").prestamos_activos == []
+
+    repositorio.actualizar_lector(lector)
+    assert repositorio.obtener_lector("a@uni.edu").prestamos_activos == ["p1"]
+    assert repositorio.obtener_lector("nadie@uni.edu") is None
+
+
+def test_prestamo_devuelto_pasa_al_archivo():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+    repositorio.agregar_prestamo(crear_prestamo("p2", "c2", "a@uni.edu"))
+
+    prestamo = repositorio.obtener_prestamo("p1")
+    prestamo.fecha_devolucion_real = datetime.now()
+    repositorio.actualizar_prestamo(prestamo)
+
+    assert list(repositorio.prestamos) == ["p2"]
+    assert "p1" in repositorio.archivo
+    assert repositorio.obtener_prestamo("p1").fecha_devolucion_real is not None
+    assert [p.id for p in repositorio.prestamos_de_lector("a@uni.edu")] == ["p1", "p2"]
+    assert [p.id for p in repositorio.iterar_prestamos()] == ["p1", "p2"]
+    assert [p.id for p in repositorio.iterar_prestamos_activos()] == ["p2"]
+    assert [p.id for p in repositorio.pagina_prestamos(0, 1)[0]] == ["p1"]
+
+
+def test_tabla_prestamos_une_activos_y_archivados():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_copia(Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+    repositorio.agregar_prestamo(crear_prestamo("p2", "c1", "b@uni.edu"))
+    prestamo = repositorio.obtener_prestamo("p1")
+    prestamo.fecha_devolucion_real = datetime.now()
+    prestamo.dias_retraso = 2
+    repositorio.actualizar_prestamo(prestamo)
+
+    tabla = repositorio.tabla_prestamos()
+    assert len(tabla) == 2
+    assert [tabla.lectores[codigo] for codigo in tabla.lector] == ["a@uni.edu", "b@uni.edu"]
+    assert [tabla.libros[codigo] for codigo in tabla.libro] == ["libro1", "libro1"]
+    assert list(tabla.dias_retraso) == [2, 0]
+
+
+def devolver(repositorio, prestamo_id, dias_retraso=0):
+    prestamo = repositorio.obtener_prestamo(prestamo_id)
+    prestamo.fecha_devolucion_real = datetime.now()
+    prestamo.dias_retraso = dias_retraso
+    repositorio.actualizar_prestamo(prestamo)
+
+
+def test_tabla_incremental_coincide_con_la_tabla_completa():
+    repositorio = RepositorioMemoria()
+    repositorio.agregar_copia(Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    for numero in range(6):
+        repositorio.agregar_prestamo(crear_prestamo(f"p{numero}", "c1", f"l{numero % 2}@uni.edu"))
+    incremental = TablaIncremental(repositorio.ampliar_historial, repositorio.agregar_activos)
+
+    def comprobar():
+        tabla = incremental.obtener(repositorio.version("prestamos"))
+        completa = repositorio.tabla_prestamos()
+        assert list(tabla.dias_retraso) == list(completa.dias_retraso)
+        assert list(tabla.fecha_devolucion_real) == list(completa.fecha_devolucion_real)
+        return tabla
+
+    comprobar()
+    devolver(repositorio, "p1", dias_retraso=3)
+    devolver(repositorio, "p4")
+    historial = incremental._historial
+    assert len(comprobar()) == 6
+    assert incremental._historial is historial and len(historial) == 2
+
+    # Reescribir un préstamo devuelto obliga a releer el historial
+    devolver(repositorio, "p1", dias_retraso=5)
+    assert sorted(comprobar().dias_retraso) == [0, 0, 0, 0, 0, 5]
+    assert incremental._historial is not historial
+
+
+def test_prestamos_vencidos_por_intervalo():
+    repositorio = RepositorioMemoria()
+    ahora = datetime(2025, 1, 31, 12, 0)
+    for numero, dias in enumerate([-3, -1, 2]):
+        prestamo = crear_prestamo(f"p{numero}", "c1", "a@uni.edu")
+        prestamo.fecha_devolucion_esperada = ahora + timedelta(days=dias)
+        repositorio.agregar_prestamo(prestamo)
+    devolver(repositorio, "p0")
+
+    assert [p.id for p in repositorio.prestamos_vencidos(None, ahora)] == ["p1"]
+    assert repositorio.prestamos_vencidos(ahora - timedelta(days=1, seconds=-1), ahora) == []
+    assert [p.id for p in repositorio.prestamos_vencidos(
+        ahora, ahora + timedelta(days=5))] == ["p2"]
+
+
+def test_uso_memoria_cuenta_cada_almacen():
+    repositorio = RepositorioMemoria()
+    repositorio.limpiar()
+    repositorio.agregar_libro(crear_libro("libro1"))
+    repositorio.agregar_copia(Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+    repositorio.agregar_prestamo(crear_prestamo("p2", "c1", "b@uni.edu"))
+    prestamo = repositorio.obtener_prestamo("p1")
+    prestamo.fecha_devolucion_real = datetime.now()
+    repositorio.actualizar_prestamo(prestamo)
+    repositorio.suscribir("a@uni.edu", "libro1")
+
+    almacenes = {almacen["nombre"]: almacen for almacen in repositorio.uso_memoria()}
+    objetos = {nombre: almacen["objetos"] for nombre, almacen in almacenes.items()}
+    assert objetos == {"libros": 1, "copias": 1, "lectores": 0, "prestamos_activos": 1,
+                       "prestamos_archivados": 1, "archivo_mapeado": 0, "suscripciones": 1,
+                       "indices": 6}
+    assert almacenes["libros"]["bytes_aproximados"] > sys.getsizeof(repositorio.libros)
+    assert almacenes["archivo_mapeado"]["bytes_aproximados"] == 0
+    repositorio.limpiar()
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from datetime import datetime
+import pytest
+from src.models import EstadoCopia, Copia, Lector, Prestamo
+from src.diario import DiarioEscritura, leer_segmento, listar_segmentos
+from src.repositorio_persistente import RepositorioPersistente
+from test.utilidades import crear_libro
+
+
+def abrir(directorio, **opciones):
+    opciones.setdefault("fsync", False)
+    opciones.setdefault("intervalo_compactacion", 3600)
+    return RepositorioPersistente(str(directorio), **opciones)
+
+
+def test_recupera_estado_desde_el_diario(tmp_path):
+    repositorio = abrir(tmp_path)
+    repositorio.agregar_libro(crear_libro("libro1", "José Saramago"))
+    repositorio.agregar_copia(
+        Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    copia = repositorio.obtener_copia("c1")
+    copia.estado = EstadoCopia.EN_REPARACION
+    repositorio.actualizar_copia(copia)
+    repositorio.agregar_lector(Lector(email="a@uni.edu", nombre="A"))
+    repositorio.suscribir("a@uni.edu", "libro1")
+    repositorio.cerrar()
+
+    recuperado = abrir(tmp_path)
+    assert recuperado.obtener_copia("c1").estado == EstadoCopia.EN_REPARACION
+    assert [c.id for c in recuperado.copias_de_libro("libro1")] == ["c1"]
+    assert [l.id for l in recuperado.buscar_libros_por_autor("saramago")] == ["libro1"]
+    assert len(recuperado.obtener_suscripciones("a@uni.edu")) == 1
+    recuperado.cerrar()
+
+
+def test_notificacion_se_reproduce(tmp_path):
+    repositorio = abrir(tmp_path)
+    repositorio.suscribir("a@uni.edu", "libro1")
+    repositorio.notificar_disponibilidad("libro1")
+    repositorio.cerrar()
+
+    recuperado = abrir(tmp_path)
+    assert recuperado.obtener_suscripciones() == []
+    recuperado.cerrar()
+
+
+def test_compactar_genera_instantanea_y_descarta_segmentos(tmp_path):
+    repositorio = abrir(tmp_path)
+    repositorio.agregar_libro(crear_libro("libro1"))
+    repositorio.compactar()
+    repositorio.agregar_libro(crear_libro("libro2"))
+    repositorio.cerrar()
+
+    segmentos = listar_segmentos(str(tmp_path))
+    assert len(segmentos) == 1
+    assert [op for _, op, _ in leer_segmento(segmentos[0][1])] == ["libro"]
+    assert os.path.exists(tmp_path / "instantanea.bin")
+
+    recuperado = abrir(tmp_path)
+    assert [l.id for l in recuperado.iterar_libros()] == ["libro1", "libro2"]
+    recuperado.cerrar()
+
+
+def test_compactacion_en_segundo_plano(tmp_path):
+    repositorio = abrir(tmp_path, intervalo_compactacion=0.01,
+                        registros_por_instantanea=2)
+    repositorio.agregar_libro(crear_libro("libro1"))
+    repositorio.agregar_libro(crear_libro("libro2"))
+    for _ in range(200):
+        if os.path.exists(tmp_path / "instantanea.bin"):
+            break
+        threading.Event().wait(0.01)
+    repositorio.cerrar()
+    assert os.path.exists(tmp_path / "instantanea.bin")
+
+
+def test_ignora_linea_incompleta(tmp_path):
+    repositorio = abrir(tmp_path)
+    repositorio.agregar_libro(crear_libro("libro1"))
+    repositorio.cerrar()
+    _, ruta = listar_segmentos(str(tmp_path))[-1]
+    with open(ruta, "ab") as archivo:
+        archivo.write(b'{"seq": 99, "op": "libro", "dat')
+
+    recuperado = abrir(tmp_path)
+    assert recuperado.obtener_libro("libro1") is not None
+    recuperado.agregar_libro(crear_libro("libro2"))
+    recuperado.cerrar()
+
+    final = abrir(tmp_path)
+    assert [l.id for l in final.iterar_libros()] == ["libro1", "libro2"]
+    final.cerrar()
+
+
+def test_diario_commit_en_grupo(tmp_path):
+    diario = DiarioEscritura(str(tmp_path), intervalo_fsync=0.01, fsync=False)
+
+    def escribir(hilo):
+        for i in range(50):
+            diario.esperar(diario.registrar("prueba", {"hilo": hilo, "i": i}))
+
+    hilos = [threading.Thread(target=escribir, args=(n,)) for n in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    diario.cerrar()
+
+    registros = list(leer_segmento(listar_segmentos(str(tmp_path))[0][1]))
+    assert [seq for seq, _, _ in registros] == list(range(1, 401))
+
+
+def test_diario_cerrado_rechaza_registros(tmp_path):
+    diario = DiarioEscritura(str(tmp_path), fsync=False)
+    diario.cerrar()
+    with pytest.raises(RuntimeError):
+        diario.registrar("prueba", {})
+
+
+def test_archivo_de_prestamos_sobrevive_a_la_compactacion(tmp_path):
+    repositorio = abrir(tmp_path)
+    for i in range(3):
+        repositorio.agregar_prestamo(Prestamo(
+            id=f"p{i}", copia_id=f"c{i}", lector_email="a@uni.edu",
+            fecha_prestamo=datetime(2025, 1, 1),
+            fecha_devolucion_esperada=datetime(2025, 1, 31)))
+    for prestamo_id in ("p0", "p2"):
+        prestamo = repositorio.obtener_prestamo(prestamo_id)
+        prestamo.fecha_devolucion_real = datetime(2025, 2, 2)
+        prestamo.dias_retraso = 2
+        repositorio.actualizar_prestamo(prestamo)
+    repositorio.compactar()
+    # Devolución posterior a la instantánea: se reproduce desde el diario
+    prestamo = repositorio.obtener_prestamo("p1")
+    prestamo.fecha_devolucion_real = datetime(2025, 1, 20)
+    repositorio.actualizar_prestamo(prestamo)
+    repositorio.cerrar()
+
+    recuperado = abrir(tmp_path)
+    assert sorted(os.listdir(tmp_path)).count("archivo-00000005") == 1
+    assert isinstance(recuperado.archivo.columnas["dias_retraso"].base, memoryview)
+    assert recuperado.prestamos == {}
+    assert len(recuperado.archivo) == 3
+    assert [p.id for p in recuperado.prestamos_de_lector("a@uni.edu")] == ["p0", "p1", "p2"]
+    assert recuperado.obtener_prestamo("p2").dias_retraso == 2
+    assert recuperado.obtener_prestamo("p1").fecha_devolucion_real == datetime(2025, 1, 20)
+
+    recuperado.compactar()
+    assert [n for n in os.listdir(tmp_path) if n.startswith("archivo-")] == [
+        "archivo-00000006"]
+    recuperado.cerrar()
+
+
+def test_lote_espera_una_sola_vez(tmp_path):
+    # Sin lote cada alta esperaría su propio volcado de 0,2 s
+    repositorio = abrir(tmp_path, intervalo_fsync=0.2)
+    inicio = time.perf_counter()
+    with repositorio.lote():
+        for i in range(20):
+            repositorio.agregar_lector(Lector(email=f"l{i}@uni.edu", nombre="L"))
+    assert time.perf_counter() - inicio < 2
+    assert repositorio.diario._seq_durable == repositorio.diario.seq
+    repositorio.cerrar()
+
+    recuperado = abrir(tmp_path)
+    assert recuperado.obtener_lector("l19@uni.edu") is not None
+    recuperado.cerrar()
@@ -0,0 +1,336 @@
+import multiprocessing
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from src.models import EstadoCopia, Copia, Lector
+from src.repositorio import RepositorioMemoria, crear_repositorio, url_para_workers
+from src.repositorio_sqlite import RepositorioSQLite
+from src.ingesta import Ingesta, ModoIngesta
+from src.archivo import a_microsegundos
+from src.estadisticas import TablaIncremental
+from test.utilidades import crear_libro, crear_prestamo
+
+
+@pytest.fixture
+def repositorio(tmp_path):
+    repositorio = RepositorioSQLite(str(tmp_path / "biblioteca.db"))
+    yield repositorio
+    repositorio.cerrar()
+
+
+def test_crear_repositorio():
+    assert isinstance(crear_repositorio(None), RepositorioMemoria)
+    with pytest.raises(ValueError):
+        crear_repositorio("postgres://localhost/biblioteca")
+
+
+def test_crear_repositorio_rutas_absolutas_y_relativas(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    absoluta = tmp_path / "absoluta"
+    absoluta.mkdir()
+
+    repositorio = crear_repositorio(f"sqlite://{absoluta}/biblioteca.db")
+    assert isinstance(repositorio, RepositorioSQLite)
+    repositorio.cerrar()
+    assert (absoluta / "biblioteca.db").exists()
+
+    repositorio = crear_repositorio(f"diario://{absoluta}/diario")
+    repositorio.cerrar()
+    assert (absoluta / "diario").is_dir()
+    assert not (tmp_path / str(absoluta).lstrip("/")).exists()
+
+    repositorio = crear_repositorio("sqlite://relativa.db")
+    repositorio.cerrar()
+    assert (tmp_path / "relativa.db").exists()
+
+
+def test_datos_persisten_al_reabrir(tmp_path):
+    ruta = str(tmp_path / "biblioteca.db")
+    repositorio = RepositorioSQLite(ruta)
+    repositorio.agregar_libro(crear_libro("libro1"))
+    repositorio.agregar_lector(Lector(email="a@uni.edu", nombre="A"))
+    repositorio.cerrar()
+
+    reabierto = RepositorioSQLite(ruta)
+    assert reabierto.obtener_libro("libro1").autor.nombre == "Ian Somerville"
+    assert reabierto.obtener_lector("a@uni.edu").nombre == "A"
+    reabierto.cerrar()
+
+
+def test_actualizar_copia_conserva_posicion(repositorio):
+    for copia_id in ("c1", "c2", "c3"):
+        repositorio.agregar_copia(
+            Copia(id=copia_id, libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+
+    copia = repositorio.obtener_copia("c1")
+    copia.estado = EstadoCopia.PRESTADA
+    repositorio.actualizar_copia(copia)
+
+    primera, siguiente = repositorio.pagina_copias(0, 2)
+    assert [c.id for c in primera] == ["c1", "c2"]
+    assert primera[0].estado == EstadoCopia.PRESTADA
+    segunda, siguiente = repositorio.pagina_copias(siguiente, 2)
+    assert [c.id for c in segunda] == ["c3"]
+    assert siguiente is None
+
+
+def test_buscar_libros_por_autor(repositorio):
+    repositorio.agregar_libro(crear_libro("libro1", "Gabriel García Márquez"))
+    repositorio.agregar_libro(crear_libro("libro2", "Isabel Allende"))
+
+    assert [l.id for l in repositorio.buscar_libros_por_autor("garcia")] == ["libro1"]
+    assert [l.id for l in repositorio.buscar_libros_por_autor("al")] == ["libro2"]
+    assert repositorio.buscar_libros_por_autor("borges") == []
+
+
+def test_prestamos_por_lector(repositorio):
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+    repositorio.agregar_prestamo(crear_prestamo("p2", "c2", "b@uni.edu"))
+    repositorio.agregar_prestamo(crear_prestamo("p3", "c1", "a@uni.edu"))
+
+    assert [p.id for p in repositorio.prestamos_de_lector("a@uni.edu")] == ["p1", "p3"]
+    assert [p.id for p in repositorio.prestamos_de_copia("c2")] == ["p2"]
+    pagina, siguiente = repositorio.pagina_prestamos_lector("a@uni.edu", 0, 1)
+    assert [p.id for p in pagina] == ["p1"]
+    pagina, siguiente = repositorio.pagina_prestamos_lector("a@uni.edu", siguiente, 1)
+    assert [p.id for p in pagina] == ["p3"]
+    assert siguiente is None
+
+
+def test_suscripciones(repositorio):
+    repositorio.suscribir("a@uni.edu", "libro1")
+    repositorio.suscribir("a@uni.edu", "libro1")
+    repositorio.suscribir("b@uni.edu", "libro1")
+    repositorio.suscribir("a@uni.edu", "libro2")
+
+    assert len(repositorio.obtener_suscripciones()) == 3
+    notificaciones = repositorio.notificar_disponibilidad("libro1")
+    assert [n["email"] for n in notificaciones] == ["a@uni.edu", "b@uni.edu"]
+    assert [s.libro_id for s in repositorio.obtener_suscripciones("a@uni.edu")] == ["libro2"]
+
+
+def test_conexion_por_hilo(repositorio):
+    repositorio.agregar_libro(crear_libro("libro1"))
+    resultados = []
+
+    def leer():
+        resultados.append(repositorio.obtener_libro("libro1").id)
+
+    hilos = [threading.Thread(target=leer) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert resultados == ["libro1"] * 4
+    assert len(repositorio._conexiones) == 5
+
+
+def test_url_para_workers():
+    assert url_para_workers(None, 1) is None
+    assert url_para_workers(None, 4) == "sqlite://biblioteca.db"
+    assert url_para_workers("sqlite:///otra.db", 4) == "sqlite:///otra.db"
+    with pytest.raises(ValueError):
+        url_para_workers("memoria", 4)
+    with pytest.raises(ValueError):
+        url_para_workers("diario:///datos", 2)
+
+
+def prestar_copias_disponibles(ruta, copias):
+    repositorio = RepositorioSQLite(ruta)
+    prestadas = 0
+    for copia_id in copias:
+        with repositorio.bloquear(copias=[copia_id]):
+            copia = repositorio.obtener_copia(copia_id)
+            if copia.estado != EstadoCopia.DISPONIBLE:
+                continue
+            time.sleep(0.001)
+            copia.estado = EstadoCopia.PRESTADA
+            repositorio.actualizar_copia(copia)
+            prestadas += 1
+    repositorio.cerrar()
+    return prestadas
+
+
+def test_bloquear_excluye_a_otros_procesos(repositorio):
+    copias = [f"c{i}" for i in range(20)]
+    for copia_id in copias:
+        repositorio.agregar_copia(
+            Copia(id=copia_id, libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+
+    contexto = multiprocessing.get_context("spawn")
+    with contexto.Pool(4) as procesos:
+        prestadas = procesos.starmap(
+            prestar_copias_disponibles, [(repositorio.ruta, copias)] * 4)
+
+    assert sum(prestadas) == len(copias)
+    assert all(c.estado == EstadoCopia.PRESTADA for c in repositorio.iterar_copias())
+
+
+def test_disponibilidad_se_recalcula_al_reabrir(tmp_path):
+    ruta = str(tmp_path / "biblioteca.db")
+    repositorio = RepositorioSQLite(ruta)
+    for copia_id in ("c1", "c2"):
+        repositorio.agregar_copia(
+            Copia(id=copia_id, libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    copia = repositorio.obtener_copia("c2")
+    copia.estado = EstadoCopia.PRESTADA
+    repositorio.actualizar_copia(copia)
+    assert repositorio.disponibilidad(["libro1"])["libro1"] == {
+        EstadoCopia.DISPONIBLE: 1, EstadoCopia.PRESTADA: 1}
+
+    # Una base creada antes de la tabla de contadores se rellena al abrirla
+    repositorio._conexion().execute("DELETE FROM disponibilidad")
+    repositorio.cerrar()
+    reabierto = RepositorioSQLite(ruta)
+    assert reabierto.disponibilidad(["libro1"])["libro1"] == {
+        EstadoCopia.DISPONIBLE: 1, EstadoCopia.PRESTADA: 1}
+    reabierto.cerrar()
+
+
+def test_version_compartida_entre_conexiones(tmp_path):
+    ruta = str(tmp_path / "biblioteca.db")
+    escritor = RepositorioSQLite(ruta)
+    lector = RepositorioSQLite(ruta)
+    antes = lector.version("libros")
+
+    escritor.agregar_libro(crear_libro("libro1"))
+    despues = lector.version("libros")
+    assert despues != antes
+    assert lector.version("libro:libro1") == escritor.version("libro:libro1")
+
+    escritor.limpiar()
+    assert lector.version("libros") not in (antes, despues)
+    escritor.cerrar()
+    lector.cerrar()
+
+
+def test_tabla_prestamos_lee_columnas_sin_validar(repositorio):
+    repositorio.agregar_copia(Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+    prestamo = crear_prestamo("p2", "c_sin_copia", "b@uni.edu")
+    prestamo.fecha_devolucion_real = prestamo.fecha_devolucion_esperada + timedelta(days=4)
+    prestamo.dias_retraso = 4
+    repositorio.agregar_prestamo(prestamo)
+
+    memoria = RepositorioMemoria()
+    memoria.agregar_copia(Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    for prestamo in repositorio.iterar_prestamos():
+        memoria.agregar_prestamo(prestamo)
+
+    tabla = repositorio.tabla_prestamos()
+    esperada = memoria.tabla_prestamos()
+    # Ambos ponen los devueltos primero y después los activos
+    for nombre in ("fecha_prestamo", "fecha_devolucion_esperada", "fecha_devolucion_real"):
+        assert getattr(tabla, nombre) == getattr(esperada, nombre)
+    assert [tabla.libros[codigo] for codigo in tabla.libro] == ["", "libro1"]
+    assert list(tabla.dias_retraso) == [4, 0]
+
+
+def test_tabla_incremental_ve_devoluciones_de_otro_proceso(tmp_path):
+    ruta = str(tmp_path / "biblioteca.db")
+    servidor, otro = RepositorioSQLite(ruta), RepositorioSQLite(ruta)
+    servidor.agregar_copia(Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    for numero in range(4):
+        servidor.agregar_prestamo(crear_prestamo(f"p{numero}", "c1", "a@uni.edu"))
+    incremental = TablaIncremental(servidor.ampliar_historial, servidor.agregar_activos)
+    assert list(incremental.obtener(servidor.version("prestamos")).dias_retraso) == [0] * 4
+
+    prestamo = otro.obtener_prestamo("p2")
+    prestamo.fecha_devolucion_real = prestamo.fecha_devolucion_esperada + timedelta(days=2)
+    prestamo.dias_retraso = 2
+    otro.actualizar_prestamo(prestamo)
+    tabla = incremental.obtener(servidor.version("prestamos"))
+    assert list(tabla.dias_retraso) == [2, 0, 0, 0]
+    assert incremental._posicion[1] == 1
+
+    otro.limpiar()
+    assert len(incremental.obtener(servidor.version("prestamos"))) == 0
+    servidor.cerrar()
+    otro.cerrar()
+
+
+def test_prestamos_vencidos_de_otro_proceso(tmp_path):
+    ruta = str(tmp_path / "biblioteca.db")
+    servidor, otro = RepositorioSQLite(ruta), RepositorioSQLite(ruta)
+    ahora = datetime(2025, 1, 31, 12, 0)
+    for numero, vencimiento in enumerate([ahora - timedelta(days=1),
+                                          ahora - timedelta(microseconds=1),
+                                          ahora, ahora + timedelta(days=1)]):
+        prestamo = crear_prestamo(f"p{numero}", "c1", "a@uni.edu")
+        prestamo.fecha_devolucion_esperada = vencimiento
+        otro.agregar_prestamo(prestamo)
+
+    assert [p.id for p in servidor.prestamos_vencidos(None, ahora)] == ["p0", "p1"]
+    assert [p.id for p in servidor.prestamos_vencidos(
+        ahora - timedelta(hours=1), ahora + timedelta(days=2))] == ["p1", "p2", "p3"]
+
+    prestamo = otro.obtener_prestamo("p0")
+    prestamo.fecha_devolucion_real = ahora
+    otro.actualizar_prestamo(prestamo)
+    assert [p.id for p in servidor.prestamos_vencidos(None, ahora)] == ["p1"]
+    plan = servidor._conexion().execute(
+        "EXPLAIN QUERY PLAN SELECT datos FROM prestamos INDEXED BY idx_prestamos_vencimiento "
+        "WHERE json_extract(datos, '$.fecha_devolucion_real') IS NULL "
+        "AND json_extract(datos, '$.fecha_devolucion_esperada') < ?", ("",)).fetchall()
+    assert "idx_prestamos_vencimiento" in plan[0][-1]
+    servidor.cerrar()
+    otro.cerrar()
+
+
+def test_devoluciones_se_rellenan_al_abrir_una_base_anterior(tmp_path):
+    ruta = str(tmp_path / "biblioteca.db")
+    repositorio = RepositorioSQLite(ruta)
+    prestamo = crear_prestamo("p1", "c1", "a@uni.edu")
+    prestamo.fecha_devolucion_real = prestamo.fecha_devolucion_esperada
+    repositorio.agregar_prestamo(prestamo)
+    repositorio.agregar_prestamo(crear_prestamo("p2", "c1", "a@uni.edu"))
+    with repositorio.transaccion() as conexion:
+        conexion.execute("DROP TABLE devoluciones")
+    repositorio.cerrar()
+
+    reabierto = RepositorioSQLite(ruta)
+    tabla = reabierto.tabla_prestamos()
+    assert len(tabla) == 2
+    assert tabla.fecha_devolucion_real[0] == a_microsegundos(prestamo.fecha_devolucion_real)
+    reabierto.cerrar()
+
+
+def test_uso_memoria_cuenta_filas(repositorio):
+    repositorio.agregar_copia(Copia(id="c1", libro_id="libro1", estado=EstadoCopia.DISPONIBLE))
+    repositorio.agregar_prestamo(crear_prestamo("p1", "c1", "a@uni.edu"))
+    repositorio.suscribir("a@uni.edu", "libro1")
+
+    almacenes = {almacen["nombre"]: almacen for almacen in repositorio.uso_memoria()}
+    assert {nombre: almacen["objetos"] for nombre, almacen in almacenes.items()} == {
+        "libros": 0, "copias": 1, "lectores": 0, "prestamos": 1, "suscripciones": 1}
+    assert all(almacen["bytes_aproximados"] is None for almacen in almacenes.values())
+
+
+def test_lote_es_una_transaccion(repositorio):
+    with pytest.raises(RuntimeError):
+        with repositorio.lote():
+            repositorio.agregar_lector(Lector(email="a@uni.edu", nombre="A"))
+            raise RuntimeError("interrumpido")
+    assert repositorio.obtener_lector("a@uni.edu") is None
+
+
+def test_ingesta_todo_o_nada_es_atomica(repositorio):
+    guardados = []
+
+    def guardar(lector):
+        if guardados:
+            raise RuntimeError("fallo a mitad del alta")
+        guardados.append(repositorio.agregar_lector(lector))
+
+    ingesta = Ingesta(
+        modelo=Lector, clave=lambda lector: lector.email,
+        existe=lambda email: repositorio.obtener_lector(email) is not None,
+        mensaje_duplicado="El lector ya existe", guardar=guardar,
+        modo=ModoIngesta.TODO_O_NADA, lote=repositorio.lote)
+    ingesta.procesar([(0, {"email": "a@uni.edu", "nombre": "A"}),
+                      (1, {"email": "b@uni.edu", "nombre": "B"})])
+    with pytest.raises(RuntimeError):
+        ingesta.terminar()
+    assert repositorio.obtener_lector("a@uni.edu") is None
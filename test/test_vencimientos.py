@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+from src.vencimientos import AgendaCompartida, AgendaVencimientos, BarredorVencimientos
+
+AHORA = datetime(2025, 1, 31, 12, 0)
+
+
+def test_extrae_solo_los_vencidos_en_orden():
+    agenda = AgendaVencimientos()
+    agenda.programar("p3", AHORA - timedelta(hours=1))
+    agenda.programar("p1", AHORA - timedelta(days=2))
+    agenda.programar("p2", AHORA + timedelta(days=1))
+
+    assert agenda.extraer_vencidos(AHORA) == ["p1", "p3"]
+    assert agenda.extraer_vencidos(AHORA) == []
+    assert agenda.vencidos() == ["p1", "p3"]
+    assert len(agenda) == 1
+
+
+def test_cancelar_y_reprogramar():
+    agenda = AgendaVencimientos()
+    agenda.programar("p1", AHORA - timedelta(days=1))
+    agenda.programar("p2", AHORA - timedelta(days=1))
+    agenda.cancelar("p1")
+    agenda.programar("p2", AHORA + timedelta(days=5))
+
+    assert agenda.extraer_vencidos(AHORA) == []
+    assert agenda.extraer_vencidos(AHORA + timedelta(days=6)) == ["p2"]
+
+
+def test_cancelar_quita_de_vencidos():
+    agenda = AgendaVencimientos()
+    agenda.programar("p1", AHORA - timedelta(days=1))
+    agenda.extraer_vencidos(AHORA)
+    agenda.cancelar("p1")
+    assert agenda.vencidos() == []
+
+
+def test_agenda_compartida_consulta_solo_lo_nuevo():
+    almacen = {"p1": AHORA - timedelta(days=2), "p2": AHORA + timedelta(days=1)}
+    consultas = []
+
+    def consultar(desde, hasta):
+        consultas.append((desde, hasta))
+        return sorted((p for p, fecha in almacen.items()
+                       if (desde is None or fecha >= desde) and fecha < hasta),
+                      key=almacen.get)
+
+    agenda = AgendaCompartida(consultar)
+    assert agenda.vencidos() == []
+    assert agenda.extraer_vencidos(AHORA) == ["p1"]
+    # Otro proceso crea p3, que vence antes del siguiente barrido
+    almacen["p3"] = AHORA + timedelta(hours=1)
+    assert agenda.extraer_vencidos(AHORA + timedelta(hours=2)) == ["p3"]
+    assert consultas == [(None, AHORA), (AHORA, AHORA + timedelta(hours=2))]
+    assert agenda.vencidos() == ["p1", "p3"]
+
+    # Programar en el pasado lo deja pendiente para el siguiente barrido
+    agenda.programar("p2", AHORA - timedelta(days=1))
+    agenda.programar("p4", AHORA - timedelta(days=1))
+    agenda.cancelar("p4")
+    assert agenda.extraer_vencidos(AHORA + timedelta(hours=2)) == ["p2"]
+
+    agenda.limpiar()
+    assert agenda.vencidos() == []
+    assert agenda.extraer_vencidos(AHORA) == ["p1"]
+
+
+def test_barredor_marca_los_vencidos():
+    agenda = AgendaVencimientos()
+    agenda.programar("p1", AHORA - timedelta(days=1))
+    agenda.programar("p2", AHORA - timedelta(days=1))
+    marcados = []
+
+    def marcar(prestamo_id):
+        if prestamo_id == "p1":
+            raise RuntimeError("fallo puntual")
+        marcados.append(prestamo_id)
+
+    barredor = BarredorVencimientos(agenda, marcar)
+    assert barredor.barrer(AHORA) == ["p1", "p2"]
+    assert marcados == ["p2"]
+
+
+def test_barredor_en_segundo_plano():
+    agenda = AgendaVencimientos()
+    agenda.programar("p1", datetime.now() - timedelta(seconds=1))
+    marcados = []
+    barredor = BarredorVencimientos(agenda, marcados.append, intervalo=0.01)
+    barredor.iniciar()
+    for _ in range(500):
+        if marcados:
+            break
+        barredor._detener.wait(0.01)
+    barredor.detener()
+    assert marcados == ["p1"]
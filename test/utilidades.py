@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from src.models import Autor, Libro, Prestamo
+
+
+def crear_libro(libro_id: str, autor: str = "Ian Somerville") -> Libro:
+    return Libro(
+        id=libro_id,
+        nombre="Libro " + libro_id,
+        anio=2020,
+        autor=Autor(nombre=autor, fecha_nacimiento=datetime(1970, 1, 1))
+    )
+
+
+def crear_prestamo(prestamo_id: str, copia_id: str, lector_email: str,
+                   inicio: Optional[datetime] = None,
+                   dias_retraso: Optional[int] = None) -> Prestamo:
+    """
+    Préstamo a 30 días desde `inicio` (ahora si es None), devuelto con
+    `dias_retraso` días de retraso si se indican
+    """
+    inicio = inicio or datetime.now()
+    esperada = inicio + timedelta(days=30)
+    real = None if dias_retraso is None else esperada + timedelta(days=dias_retraso)
+    return Prestamo(
+        id=prestamo_id, copia_id=copia_id, lector_email=lector_email,
+        fecha_prestamo=inicio, fecha_devolucion_esperada=esperada,
+        fecha_devolucion_real=real, dias_retraso=dias_retraso or 0)